@@ -1,31 +1,26 @@
 import redis
-import json
 import logging
 from flask import Blueprint, jsonify, request
+from werkzeug.exceptions import BadRequest
 from config.settings import Config  # Pastikan file config.py/settings.py Anda memiliki REDIS_HOST dan REDIS_PORT
-from helper.form_validation import get_form_data
+from helper import json_codec
+from helper.form_validation import get_form_data, validate_entries
 from helper.json_formatter import create_response
+from helper.command_bus import publish_command, publish_commands
+from helper.command_tracker import get_batch_status, get_command_status, get_latency_histograms
+from helper.command_fanout import get_fanout_status, group_key, load_groups, save_group, validate_target
+from helper.redis_connection import get_redis_client
 
 # --- Setup ---
 iotdevice = Blueprint("iotdevice", __name__)
 logger = logging.getLogger(__name__)
 
-# Channel Redis yang akan kita gunakan
-COMMAND_CHANNEL = "command_to_mqtt" 
+# Perintah dikirim ke channel Redis "command_to_mqtt" lewat helper.command_bus
 # --- Koneksi ke Redis ---
-try:
-    # Buat koneksi Redis di level modul
-    redis_client = redis.Redis(
-        host=Config.REDIS_HOST,
-        port=Config.REDIS_PORT,
-        db=0,
-        decode_responses=True # Otomatis decode dari bytes ke string
-    )
-    redis_client.ping()
-    logger.info("✅ (API Endpoints) Berhasil terhubung ke Redis.")
-except Exception as e:
-    logger.error(f"❌ (API Endpoints) Gagal terhubung ke Redis: {e}")
-    redis_client = None
+# Client bersama per proses; koneksi dibuka saat publish pertama, bukan saat import
+redis_client = get_redis_client()
+
+REGISTRATION_FIELDS = ["device_id", "device_token", "warning_level", "danger_level", "sensor_height"]
 
 # --- Endpoint yang Telah Di-refactor ---
 
@@ -35,8 +30,16 @@ def set_threshold_iotdevice():
     Menerima perintah 'set threshold' dan meneruskannya ke
     MQTT Worker melalui Redis secara asinkron.
     """
-    if not redis_client:
-        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal"), 503
+    body = request.get_json(silent=True) or {}
+    if "target" in body:
+        # Threshold untuk grup perangkat: sensor_id diisi worker per perangkat
+        fields = ["warning_level", "danger_level", "sensor_height"]
+        missing = [field for field in fields if not body.get(field)]
+        if missing:
+            return create_response(status=False, message=f"Missing required field: {', '.join(missing)}",
+                                   status_code=400)
+        return _queue_group_command(body["target"], {field: body[field] for field in fields},
+                                    "Perintah 'set threshold' grup telah diterima", device_field="sensor_id")
 
     try:
         required = get_form_data(["sensor_id", "warning_level", "danger_level", "sensor_height"]) 
@@ -58,17 +61,22 @@ def set_threshold_iotdevice():
             "payload": payload
         }
         
-        # Publikasikan ke Redis
-        redis_client.publish(COMMAND_CHANNEL, json.dumps(message))
+        # Publikasikan ke Redis; command_id dipakai untuk memantau status di /commands/<command_id>
+        command_id = publish_command(redis_client, message)
         
         # Berikan respons cepat ke klien (Laravel)
         return create_response(
-            data=payload,
+            data={**payload, "command_id": command_id},
             message="Perintah 'set threshold' telah diterima dan sedang diproses",
             status_code=202 # 202 Accepted (Diterima, belum dieksekusi)
         )
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal publish ke Redis: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    except BadRequest:
+        raise  # field wajib tidak ada -> 400 dari get_form_data
     except Exception as e:
-        return create_response(status=False, message=str(e)), 500
+        return create_response(status=False, message=str(e), status_code=500)
     
 
 @iotdevice.route("/register-device", methods=["POST"])
@@ -77,58 +85,301 @@ def register_device():
     Menerima perintah 'register device' dari Laravel dan meneruskannya
     ke MQTT Worker melalui Redis secara asinkron.
     """
-    if not redis_client:
-        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal"), 503
-
     try:
-        required = get_form_data(["device_id", "device_token", "warning_level", "danger_level", "sensor_height"]) 
-        device_id = required["device_id"]
-    
-        payload = {
-            "device_id": device_id,
-            "device_token": required["device_token"],
-            "warning_level": required["warning_level"],
-            "danger_level": required["danger_level"],
-            "sensor_height": required["sensor_height"],
-        }
+        payload = get_form_data(REGISTRATION_FIELDS)
 
         # Buat pesan lengkap untuk MQTT Worker
-        message = {
-            "type": "register_device", # Tipe perintah khusus
-            "device_id": device_id,
-            "topic": Config.REGISTRATION_REQUEST_TOPIC, # Tentukan topik
-            "payload": payload
-        }
+        message = _registration_message(payload)
 
         # Publikasikan ke Redis
-        redis_client.publish(COMMAND_CHANNEL, json.dumps(message))
+        command_id = publish_command(redis_client, message)
 
         # --- RESPON BARU ---
         # Langsung beri tahu Laravel bahwa perintah sudah diterima
         return create_response(
-            data=payload,
+            data={**payload, "command_id": command_id},
             message="Perintah registrasi telah diterima dan sedang diproses",
             status_code=202 # 202 Accepted
         )
 
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal publish ke Redis: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    except BadRequest:
+        raise  # field wajib tidak ada -> 400 dari get_form_data
     except Exception as e:
-        return create_response(status=False, message=str(e)), 500
+        return create_response(status=False, message=str(e), status_code=500)
+
+def _registration_message(payload):
+    return {
+        "type": "register_device", # Tipe perintah khusus
+        "device_id": payload["device_id"],
+        "topic": Config.REGISTRATION_REQUEST_TOPIC, # Tentukan topik
+        "payload": payload
+    }
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+def _read_bulk_body(max_bytes):
+    """Membaca body bulk; body yang lebih besar dari max_bytes ditolak sebelum dibaca/di-parse seluruhnya."""
+    if request.content_length is not None:
+        if request.content_length > max_bytes:
+            raise _BodyTooLarge()
+        return request.get_data()
+    # Transfer chunked: Content-Length tidak ada, baca paling banyak max_bytes + 1
+    body = request.stream.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        raise _BodyTooLarge()
+    return body
+
+
+def _bulk_entries(body):
+    """
+    Body bulk: array JSON, {"devices": [...]}, atau NDJSON (satu objek per baris).
+    Mengembalikan (entries, positions): positions[i] = nomor baris (mulai 0) entri ke-i pada body
+    NDJSON, atau None untuk array. Baris NDJSON yang bukan JSON valid dikembalikan sebagai None
+    agar dilaporkan per baris.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        entries, positions = [], []
+        for line_number, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json_codec.loads(line))
+            except ValueError:
+                entries.append(None)
+            positions.append(line_number)
+        return entries, positions
+    data = json_codec.loads(body)
+    if isinstance(data, dict):
+        data = data.get("devices")
+    if not isinstance(data, list):
+        raise ValueError("Body harus berupa array perangkat, {\"devices\": [...]}, atau NDJSON")
+    return data, None
+
+
+def _bulk_too_large():
+    return create_response(
+        status=False,
+        message=f"Maksimal {Config.BULK_REGISTRATION_MAX_DEVICES} perangkat "
+                f"({Config.BULK_REGISTRATION_MAX_BYTES} byte) per batch",
+        status_code=413
+    )
+
+
+@iotdevice.route("/register-devices", methods=["POST"])
+def register_devices():
+    """
+    Registrasi massal: semua perangkat divalidasi dalam satu pass lalu dikirim ke MQTT Worker
+    dalam satu pipeline Redis. Progres batch dipantau di /register-devices/<batch_id>.
+    """
+    try:
+        entries, positions = _bulk_entries(_read_bulk_body(Config.BULK_REGISTRATION_MAX_BYTES))
+    except _BodyTooLarge:
+        return _bulk_too_large()
+    except ValueError as e:
+        return create_response(status=False, message=f"Body tidak valid: {e}", status_code=400)
+    if len(entries) > Config.BULK_REGISTRATION_MAX_DEVICES:
+        return _bulk_too_large()
+
+    valid, errors = validate_entries(entries, REGISTRATION_FIELDS, "device_id")
+    if positions is not None:
+        # NDJSON: index = nomor baris body klien (baris kosong ikut dihitung)
+        for error in errors:
+            error["index"] = positions[error["index"]]
+    if not valid:
+        return create_response(status=False, message="Tidak ada perangkat yang valid",
+                               data={"rejected": errors}, status_code=400)
+
+    try:
+        batch_id, command_ids = publish_commands(redis_client, [_registration_message(p) for p in valid])
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal publish batch registrasi ke Redis: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+
+    logger.info(f"📦 (API Endpoints) Batch registrasi {batch_id}: {len(valid)} diterima, {len(errors)} ditolak")
+    return create_response(
+        data={
+            "batch_id": batch_id,
+            "accepted": [{"device_id": p["device_id"], "command_id": command_id}
+                         for p, command_id in zip(valid, command_ids)],
+            "rejected": errors,
+        },
+        message=f"{len(valid)} perintah registrasi diterima dan sedang diproses",
+        status_code=202
+    )
+
+
+@iotdevice.route("/register-devices/<batch_id>", methods=["GET"])
+def register_devices_status(batch_id):
+    """Progres batch registrasi: jumlah perintah per state dan state tiap perangkat."""
+    try:
+        status = get_batch_status(redis_client, batch_id)
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal membaca status batch: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    if status is None:
+        return create_response(status=False, message="Batch tidak dikenal atau sudah kedaluwarsa", status_code=404)
+    return create_response(data=status)
+
 
 @iotdevice.route('/<device_id>/change-status', methods=['PATCH'])
 def change_status(device_id):
     # Endpoint ini sebenarnya bisa digunakan untuk SEMUA command (bukan cuma status)
     data = request.json # Laravel mengirim {"cmd": "OTA_UPDATE", "url": "..."}
     
-    if not redis_client:
-         return create_response(status=False, message="Redis error"), 503
-
     try:
-        redis_client.publish('command_to_mqtt', json.dumps({
+        command_id = publish_command(redis_client, {
             "type": "command", 
             "device_id": device_id,
             "topic": f"{Config.MQTT_BASE_TOPIC_COMMAND}/{device_id}", 
             "payload": data 
-        }))
-        return jsonify({"status": "success", "message": "Command queued"}), 202
+        })
+        return jsonify({"status": "success", "message": "Command queued", "command_id": command_id}), 202
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal publish ke Redis: {e}")
+        return create_response(status=False, message="Redis error", status_code=503)
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
\ No newline at end of file
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _queue_group_command(target, payload, message, device_field=None):
+    error = validate_target(target)
+    if error:
+        return create_response(status=False, message=error, status_code=400)
+    try:
+        command_id = publish_command(redis_client, {
+            "type": "group_command",
+            "target": target,
+            "payload": payload,
+            "device_field": device_field,
+        })
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal publish perintah grup ke Redis: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    return create_response(data={"fanout_id": command_id, "target": target, "payload": payload},
+                           message=message, status_code=202)
+
+
+@iotdevice.route('/group-command', methods=['POST'])
+def group_command():
+    """
+    Satu perintah untuk banyak perangkat. Body: {"target": {...}, "payload": {...}} dengan target
+    berisi device_ids, groups, tags, regions, dan/atau "all": true (semua perangkat di whitelist).
+    Worker mengirimnya per perangkat dengan batas laju; progres di /group-command/<fanout_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get("payload"), dict):
+        return create_response(status=False, message="payload harus berupa objek", status_code=400)
+    return _queue_group_command(data.get("target"), data["payload"], "Perintah grup telah diterima")
+
+
+@iotdevice.route('/group-command/<fanout_id>', methods=['GET'])
+def group_command_status(fanout_id):
+    """Progres fan-out: total, terkirim (PUBACK), gagal, dilewati (tidak di whitelist), dan ack perangkat."""
+    try:
+        status = get_fanout_status(redis_client, fanout_id)
+        command = get_command_status(redis_client, fanout_id)
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal membaca progres fan-out: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    if status is None and command is None:
+        return create_response(status=False, message="Perintah grup tidak dikenal atau sudah kedaluwarsa",
+                               status_code=404)
+    # Belum diambil worker: hanya state perintahnya yang ada
+    return create_response(data=status or {"fanout_id": fanout_id, "state": command["state"]})
+
+
+@iotdevice.route('/groups', methods=['GET'])
+def list_groups():
+    """Semua grup perangkat beserta anggotanya."""
+    try:
+        groups = load_groups(redis_client)
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal membaca grup: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    return create_response(data={"groups": {name: sorted(members) for name, members in groups.items()}})
+
+
+@iotdevice.route('/groups/<group>', methods=['GET'])
+def get_group(group):
+    """Anggota grup perangkat (nama tag/region memakai prefix, mis. region:jatim)."""
+    try:
+        members = sorted(redis_client.smembers(group_key(group)))
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal membaca grup: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    return create_response(data={"group": group, "device_ids": members})
+
+
+@iotdevice.route('/groups/<group>', methods=['PUT'])
+def set_group(group):
+    """
+    Mengganti anggota grup perangkat. Grup yang sama dipakai selector perintah grup dan
+    langganan `groups` Socket.IO di web server. Body: {"device_ids": [...]}.
+    """
+    device_ids = (request.get_json(silent=True) or {}).get("device_ids")
+    if not isinstance(device_ids, list):
+        return create_response(status=False, message="device_ids harus berupa list", status_code=400)
+    try:
+        save_group(redis_client, group, [str(device_id) for device_id in device_ids])
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal menyimpan grup: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    logger.info(f"(API Endpoints) Grup perangkat '{group}' diperbarui ({len(device_ids)} perangkat)")
+    return create_response(data={"group": group, "device_ids": len(device_ids)})
+
+
+@iotdevice.route('/whitelist/invalidate', methods=['POST'])
+def invalidate_whitelist():
+    """
+    Dipanggil Laravel setiap kali daftar perangkat berubah, agar MQTT Worker tidak
+    menunggu jadwal refresh berikutnya. Body opsional: {"added": [...], "removed": [...]}.
+    """
+    data = request.get_json(silent=True) or {}
+    added = data.get("added") or []
+    removed = data.get("removed") or []
+    if not isinstance(added, list) or not isinstance(removed, list):
+        return create_response(status=False, message="added dan removed harus berupa list", status_code=400)
+
+    try:
+        publish_command(redis_client, {
+            "type": "whitelist_invalidate",
+            "added": added,
+            "removed": removed,
+        })
+        return create_response(
+            data={"added": len(added), "removed": len(removed)},
+            message="Invalidasi whitelist diteruskan ke MQTT Worker",
+            status_code=202
+        )
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal publish ke Redis: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+
+
+@iotdevice.route('/commands/latency', methods=['GET'])
+def command_latency():
+    """Histogram latensi perintah: dispatch (Redis -> worker), publish (worker -> MQTT), ack, dan total."""
+    try:
+        return create_response(data=get_latency_histograms(redis_client))
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal membaca histogram latensi: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+
+
+@iotdevice.route('/commands/<command_id>', methods=['GET'])
+def command_status(command_id):
+    """Status perintah: queued -> dispatched -> published -> acked (atau rejected/expired/failed)."""
+    try:
+        status = get_command_status(redis_client, command_id)
+    except redis.RedisError as e:
+        logger.error(f"❌ (API Endpoints) Gagal membaca status perintah: {e}")
+        return create_response(status=False, message="Koneksi ke service internal (Redis) gagal", status_code=503)
+    if status is None:
+        return create_response(status=False, message="Perintah tidak dikenal atau sudah kedaluwarsa", status_code=404)
+    return create_response(data=status)
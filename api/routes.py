@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify
-from influxdb.connection import influxdb
+from influxdb.registry import registry
 from config.settings import Config
 
 api = Blueprint("api", __name__)
@@ -13,7 +13,7 @@ def test():
 @api.route("/api/data/waterlevel", methods=["GET"])
 def get_waterlevel():
     query = f'from(bucket: "{Config.INFLUXDB_BUCKET}") |> range(start: -1h) |> filter(fn: (r) => r._measurement == "waterlevel")'
-    tables = influxdb.query_data(query)
+    tables = registry.query_api().query(query, org=Config.INFLUXDB_ORG)
 
     result = []
     for table in tables:
@@ -29,7 +29,7 @@ def get_waterlevel():
 @api.route("/api/data/sensor_status", methods=["GET"])
 def get_sensor_status():
     query = f'from(bucket: "{Config.INFLUXDB_BUCKET}") |> range(start: -1h) |> filter(fn: (r) => r._measurement == "sensor_status")'
-    tables = influxdb.query_data(query)
+    tables = registry.query_api().query(query, org=Config.INFLUXDB_ORG)
 
     result = []
     for table in tables:
@@ -1,15 +1,54 @@
+import logging
+import time
+from datetime import datetime, timezone
+
+import redis
 from flask import Blueprint, jsonify, request
-from influxdb_client import InfluxDBClient
 from config.settings import Config
+from helper import json_codec
 from helper.form_validation import get_form_data
 from helper.json_formatter import create_response
-
-# Inisialisasi InfluxDB Client
-client = InfluxDBClient(url=Config.INFLUXDB_URL, token=Config.INFLUXDB_TOKEN, org=Config.INFLUXDB_ORG)
-query_api = client.query_api()
+from helper.latest_store import get_latest, set_if_newer, to_record
+from helper.redis_connection import get_redis_client
+from helper.trend_cache import TrendCache, parse_duration, parse_time
+from influxdb.influxdb_helper import FIELD, MEASUREMENT, TAG
+from influxdb.registry import registry
 
 # Blueprint untuk Water Level
 waterlevel = Blueprint("waterlevel", __name__)
+logger = logging.getLogger(__name__)
+
+# Client bersama per proses; koneksi dibuka saat request pertama, bukan saat import
+redis_client = get_redis_client()
+
+def _query_trend_influx(sensor_id, start, stop, window):
+    """Mean water level per jendela pada [start, stop) (epoch detik); kunci hasil = awal jendela."""
+    query = f"""
+    from(bucket: "{Config.INFLUXDB_BUCKET}")
+    |> range(start: {int(start)}, stop: {int(stop)})
+    |> filter(fn: (r) => r["_measurement"] == "{MEASUREMENT}")
+    |> filter(fn: (r) => r["{TAG}"] == {json_codec.dumps_str(sensor_id)})
+    |> filter(fn: (r) => r["_field"] == "{FIELD}")
+    |> aggregateWindow(every: {window}s, fn: mean, createEmpty: false, timeSrc: "_start")
+    |> yield(name: "mean")
+    """
+    result = registry.query_api().query(org=Config.INFLUXDB_ORG, query=query)
+
+    means = {}
+    for table in result:
+        for record in table.records:
+            means[int(record.get_time().timestamp())] = record.get_value()
+    return means
+
+
+# Cache per proses web server; statistiknya ditampilkan di /metrics
+trend_cache = TrendCache(
+    _query_trend_influx,
+    max_entries=Config.TREND_CACHE_MAX_ENTRIES,
+    ttl=Config.TREND_CACHE_TTL,
+    settle=Config.TREND_CACHE_SETTLE,
+)
+
 
 @waterlevel.route("/trend", methods=["POST"])
 def get_water_level_trend():
@@ -19,40 +58,36 @@ def get_water_level_trend():
     {
         "sensor_id": "sensor_1",
         "start": "-7d",
-        "stop": "now"
+        "stop": "now",
+        "window": "1h"
     }
+    start/stop menerima waktu relatif ('-7d', 'now') atau RFC3339; window opsional (default 1h).
+    Jendela penuh yang sudah tertutup dilayani dari trend_cache; jendela terbuka dan jendela tepi yang
+    terpotong start/stop dihitung ulang dengan batas persis.
     """
-
-
     required = get_form_data(["sensor_id", "start", "stop"]) 
     sensor_id = required["sensor_id"]
-    start = required["start"]  # Default 7 hari terakhir
-    stop =required['stop'] # Default sekarang
-    
-    print(f"sensor_id: {sensor_id}, start: {start}, stop: {stop}")
-
-    if not sensor_id:
-        return jsonify({"error": "sensor_id is required"}), 400
-
-    query = f"""
-    from(bucket: "{Config.INFLUXDB_BUCKET}")
-    |> range(start: time(v: "{start}"), stop: time(v: "{stop}"))
-    |> filter(fn: (r) => r["_measurement"] == "WaterLevel")
-    |> filter(fn: (r) => r["sensor_id"] == "{sensor_id}")
-    |> filter(fn: (r) => r["_field"] == "water_level")
-    |> aggregateWindow(every: 1h, fn: mean, createEmpty: false)
-    |> yield(name: "mean")
-    """
-    
-    result = query_api.query(org=Config.INFLUXDB_ORG, query=query)
-
-    data_points = []
-    for table in result:
-        for record in table.records:
-            data_points.append({
-                "time": record.get_time().isoformat(),
-                "water_level": record.get_value()
-            })
+    body = request.get_json(silent=True) or {}
+
+    now = time.time()
+    try:
+        start = parse_time(required["start"], now)
+        stop = parse_time(required["stop"], now)
+        window = parse_duration(body.get("window", Config.TREND_DEFAULT_WINDOW))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if stop <= start:
+        return jsonify({"error": "stop must be after start"}), 400
+    if window < 60 or (stop - start) / window > Config.TREND_MAX_WINDOWS:
+        return jsonify({"error": f"window must be at least 1m and cover at most {Config.TREND_MAX_WINDOWS} windows"}), 400
+
+    series = trend_cache.series(sensor_id, start, stop, window)
+
+    data_points = [{
+        # Waktu record = akhir jendela (sama dengan aggregateWindow default), dibatasi stop
+        "time": datetime.fromtimestamp(min(window_start + window, stop), tz=timezone.utc),
+        "water_level": value
+    } for window_start, value in series]
 
     if not data_points:
         return jsonify({"message": "No data available for this sensor."})
@@ -75,49 +110,86 @@ def get_water_level_trend():
         "records": data_points  # Menyertakan semua record hasil query
     }
 
-
-
     return create_response(
         data = response_data, 
         message = "Success get trend water level"
         )
     
-    # return create_response(data=data, message="Debug get data form request")
-    
-@waterlevel.route("/latest", methods=["POST"])
-def get_water_level_latest():
-    # ...
-    required = get_form_data(["sensor_id"])
-    sensor_id = required["sensor_id"]
 
-    if not sensor_id:
-        return jsonify({"error": "sensor_id is required"}), 400
-
-    # PERBAIKAN: Query disesuaikan dengan skema yang benar
+def _query_latest_influx(device_ids):
+    """Fallback saat cache miss: pembacaan terakhir beberapa perangkat dalam satu query Flux."""
     query = f"""
     from(bucket: "{Config.INFLUXDB_BUCKET}")
-      |> range(start: -7d)
-      |> filter(fn: (r) => r["_measurement"] == "water_level") 
-      |> filter(fn: (r) => r["device_id"] == "{sensor_id}")
-      |> filter(fn: (r) => r["_field"] == "height")
+      |> range(start: {Config.LATEST_FALLBACK_RANGE})
+      |> filter(fn: (r) => r["_measurement"] == "{MEASUREMENT}")
+      |> filter(fn: (r) => r["_field"] == "{FIELD}")
+      |> filter(fn: (r) => contains(value: r["{TAG}"], set: {json_codec.dumps_str(device_ids)}))
       |> last()
     """
+    result = registry.query_api().query(org=Config.INFLUXDB_ORG, query=query)
 
-    result = query_api.query(org=Config.INFLUXDB_ORG, query=query)
-
-    latest_record = None
+    readings = {}
     for table in result:
         for record in table.records:
-            latest_record = {
-                "time": record.get_time().isoformat(),
-                "height": record.get_value(), 
-                "device_id": sensor_id
-            }
+            readings[record.values.get(TAG)] = {"water_level": record.get_value(), "ts": record.get_time().timestamp()}
+    return readings
+
+
+def _latest_readings(device_ids):
+    """HMGET ke nilai terakhir yang ditulis MQTT Worker; hanya yang tidak ada yang ditanyakan ke InfluxDB."""
+    try:
+        readings = get_latest(redis_client, device_ids)
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ (API Waterlevel) Cache nilai terakhir tidak tersedia, memakai InfluxDB: {e}")
+        readings = dict.fromkeys(device_ids)
+
+    missing = [device_id for device_id, reading in readings.items() if reading is None]
+    if missing:
+        found = _query_latest_influx(missing)
+        readings.update(found)
+        try:
+            # Isi cache; pembacaan yang lebih baru dari worker tidak ditimpa
+            set_if_newer(redis_client, found)
+        except redis.RedisError:
+            pass
+    return readings
 
-    if not latest_record:
-        return jsonify({"message": "No recent data found for this sensor."}), 404
 
-    return create_response(data=latest_record, message="Success get latest water level")
+@waterlevel.route("/latest", methods=["POST"])
+def get_water_level_latest():
+    """
+    Nilai water level terakhir. Body: {"sensor_id": "..."} atau {"sensor_ids": ["...", ...]}.
+    Dibaca dari HASH Redis yang diperbarui jalur ingest; InfluxDB hanya ditanya untuk perangkat yang belum ada.
+    """
+    body = request.get_json(silent=True) or {}
+    sensor_ids = body.get("sensor_ids")
+
+    if sensor_ids is None:
+        sensor_id = body.get("sensor_id")
+        if not sensor_id:
+            return jsonify({"error": "sensor_id is required"}), 400
+        if not isinstance(sensor_id, str):
+            return jsonify({"error": "sensor_id must be a string"}), 400
+        reading = _latest_readings([sensor_id])[sensor_id]
+        if not reading:
+            return jsonify({"message": "No recent data found for this sensor."}), 404
+        return create_response(data=to_record(sensor_id, reading), message="Success get latest water level")
+
+    if not isinstance(sensor_ids, list) or not sensor_ids:
+        return jsonify({"error": "sensor_ids must be a non-empty list"}), 400
+    if not all(isinstance(sensor_id, str) and sensor_id for sensor_id in sensor_ids):
+        return jsonify({"error": "sensor_ids must contain only non-empty strings"}), 400
+    if len(sensor_ids) > Config.LATEST_MAX_DEVICES:
+        return jsonify({"error": f"sensor_ids is limited to {Config.LATEST_MAX_DEVICES} devices"}), 400
+
+    readings = _latest_readings(list(dict.fromkeys(sensor_ids)))
+    return create_response(
+        data={
+            "devices": {device_id: to_record(device_id, r) for device_id, r in readings.items() if r},
+            "missing": [device_id for device_id, r in readings.items() if not r],
+        },
+        message="Success get latest water level"
+    )
 
 @waterlevel.route("/test", methods=["GET"])
 def test():
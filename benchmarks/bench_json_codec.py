@@ -0,0 +1,74 @@
+"""
+Benchmark biaya serialisasi JSON end-to-end per pembacaan water level: json standar vs helper.json_codec.
+
+Jalur yang diukur untuk setiap pembacaan:
+  1. MQTT Worker   : decode payload MQTT
+  2. MQTT Worker   : encode envelope batch ke Redis (data_for_dashboard)
+  3. Web Server    : decode envelope dari Redis
+  4. Web Server    : encode frame Socket.IO (water_level_batch)
+  5. HTTP /latest  : encode response create_response dengan timestamp
+
+Jalankan dari direktori root proyek:
+    python benchmarks/bench_json_codec.py [jumlah_pembacaan]
+"""
+from datetime import datetime, timezone
+import json
+import sys
+import timeit
+
+sys.path.append('.') # Menambahkan direktori root proyek ke path
+from helper import json_codec
+
+BATCH_SIZE = 200  # sama dengan DASHBOARD_BATCH_MAX_ITEMS default
+
+
+def make_readings(n):
+    return [{
+        "device_id": f"SIM-{i % 1000:06d}",
+        "water_level": 42.5 + i % 7,
+        "fw_version": "1.4.2",
+        "rssi": -60 - i % 30,
+        "timestamp": "2024-05-01T12:30:00",
+    } for i in range(n)]
+
+
+def stdlib_path(raw_payloads, now):
+    """Jalur sebelum codec: json standar di setiap hop, datetime di-isoformat() manual."""
+    readings = [json.loads(raw.decode()) for raw in raw_payloads]
+    for start in range(0, len(readings), BATCH_SIZE):
+        batch = readings[start:start + BATCH_SIZE]
+        message = json.dumps({"type": "water_level_batch", "readings": batch})
+        received = json.loads(message)["readings"]
+        json.dumps({"readings": received, "count": len(received)}, separators=(",", ":"))
+    for reading in readings:
+        json.dumps({"status": True, "message": "Success", "data": {
+            "time": now.isoformat(), "height": reading["water_level"], "device_id": reading["device_id"]}})
+
+
+def codec_path(raw_payloads, now):
+    """Jalur dengan helper.json_codec; datetime diserialisasi langsung."""
+    readings = [json_codec.loads(raw) for raw in raw_payloads]
+    for start in range(0, len(readings), BATCH_SIZE):
+        batch = readings[start:start + BATCH_SIZE]
+        message = json_codec.dumps({"type": "water_level_batch", "readings": batch})
+        received = json_codec.loads(message)["readings"]
+        json_codec.dumps_str({"readings": received, "count": len(received)})
+    for reading in readings:
+        json_codec.dumps({"status": True, "message": "Success", "data": {
+            "time": now, "height": reading["water_level"], "device_id": reading["device_id"]}})
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    raw_payloads = [json.dumps(r).encode() for r in make_readings(n)]
+    now = datetime.now(timezone.utc)
+
+    results = {}
+    for name, func in [("json (stdlib)", stdlib_path), (f"json_codec ({json_codec.BACKEND})", codec_path)]:
+        best = min(timeit.repeat(lambda: func(raw_payloads, now), number=1, repeat=5))
+        results[name] = best
+        print(f"{name:<24} {best / n * 1e6:8.3f} µs/pembacaan  ({n / best:,.0f} pembacaan/s)")
+
+    baseline = results["json (stdlib)"]
+    for name, best in results.items():
+        print(f"{name:<24} speedup x{baseline / best:.1f}")
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark: influxdb_client.Point vs LineProtocolEncoder untuk satu pembacaan water level.
+
+Jalankan dari direktori root proyek:
+    python benchmarks/bench_line_protocol.py [jumlah_iterasi]
+"""
+import sys
+import time
+import timeit
+
+sys.path.append('.') # Menambahkan direktori root proyek ke path
+from influxdb_client import Point, WritePrecision
+from influxdb.line_protocol import LineProtocolEncoder
+
+MEASUREMENT = "TestingIoTFinal"
+DEVICE_IDS = [f"SIM-{i:06d}" for i in range(1000)]
+
+
+def bench_point(n):
+    ts = time.time_ns()
+    for i in range(n):
+        Point(MEASUREMENT) \
+            .tag("device_id", DEVICE_IDS[i % len(DEVICE_IDS)]) \
+            .field("water_level", 42.5 + i % 7) \
+            .time(ts, WritePrecision.NS) \
+            .to_line_protocol()
+
+
+def bench_encoder(n, encoder=LineProtocolEncoder(MEASUREMENT)):
+    ts = time.time_ns()
+    for i in range(n):
+        encoder.encode(DEVICE_IDS[i % len(DEVICE_IDS)], {"water_level": 42.5 + i % 7}, ts)
+
+
+def bench_encoder_into(n, encoder=LineProtocolEncoder(MEASUREMENT)):
+    ts = time.time_ns()
+    buf = bytearray()
+    for i in range(n):
+        encoder.encode_into(buf, DEVICE_IDS[i % len(DEVICE_IDS)], {"water_level": 42.5 + i % 7}, ts)
+        buf += b"\n"
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    results = {}
+    for name, func in [("Point.to_line_protocol", bench_point),
+                       ("LineProtocolEncoder.encode", bench_encoder),
+                       ("LineProtocolEncoder.encode_into", bench_encoder_into)]:
+        best = min(timeit.repeat(lambda: func(n), number=1, repeat=5))
+        results[name] = best
+        print(f"{name:<34} {best / n * 1e6:8.3f} µs/record  ({n / best:,.0f} record/s)")
+
+    baseline = results["Point.to_line_protocol"]
+    for name, best in results.items():
+        print(f"{name:<34} speedup x{baseline / best:.1f}")
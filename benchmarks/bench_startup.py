@@ -0,0 +1,144 @@
+"""
+Benchmark startup untuk cmd/web_server dan cmd/mqtt_worker.
+
+Mengukur dua hal untuk setiap proses:
+  1. Waktu import modul entry point (python -X importtime), termasuk modul paling lambat.
+  2. Time-to-first-request: web server sampai GET /health menjawab 200,
+     MQTT worker sampai log "MQTT Worker berjalan" muncul.
+
+Jalankan dari direktori root proyek:
+    python benchmarks/bench_startup.py [--runs 5] [--json hasil.json]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ENTRY_POINTS = {
+    "web_server": "cmd/web_server/main.py",
+    "mqtt_worker": "cmd/mqtt_worker/main.py",
+}
+
+# Memuat entry point sebagai modul biasa (__name__ != "__main__") agar server tidak dijalankan
+IMPORT_SNIPPET = (
+    "import sys, importlib.util as u; sys.path.insert(0, '.'); "
+    "spec = u.spec_from_file_location('entry', {path!r}); "
+    "spec.loader.exec_module(u.module_from_spec(spec))"
+)
+
+
+def measure_import(path, top=5):
+    """Menjalankan import dengan -X importtime; mengembalikan total waktu dan modul terlambat."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET.format(path=path)],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((int(cumulative_us), int(self_us), name[1:]))
+
+    # Modul bersarang diberi indentasi dua spasi per level oleh -X importtime
+    top_level = [m for m in modules if not m[2].startswith(" ")]
+    return {
+        "ok": proc.returncode == 0,
+        "wall_ms": round(wall_ms, 1),
+        "import_cumulative_ms": round(sum(m[0] for m in top_level) / 1000, 1),
+        "slowest_modules": [
+            {"module": name.strip(), "cumulative_ms": round(cum / 1000, 1)}
+            for cum, _, name in sorted(modules, reverse=True)[:top]
+        ],
+        "error": None if proc.returncode == 0 else proc.stderr.strip().splitlines()[-1:],
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(name, path, timeout=60):
+    """Menjalankan proses dan mengukur waktu sampai siap melayani."""
+    env = os.environ.copy()
+    port = free_port()
+    env["WEB_SERVER_PORT"] = str(port)
+    env["PYTHONUNBUFFERED"] = "1"
+
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, env=env)
+    try:
+        if name == "web_server":
+            url = f"http://127.0.0.1:{port}/health"
+            while time.perf_counter() - started < timeout:
+                if proc.poll() is not None:
+                    return None
+                try:
+                    with urllib.request.urlopen(url, timeout=0.5) as response:
+                        if response.status == 200:
+                            return (time.perf_counter() - started) * 1000
+                except OSError:
+                    time.sleep(0.02)
+        else:
+            for line in proc.stdout:
+                if "MQTT Worker berjalan" in line:
+                    return (time.perf_counter() - started) * 1000
+                if time.perf_counter() - started > timeout:
+                    break
+        return None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Tambahkan hasil ke file JSON (satu objek per baris) untuk tracking")
+    args = parser.parse_args()
+
+    report = {"timestamp": time.time(), "fast_start": os.getenv("FAST_START", "true"), "results": {}}
+    for name, path in ENTRY_POINTS.items():
+        imports = [measure_import(path) for _ in range(args.runs)]
+        ttfr = [t for t in (time_to_first_request(name, path) for _ in range(args.runs)) if t is not None]
+        result = {
+            "import_ms_median": round(statistics.median(i["import_cumulative_ms"] for i in imports), 1),
+            "import_wall_ms_median": round(statistics.median(i["wall_ms"] for i in imports), 1),
+            "slowest_modules": imports[-1]["slowest_modules"],
+            "time_to_first_request_ms_median": round(statistics.median(ttfr), 1) if ttfr else None,
+            "successful_starts": f"{len(ttfr)}/{args.runs}",
+            "import_error": imports[-1]["error"],
+        }
+        report["results"][name] = result
+
+        print(f"== {name} ({path})")
+        print(f"   import (kumulatif)    : {result['import_ms_median']} ms "
+              f"(wall {result['import_wall_ms_median']} ms)")
+        print(f"   time-to-first-request : {result['time_to_first_request_ms_median']} ms "
+              f"[{result['successful_starts']} start berhasil]")
+        for module in result["slowest_modules"]:
+            print(f"     {module['cumulative_ms']:>8} ms  {module['module']}")
+        if result["import_error"]:
+            print(f"   ⚠️ import gagal: {result['import_error']}")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import logging
-import json
 import threading
 import time
 import paho.mqtt.client as mqtt
@@ -7,12 +6,33 @@ import requests
 import redis
 import sys
 import signal
+import argparse
+import os
+import socket
 
 # --- Konfigurasi Awal ---
 sys.path.append('.') # Menambahkan direktori root proyek ke path
 try:
     from config.settings import Config
-    from influxdb.influxdb_helper import write_data
+    from influxdb.influxdb_helper import write_data, flush_writes
+    from helper.ingest_pipeline import IngestPipeline
+    from helper.heartbeat_aggregator import HeartbeatAggregator
+    from helper.redis_connection import get_redis_client
+    from helper.redis_batcher import RedisPublishBatcher
+    from helper.readiness import ReadinessProbe
+    from helper.whitelist_sync import WhitelistSync
+    from helper.shared_whitelist import SharedWhitelist
+    from helper import json_codec
+    from helper.device_gate import DeviceGate
+    from helper.command_bus import COMMAND_CHANNEL, CommandStreamConsumer, claim_command
+    from helper.command_tracker import CommandTracker
+    from helper.latest_store import LatestValueStore
+    from helper.command_fanout import FanoutDispatcher, FanoutJob, expand_target, load_group_members
+    from helper.shared_whitelist import default_instance_id
+    from mqtt.supervisor import WorkerSupervisor
+    from mqtt.message_handler import MessageHandler
+    from mqtt.async_worker import run_async_worker
+    from influxdb.registry import registry
 except ImportError as e:
     print(f"Error: Gagal mengimpor modul. Pastikan Anda menjalankan skrip dari direktori root. {e}")
     sys.exit(1)
@@ -22,164 +42,285 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(messa
 logger = logging.getLogger("MQTTWorker")
 
 # --- Channel Redis ---
-COMMAND_CHANNEL = "command_to_mqtt"    # Channel untuk menerima perintah dari web_server
 DATA_CHANNEL = "data_for_dashboard" # Channel untuk mengirim data ke web_server
+METRICS_KEY = "metrics:mqtt_worker"  # HASH instance_id -> statistik terakhir, dibaca /metrics web server
+SUPERVISOR_METRICS_KEY = "metrics:mqtt_supervisor"  # HASH hostname -> statistik gabungan supervisor
 
 class MQTTWorker:
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
         
         # --- State ---
-        self.client = mqtt.Client()
+        # Client ID unik per instance: broker memutus client lama jika ID sama dipakai dua proses
+        self.instance_id = f"{Config.MQTT_CLIENT_ID_PREFIX}-{default_instance_id()}".replace(":", "-")
+        self.client = mqtt.Client(client_id=self.instance_id)
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
         self.client.reconnect_delay_set(min_delay=1, max_delay=120)
+        # Jendela QoS 1 paho (default 20) disamakan dengan batas inflight fan-out
+        self.client.max_inflight_messages_set(Config.FANOUT_MAX_INFLIGHT)
         
         self.is_running = False
-        self.whitelist_cache = set()
         self.refresh_thread = None
+
+        # --- Pipeline ingest: callback paho hanya enqueue, worker pool yang memproses ---
+        self.ingest = IngestPipeline(
+            handler=self._process_message,
+            num_workers=Config.INGEST_WORKERS,
+            max_size=Config.INGEST_QUEUE_SIZE,
+            policy=Config.INGEST_QUEUE_POLICY,
+            name="mqtt-ingest",
+        )
+
+        # --- Heartbeat ke Laravel: dikumpulkan per perangkat lalu di-flush berkala ---
+        self.heartbeats = HeartbeatAggregator(
+            base_url=Config.HEARTBEAT_BASE_URL,
+            flush_interval=Config.HEARTBEAT_FLUSH_INTERVAL,
+            batch_url=Config.HEARTBEAT_BATCH_URL,
+            pool_size=Config.HEARTBEAT_POOL_SIZE,
+        )
         
-        # --- Koneksi ke Redis ---
-        try:
-            self.redis_client = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                db=0,
-                decode_responses=True # Otomatis decode
-            )
-            self.redis_client.ping()
-            self.logger.info("✅ (MQTT Worker) Berhasil terhubung ke Redis.")
-        except Exception as e:
-            self.logger.error(f"❌ (MQTT Worker) Gagal terhubung ke Redis: {e}")
-            sys.exit(1)
+        # --- Koneksi ke Redis (dibuka saat pertama kali dipakai) ---
+        self.redis_client = get_redis_client()
+
+        # --- Whitelist: disinkronkan per delta dan dibagi antar proses worker lewat Redis ---
+        # Pengecekan `in` dari worker ingest tetap di memori tanpa lock
+        self.whitelist_cache = SharedWhitelist(
+            self.redis_client if Config.WHITELIST_SHARED else None,
+            WhitelistSync(
+                url=Config.WHITELIST_API_URL,
+                min_interval=Config.WHITELIST_SYNC_MIN_INTERVAL,
+                max_interval=Config.WHITELIST_SYNC_MAX_INTERVAL,
+                session=requests.Session(),
+            ),
+            instance_id=self.instance_id,
+            leader_ttl=Config.WHITELIST_LEADER_TTL,
+        )
+
+        # --- Penolakan perangkat tidak dikenal: negative cache + log tersampel ---
+        self.device_gate = DeviceGate(
+            self.whitelist_cache,
+            lookup=self.whitelist_cache.lookup_remote,
+            negative_ttl=Config.REJECT_CACHE_TTL,
+            log_every=Config.REJECT_LOG_EVERY,
+            log_interval=Config.REJECT_LOG_INTERVAL,
+        )
+
+        # --- Publish ke dashboard dikumpulkan beberapa milidetik per round trip Redis ---
+        self.dashboard_publisher = RedisPublishBatcher(
+            self.redis_client,
+            DATA_CHANNEL,
+            max_items=Config.DASHBOARD_BATCH_MAX_ITEMS,
+            max_delay=Config.DASHBOARD_BATCH_MAX_DELAY_MS / 1000,
+            mode=Config.DASHBOARD_BATCH_MODE,
+            max_pending=Config.DASHBOARD_BATCH_MAX_PENDING,
+        )
+
+        # --- Pelacakan perintah (state + histogram latensi di Redis, ditulis per batch) ---
+        self.command_tracker = CommandTracker(self.redis_client)
+
+        # --- Nilai terakhir per perangkat untuk /latest (dict lokal, di-mirror ke Redis per batch) ---
+        self.latest = LatestValueStore(self.redis_client, flush_interval=Config.LATEST_FLUSH_INTERVAL)
+
+        # --- Logika pemrosesan pesan (sama untuk engine thread dan asyncio) ---
+        self.handler = MessageHandler(Config, self.whitelist_cache, self.device_gate,
+                                      self.dashboard_publisher, self.heartbeats, write_data, self.logger,
+                                      tracker=self.command_tracker, latest=self.latest)
+
+        # --- Perintah ke perangkat: Redis Stream + consumer group (satu worker per perintah) ---
+        self.commands = CommandStreamConsumer(
+            self.redis_client,
+            self.instance_id,
+            self._handle_command,
+            batch_size=Config.COMMAND_STREAM_BATCH,
+            block_ms=Config.COMMAND_STREAM_BLOCK_MS,
+            reclaim_idle_ms=Config.COMMAND_RECLAIM_IDLE_MS,
+            max_deliveries=Config.COMMAND_MAX_DELIVERIES,
+            max_age=Config.COMMAND_MAX_AGE,
+            on_expired=lambda message: self.command_tracker.finished(message, "expired"),
+        )
+
+        # --- Perintah grup: diekspansi per perangkat, dikirim dengan batas laju & inflight ---
+        self.fanout = FanoutDispatcher(
+            self.redis_client,
+            self._publish_fanout,
+            rate=Config.FANOUT_RATE,
+            max_inflight=Config.FANOUT_MAX_INFLIGHT,
+            progress_interval=Config.FANOUT_PROGRESS_INTERVAL,
+            on_done=self._fanout_done,
+        )
+
+        # --- Readiness dependensi, diperiksa di background ---
+        self.readiness = ReadinessProbe(interval=Config.READINESS_INTERVAL)
+        self.readiness.register("redis", self.redis_client.ping)
+        self.readiness.register("mqtt", self.client.is_connected)
+        self.readiness.register("influxdb", lambda: registry.client().ping(), required=False)
             
     # --- Callbacks MQTT ---
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             self.logger.info("✅ (MQTT) Berhasil terhubung ke Broker!")
             client.subscribe([
-                (Config.MQTT_TOPIC_WATERLEVEL, 0),
-                (Config.MQTT_TOPIC_STATUS, 1),
-                (Config.REGISTRATION_RESPONSE_TOPIC, 0) # Tetap subscribe untuk update whitelist
+                # '#' juga mencakup topik dasar; di bawahnya boleh ada suffix format
+                # (iot/waterlevel/msgpack) dan/atau ID perangkat (iot/waterlevel/SIM-01/cbor)
+                (self._data_topic(f"{Config.MQTT_TOPIC_WATERLEVEL}/#"), 0),
+                (self._data_topic(Config.MQTT_TOPIC_STATUS), 1),
+                (self._data_topic(Config.MQTT_TOPIC_COMMAND_ACK), 1),
+                # Tidak di-share: setiap instance harus melihat registrasi untuk memperbarui whitelist
+                (Config.REGISTRATION_RESPONSE_TOPIC, 0)
             ])
-            self.logger.info(f"👂 (MQTT) Berlangganan ke topik data.")
+            mode = f"shared group '{Config.MQTT_SHARED_GROUP}'" if Config.MQTT_SHARED_GROUP else "tanpa shared subscription"
+            self.logger.info(f"👂 (MQTT) Berlangganan ke topik data ({mode}, client ID {self.instance_id}).")
         else:
             self.logger.error(f"❌ (MQTT) Gagal terhubung, kode: {rc}")
 
-    def on_message(self, client, userdata, msg):
-        try:
-            payload = json.loads(msg.payload.decode())
-            device_id = payload.get("device_id") or payload.get("sensor_id")
-
-            # --- Logika untuk Respons Registrasi ---
-            if msg.topic == Config.REGISTRATION_RESPONSE_TOPIC:
-                if payload.get("status") == "success" and device_id:
-                    self.whitelist_cache.add(device_id)
-                    self.logger.info(f"✅ (Whitelist) Perangkat {device_id} berhasil terdaftar via MQTT.")
-                else:
-                    self.logger.warning(f"Registrasi MQTT gagal: {payload.get('message')}")
-                return
-
-            # --- Logika untuk Data Sensor ---
-            if not device_id:
-                self.logger.warning("❌ Payload tidak ada device_id. Diabaikan.")
-                return
-
-            if device_id not in self.whitelist_cache:
-                self.logger.warning(f"⛔ Perangkat tidak sah: {device_id}. Pesan ditolak.")
-                return
-
-            if msg.topic == Config.MQTT_TOPIC_WATERLEVEL:
-                # 1. Tulis ke InfluxDB
-                write_data(payload)
-                # 2. Teruskan data ke Dashboard (via Redis)
-                self.redis_client.publish(DATA_CHANNEL, json.dumps(payload))
-                self.logger.info(f"Menerima data dari {device_id} dan meneruskannya ke dashboard.")
-                try:
-                    # Ambil data spesifik untuk heartbeat
-                    heartbeat_data = {
-                        "fw_version": payload.get("fw_version"),
-                        "rssi": payload.get("rssi")
-                    }
-                    
-                    #TODO Pastikan URL Laravel benar (bisa ditaruh di Config)
-                    laravel_url = f"http://localhost:8000/api/iot/{device_id}/heartbeat"
-                    
-                    # Kirim request (timeout kecil agar tidak memblokir lama)
-                    requests.post(laravel_url, json=heartbeat_data, timeout=2)
-                    
-                except Exception as req_err:
-                    self.logger.error(f"Gagal update heartbeat ke Laravel: {req_err}")
+    @staticmethod
+    def _data_topic(topic):
+        """Topik data di-subscribe lewat $share/<group>/ agar tiap pesan hanya diterima satu instance."""
+        if Config.MQTT_SHARED_GROUP:
+            return f"$share/{Config.MQTT_SHARED_GROUP}/{topic}"
+        return topic
 
-                self.logger.info(f"Data diproses untuk {device_id} (Ver: {payload.get('fw_version')})")
+    def on_message(self, client, userdata, msg):
+        """
+        Berjalan di thread jaringan paho: hanya memasukkan pesan mentah ke antrian
+        agar dependensi yang lambat tidak menahan keepalive dan perangkat lain.
+        """
+        if not self.handler.admit_topic(msg.topic):
+            return
+        if not self.ingest.submit((msg.topic, msg.payload)):
+            self.logger.debug(f"Antrian ingest penuh, pesan dari topik {msg.topic} dibuang.")
 
-        except Exception as e:
-            self.logger.error(f"❌ Error memproses pesan MQTT: {e}", exc_info=True)
+    def _process_message(self, item):
+        """Dipanggil oleh worker pool untuk setiap pesan (topic, payload mentah)."""
+        self.handler.handle(*item)
 
     def on_disconnect(self, client, userdata, rc):
         if rc != 0:
             self.logger.warning(f"🔌 (MQTT) Koneksi terputus (Code: {rc}). Mencoba terhubung kembali...")
 
-    # --- Logika Whitelist (Tidak berubah) ---
+    # --- Logika Whitelist ---
     def load_whitelist_from_backend(self):
-        backend_url = Config.WHITELIST_API_URL 
-        try:
-            self.logger.info("⏳ Memuat whitelist dari backend...")
-            response = requests.get(backend_url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                self.whitelist_cache = set(data.get("device_ids", []))
-                self.logger.info(f"✅ Whitelist dimuat. Total perangkat: {len(self.whitelist_cache)}")
-            else:
-                self.logger.error(f"❌ Gagal memuat whitelist. Status: {response.status_code}")
-        except requests.RequestException as e:
-            self.logger.error(f"❌ Error saat memuat whitelist: {e}")
+        """Sinkronisasi kondisional: hanya perubahan sejak versi terakhir yang diunduh."""
+        return self.whitelist_cache.sync()
 
     def _periodic_whitelist_refresh_loop(self):
         self.logger.info("Thread background refresh whitelist dimulai.")
         while self.is_running:
             self.load_whitelist_from_backend()
-            time.sleep(3600) # Refresh setiap 1 jam
+            # Interval adaptif; dibangunkan lebih awal oleh invalidasi via Redis
+            self.whitelist_cache.wait()
         self.logger.info("Thread background refresh whitelist berhenti.")
 
     # --- Listener Redis (Logika Inti Baru) ---
     def _redis_listener_loop(self):
         """
-        Mendengarkan perintah dari Web Server (via Redis) dan
-        meneruskannya ke perangkat (via MQTT).
+        Mendengarkan pesan siaran dari Web Server / API (via Redis Pub/Sub), mis. invalidasi
+        whitelist, serta perintah dari produsen lama yang belum memakai stream.
         """
         self.logger.info("Memulai listener Redis Pub/Sub untuk perintah...")
-        pubsub = self.redis_client.pubsub()
-        pubsub.subscribe(COMMAND_CHANNEL) # Channel perintah dari Flask
-        
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                try:
-                    data = json.loads(message['data'])
-                    self.logger.info(f"Menerima perintah dari Redis: {data.get('type')}")
-                    
-                    if data['type'] == 'register_device':
-                        self._handle_mqtt_publish(data['topic'], data['payload'])
-                    
-                    elif data['type'] == 'command':
-                        # Validasi whitelist sebelum mengirim perintah
-                        if data['device_id'] in self.whitelist_cache:
-                            self._handle_mqtt_publish(data['topic'], data['payload'])
-                        else:
-                            self.logger.warning(f"Perintah ditolak: {data['device_id']} tidak ada di whitelist.")
-                            
-                except Exception as e:
-                    self.logger.error(f"Error memproses pesan dari Redis: {e}")
+        backoff = 1
+        while self.is_running:
+            try:
+                pubsub = self.redis_client.pubsub()
+                pubsub.subscribe(COMMAND_CHANNEL) # Channel perintah dari Flask
+                backoff = 1
+
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._handle_redis_command(message['data'])
+            except redis.RedisError as e:
+                # Redis belum siap / terputus: coba lagi tanpa menghentikan worker
+                self.logger.warning(f"⚠️ Listener Redis terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _command_stream_loop(self):
+        """Membaca perintah ke perangkat dari Redis Stream per batch (XREADGROUP) dan meng-ack-nya."""
+        self.logger.info("Memulai consumer Redis Stream untuk perintah ke perangkat...")
+        backoff = 1
+        while self.is_running:
+            try:
+                self.commands.poll()
+                backoff = 1
+            except redis.RedisError as e:
+                self.logger.warning(f"⚠️ Consumer stream perintah terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _handle_redis_command(self, raw):
+        try:
+            data = json_codec.loads(raw)
+            # Semua instance menerima pesan pub/sub yang sama; perintah ke perangkat hanya dikirim sekali
+            if not claim_command(self.redis_client, data, self.instance_id):
+                self.logger.debug(f"Perintah {data.get('command_id')} sudah ditangani instance lain.")
+                return
+            self._handle_command(data)
+        except Exception as e:
+            self.logger.error(f"Error memproses pesan dari Redis: {e}")
+
+    def _handle_command(self, data):
+        """
+        Mengeksekusi satu pesan perintah. Mengembalikan False jika perintah belum bisa dikirim
+        (MQTT terputus) sehingga entri stream tidak di-ack dan dicoba lagi nanti.
+        """
+        self.logger.info(f"Menerima perintah dari Redis: {data.get('type')}")
+
+        if data['type'] == 'register_device':
+            return self._publish_command(data, self.command_tracker.dispatched(data))
+
+        elif data['type'] == 'command':
+            dispatched_at = self.command_tracker.dispatched(data)
+            # Validasi whitelist sebelum mengirim perintah
+            if data['device_id'] in self.whitelist_cache:
+                return self._publish_command(data, dispatched_at)
+            self.logger.warning(f"Perintah ditolak: {data['device_id']} tidak ada di whitelist.")
+            self.command_tracker.finished(data, "rejected", "perangkat tidak ada di whitelist")
+
+        elif data['type'] == 'group_command':
+            # Ekspansi di sini, pengiriman di thread fan-out agar consumer stream tidak tertahan
+            dispatched_at = self.command_tracker.dispatched(data)
+            targets, skipped = expand_target(data['target'], self.whitelist_cache,
+                                             load_group_members(self.redis_client, data['target']))
+            self.fanout.submit(FanoutJob(data, targets, skipped, Config.MQTT_BASE_TOPIC_COMMAND, dispatched_at))
+
+        elif data['type'] == 'whitelist_invalidate':
+            # Push dari backend: terapkan delta yang dibawa (jika ada) lalu sinkron segera
+            self.whitelist_cache.invalidate(data.get('added') or [], data.get('removed') or [])
+        return True
+
+    def _publish_command(self, data, dispatched_at):
+        payload = data['payload']
+        if data.get('command_id') and isinstance(payload, dict):
+            # command_id ikut ke perangkat agar ack-nya bisa dikorelasikan
+            payload = {**payload, "command_id": data['command_id']}
+        if not self._handle_mqtt_publish(data['topic'], payload):
+            return False
+        self.command_tracker.published(data, dispatched_at)
+        return True
+
+    def _publish_fanout(self, topic, payload):
+        """Publish satu perangkat dari fan-out; MQTTMessageInfo dipakai untuk menunggu PUBACK."""
+        if not self.is_running or not self.client.is_connected():
+            return None
+        info = self.client.publish(topic, json_codec.dumps(payload), qos=Config.FANOUT_QOS)
+        return info if info.rc == mqtt.MQTT_ERR_SUCCESS else None
+
+    def _fanout_done(self, job):
+        self.command_tracker.published(job.message, job.dispatched_at)
+        error = f"{len(job.failed)} perangkat gagal" if job.failed else None
+        self.command_tracker.finished(job.message, job.state, error)
 
     def _handle_mqtt_publish(self, topic, payload):
         """Fungsi internal untuk mempublikasikan ke MQTT."""
         if not self.is_running or not self.client.is_connected():
-            self.logger.error("MQTT client tidak terhubung. Perintah dibatalkan.")
-            return
+            self.logger.error("MQTT client tidak terhubung. Perintah ditunda.")
+            return False
             
-        self.client.publish(topic, json.dumps(payload))
+        self.client.publish(topic, json_codec.dumps(payload))
         self.logger.info(f"📡 (MQTT) Perintah dipublikasikan ke topik: {topic}")
+        return True
                     
     # --- Kontrol Service ---
     def start(self):
@@ -187,32 +328,151 @@ class MQTTWorker:
             return
         
         logger.info("🚀 Memulai MQTT Worker...")
-        self.load_whitelist_from_backend() # Muat whitelist saat start
+        if not Config.FAST_START:
+            # Mode fail-fast: pastikan dependensi siap sebelum mulai
+            try:
+                self.redis_client.ping()
+                self.logger.info("✅ (MQTT Worker) Berhasil terhubung ke Redis.")
+            except Exception as e:
+                self.logger.error(f"❌ (MQTT Worker) Gagal terhubung ke Redis: {e}")
+                sys.exit(1)
+            self.load_whitelist_from_backend() # Muat whitelist saat start
+        self.ingest.start()
+        self.dashboard_publisher.start()
+        self.heartbeats.start()
+        self.command_tracker.start()
+        self.latest.start()
+        self.fanout.start()
         
         try:
-            self.client.connect(Config.MQTT_BROKER, Config.MQTT_PORT, 60)
+            if Config.FAST_START:
+                # Koneksi (dan reconnect) ditangani thread loop paho di background
+                self.client.connect_async(Config.MQTT_BROKER, Config.MQTT_PORT, 60)
+            else:
+                self.client.connect(Config.MQTT_BROKER, Config.MQTT_PORT, 60)
         except Exception as e:
             self.logger.error(f"FATAL: Gagal terhubung ke MQTT Broker saat start: {e}")
             sys.exit(1)
             
         self.client.loop_start() 
         self.is_running = True
+        self.readiness.start()
+        self.whitelist_cache.start()
 
-        # Mulai semua thread background
+        # Mulai semua thread background (whitelist langsung dimuat di thread refresh)
         threading.Thread(target=self._periodic_whitelist_refresh_loop, daemon=True).start()
         threading.Thread(target=self._redis_listener_loop, daemon=True).start()
+        threading.Thread(target=self._command_stream_loop, daemon=True).start()
+        threading.Thread(target=self._metrics_loop, daemon=True).start()
         
         logger.info("✅ MQTT Worker berjalan.")
 
     def stop(self):
         logger.info("🛑 Menghentikan MQTT Worker...")
+        # Fan-out dihentikan selagi MQTT masih terhubung agar sisa target tercatat 'interrupted', bukan gagal
+        self.fanout.stop()
         self.is_running = False
+        self.whitelist_cache.stop()
+        self.readiness.stop()
         self.client.loop_stop()
         self.client.disconnect()
-        logger.info("MQTT Worker berhenti.")
+        self.ingest.stop()
+        self.dashboard_publisher.stop()
+        self.heartbeats.stop()
+        self.command_tracker.stop()
+        self.latest.stop()
+        flush_writes()
+        logger.info(f"MQTT Worker berhenti. Statistik: {self.get_stats()}")
+
+    # --- Metrik ---
+    def get_stats(self):
+        return {
+            "ingest": self.ingest.get_stats(),
+            "dashboard": self.dashboard_publisher.get_stats(),
+            "heartbeat": self.heartbeats.get_stats(),
+            "whitelist": self.whitelist_cache.get_stats(),
+            "rejections": self.device_gate.get_stats(),
+            "commands": self.commands.get_stats(),
+            "command_tracking": self.command_tracker.get_stats(),
+            "fanout": self.fanout.get_stats(),
+            "latest": self.latest.get_stats(),
+        }
+
+    def _metrics_loop(self):
+        """Menyimpan statistik ke Redis secara berkala agar terlihat di /metrics web server."""
+        interval = Config.WORKER_METRICS_INTERVAL
+        while self.is_running:
+            time.sleep(interval)
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.hset(METRICS_KEY, self.instance_id, json_codec.dumps(self.get_stats()))
+                pipe.expire(METRICS_KEY, int(interval * 3))
+                pipe.execute()
+            except redis.RedisError as e:
+                self.logger.debug(f"Gagal menyimpan metrik worker ke Redis: {e}")
+
+# --- Mode multi-proses ---
+def run_worker_process(index, report_queue):
+    """Target proses anak supervisor: satu MQTTWorker dengan spool dan writer sendiri."""
+    # Spool per proses agar file segmen/offset tidak diperebutkan; indeks tetap sama setelah
+    # restart sehingga data spool proses lama di-replay oleh penggantinya
+    Config.INFLUX_SPOOL_DIR = os.path.join(Config.INFLUX_SPOOL_DIR, f"worker-{index}")
+    if Config.WORKER_ENGINE == "asyncio":
+        run_async_worker(lambda stats: report_queue.put((index, os.getpid(), stats)))
+        return
+
+    worker = MQTTWorker()
+
+    def signal_handler(sig, frame):
+        worker.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    worker.start()
+    while True:
+        report_queue.put((index, os.getpid(), worker.get_stats()))
+        time.sleep(Config.WORKER_REPORT_INTERVAL)
+
+
+def publish_supervisor_stats(stats):
+    """Statistik gabungan supervisor disimpan ke Redis, dibaca /metrics web server."""
+    get_redis_client().hset(SUPERVISOR_METRICS_KEY, socket.gethostname(), json_codec.dumps(stats))
+
+
+def run_supervisor(processes):
+    if not Config.MQTT_SHARED_GROUP:
+        # Tanpa shared subscription setiap proses akan menerima (dan menulis) semua pesan
+        Config.MQTT_SHARED_GROUP = "mqtt-workers"
+        logger.info("MQTT_SHARED_GROUP tidak diisi, memakai grup 'mqtt-workers'.")
+    supervisor = WorkerSupervisor(
+        run_worker_process,
+        processes,
+        health_timeout=Config.WORKER_HEALTH_TIMEOUT,
+        stats_interval=Config.WORKER_METRICS_INTERVAL,
+        on_stats=publish_supervisor_stats,
+    )
+    supervisor.run()
+
 
 # --- Main ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MQTT Worker")
+    parser.add_argument("--processes", type=int, default=Config.WORKER_PROCESSES,
+                        help="Jumlah proses worker (>1 menjalankan supervisor, 0 = jumlah core CPU)")
+    parser.add_argument("--engine", choices=("thread", "asyncio"), default=Config.WORKER_ENGINE,
+                        help="Engine konkurensi: thread (paho) atau asyncio (aiomqtt, redis.asyncio, httpx)")
+    args = parser.parse_args()
+    Config.WORKER_ENGINE = args.engine
+    processes = args.processes or os.cpu_count() or 1
+    if processes > 1:
+        run_supervisor(processes)
+        sys.exit(0)
+    if args.engine == "asyncio":
+        run_async_worker()
+        sys.exit(0)
+
     worker = MQTTWorker()
     
     def signal_handler(sig, frame):
@@ -227,4 +487,4 @@ if __name__ == "__main__":
     
     # Jaga agar script utama tetap berjalan
     while True:
-        time.sleep(1)
\ No newline at end of file
+        time.sleep(1)
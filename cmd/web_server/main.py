@@ -1,11 +1,11 @@
 import logging
-import json
 import threading
+import time
 import redis
 import sys
 
 from flask import Flask, request, jsonify
-from flask_socketio import SocketIO, join_room
+from flask_socketio import SocketIO, join_room, leave_room
 from flask_cors import CORS  # Pastikan untuk mengimpor CORS
 
 # --- Konfigurasi Awal ---
@@ -14,8 +14,19 @@ from flask_cors import CORS  # Pastikan untuk mengimpor CORS
 # Jika cmd/ berada di root, Anda mungkin perlu menambahkan root ke sys.path
 sys.path.append('.') # Menambahkan direktori root proyek ke path
 from config.settings import Config
-from api.waterlevel.endpoints import waterlevel
+from api.waterlevel.endpoints import trend_cache, waterlevel
 from api.iot.endpoints import iotdevice
+from helper import json_codec
+from helper.json_formatter import FastJSONProvider
+from helper.command_bus import publish_command
+from helper.command_fanout import GROUP_UPDATES_CHANNEL, group_key, load_groups
+from helper.command_tracker import get_latency_histograms
+from helper.redis_connection import get_redis_client
+from helper.readiness import ReadinessProbe
+from helper.redis_batcher import unpack_envelope
+from helper.socketio_broadcaster import ConflatingBroadcaster
+from helper.subscription_index import DeviceSubscriptionIndex
+from influxdb.registry import registry
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
@@ -23,25 +34,71 @@ logger = logging.getLogger(__name__)
 
 # --- Inisialisasi Aplikasi ---
 app = Flask(__name__)
+app.json = FastJSONProvider(app) # jsonify memakai codec JSON bersama (orjson jika tersedia)
 CORS(app) # Mengaktifkan CORS untuk semua rute
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', json=json_codec.SocketIOJSON)
 
 # --- Koneksi ke Redis ---
-try:
-    redis_client = redis.Redis(
-        host=Config.REDIS_HOST,
-        port=Config.REDIS_PORT,
-        db=0,
-        decode_responses=True # Otomatis decode dari bytes ke string
-    )
-    redis_client.ping()
-    logger.info("✅ (Web Server) Terhubung ke Redis.")
-except Exception as e:
-    logger.error(f"❌ (Web Server) Gagal terhubung ke Redis: {e}")
-    sys.exit(1) # Keluar jika tidak bisa terhubung ke Redis
+# Client bersama dengan api/iot/endpoints; koneksi baru dibuka saat pertama kali dipakai
+redis_client = get_redis_client()
+
+# --- Broadcast ke dashboard: hanya nilai terbaru per perangkat, di-emit dengan frame rate tetap ---
+# Setiap pembacaan hanya dikirim ke room klien yang melanggan perangkat / grupnya
+subscriptions = DeviceSubscriptionIndex()
+broadcaster = ConflatingBroadcaster(
+    emit=socketio.emit,
+    rate_hz=Config.SOCKETIO_EMIT_RATE_HZ,
+    combined=Config.SOCKETIO_COMBINED_EMIT,
+    router=subscriptions.route,
+)
+
+# --- Readiness: dependensi diperiksa di background, bukan saat import ---
+readiness = ReadinessProbe(interval=Config.READINESS_INTERVAL)
+readiness.register("redis", redis_client.ping)
+readiness.register("influxdb", lambda: registry.client().ping(), required=False)
 
 # --- Endpoint HTTP ---
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: proses hidup dan bisa melayani request."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: status dependensi hasil probe background terakhir."""
+    status = readiness.status()
+    status["influxdb_pool"] = registry.get_pool_stats()
+    return jsonify(status), 200 if status["ready"] else 503
+
+def _mqtt_worker_metrics(key='metrics:mqtt_worker'):
+    """Statistik terakhir setiap proses MQTT Worker (ingest, whitelist, penolakan perangkat)."""
+    try:
+        raw = redis_client.hgetall(key)
+    except redis.RedisError as e:
+        return {"error": str(e)}
+    return {instance_id: json_codec.loads(stats) for instance_id, stats in raw.items()}
+
+def _command_latency_metrics():
+    """Histogram latensi perintah gabungan semua worker (dispatch, publish, ack, total)."""
+    try:
+        return get_latency_histograms(redis_client)
+    except redis.RedisError as e:
+        return {"error": str(e)}
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Statistik internal web server (broadcast Socket.IO, pool InfluxDB)."""
+    return jsonify({
+        "mqtt_workers": _mqtt_worker_metrics(),
+        "mqtt_supervisors": _mqtt_worker_metrics('metrics:mqtt_supervisor'),
+        "command_latency": _command_latency_metrics(),
+        "trend_cache": trend_cache.get_stats(),
+        "broadcaster": broadcaster.get_stats(),
+        "subscriptions": subscriptions.get_stats(),
+        "influxdb_pool": registry.get_pool_stats(),
+    }), 200
+
 # 1. Endpoint untuk Notifikasi Aduan dari Laravel
 @app.route('/notify', methods=['POST'])
 def handle_laravel_notification():
@@ -77,11 +134,49 @@ app.register_blueprint(iotdevice, url_prefix="/api/iot")
 @socketio.on('connect')
 def handle_connect():
     logger.info(f"🔌 (WebSocket) Client {request.sid} terhubung")
+    if Config.SOCKETIO_DEFAULT_ALL_DEVICES:
+        for room in subscriptions.subscribe(request.sid, all_devices=True):
+            join_room(room)
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    subscriptions.remove_client(request.sid)
     logger.info(f"🔌 (WebSocket) Client {request.sid} terputus")
 
+def _subscription_args(data):
+    data = data or {}
+    device_ids = data.get('device_ids') or []
+    groups = data.get('groups') or []
+    if isinstance(device_ids, str):
+        device_ids = [device_ids]
+    if isinstance(groups, str):
+        groups = [groups]
+    return [str(d) for d in device_ids], [str(g) for g in groups], bool(data.get('all'))
+
+@socketio.on('subscribe_devices')
+def handle_subscribe_devices(data=None):
+    """
+    Klien melanggan perangkat tertentu dan/atau grup perangkat:
+    {"device_ids": ["sensor-01", ...], "groups": ["wilayah-utara"], "all": false}
+    Begitu klien memilih perangkat/grup, ia berhenti menerima data seluruh armada.
+    """
+    device_ids, groups, all_devices = _subscription_args(data)
+    if (device_ids or groups) and not all_devices:
+        for room in subscriptions.unsubscribe(request.sid, all_devices=True):
+            leave_room(room)
+    for room in subscriptions.subscribe(request.sid, device_ids, groups, all_devices):
+        join_room(room)
+    rooms = sorted(subscriptions.client_rooms(request.sid))
+    logger.info(f"Client {request.sid} melanggan {len(rooms)} room")
+    return {"status": "sukses", "rooms": rooms}
+
+@socketio.on('unsubscribe_devices')
+def handle_unsubscribe_devices(data=None):
+    device_ids, groups, all_devices = _subscription_args(data)
+    for room in subscriptions.unsubscribe(request.sid, device_ids, groups, all_devices):
+        leave_room(room)
+    return {"status": "sukses", "rooms": sorted(subscriptions.client_rooms(request.sid))}
+
 @socketio.on('join_admin_room')
 def handle_join_admin_room(data=None):
     """
@@ -99,7 +194,7 @@ def handle_command_from_dashboard(data):
     logger.info(f"Menerima perintah dari dashboard: {data}")
     try:
         # Publikasikan perintah ke channel yang akan didengarkan oleh mqtt_worker
-        redis_client.publish('command_to_mqtt', json.dumps(data))
+        publish_command(redis_client, data)
     except Exception as e:
         logger.error(f"Gagal mempublikasikan perintah ke Redis: {e}")
 
@@ -110,28 +205,59 @@ def redis_listener_loop():
     menyiarkannya ke dashboard (via WebSocket).
     """
     logger.info("Memulai listener Redis Pub/Sub...")
-    pubsub = redis_client.pubsub()
-    pubsub.subscribe('data_for_dashboard') # Channel data dari MQTT
-    
-    for message in pubsub.listen():
-        if message['type'] == 'message':
-            try:
-                data = json.loads(message['data'])
-                # Siarkan data (misal: water level) ke semua klien dashboard
-                socketio.emit('water_level_update', data)
-            except Exception as e:
-                logger.error(f"Error memproses pesan dari Redis: {e}")
+    backoff = 1
+    while True:
+        try:
+            pubsub = redis_client.pubsub()
+            pubsub.subscribe('data_for_dashboard', GROUP_UPDATES_CHANNEL) # Channel data dari MQTT + perubahan grup
+            # Grup perangkat disimpan di Redis (PUT /api/iot/groups/<grup>); dimuat ulang setelah
+            # (re)subscribe agar perubahan selama terputus tidak terlewat
+            subscriptions.load_groups(load_groups(redis_client))
+            backoff = 1
+
+            for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                if message['channel'] == GROUP_UPDATES_CHANNEL:
+                    group = message['data']
+                    subscriptions.set_group(group, redis_client.smembers(group_key(group)))
+                    logger.info(f"Grup perangkat '{group}' dimuat ulang dari Redis")
+                else:
+                    try:
+                        data = json_codec.loads(message['data'])
+                        # Worker bisa mengirim satu pembacaan atau envelope batch
+                        for reading in unpack_envelope(data):
+                            # Dikumpulkan per perangkat, disiarkan oleh broadcaster sesuai frame rate
+                            broadcaster.publish(reading)
+                    except Exception as e:
+                        logger.error(f"Error memproses pesan dari Redis: {e}")
+        except redis.RedisError as e:
+            # Redis belum siap / terputus: coba lagi tanpa mematikan web server
+            logger.warning(f"⚠️ Listener Redis terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
 
 # --- Main ---
 def run_web_server():
     logger.info("🚀 Memulai Web Server (Flask-SocketIO)...")
+
+    if Config.FAST_START:
+        # Dependensi diperiksa di background; web server langsung melayani request
+        readiness.start()
+    elif not readiness.run_checks()["ready"]:
+        logger.error(f"❌ (Web Server) Dependensi belum siap: {readiness.status()['checks']}")
+        sys.exit(1)
+    else:
+        readiness.start()
     
+    broadcaster.start()
+
     # Mulai listener Redis di thread terpisah
     threading.Thread(target=redis_listener_loop, daemon=True).start()
     
     # Jalankan server
     # Gunakan Gunicorn di produksi, ini hanya untuk development
-    socketio.run(app, debug=False, host="0.0.0.0", port=5000, allow_unsafe_werkzeug=True)
+    socketio.run(app, debug=False, host="0.0.0.0", port=Config.WEB_SERVER_PORT, allow_unsafe_werkzeug=True)
 
 if __name__ == "__main__":
     run_web_server()
\ No newline at end of file
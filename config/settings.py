@@ -13,6 +13,12 @@ class Config:
     REGISTRATION_RESPONSE_TOPIC = os.getenv("REGISTRATION_RESPONSE_TOPIC")
     REGISTRATION_REQUEST_TOPIC = os.getenv("REGISTRATION_REQUEST_TOPIC")
     MQTT_BASE_TOPIC_COMMAND = os.getenv("MQTT_BASE_TOPIC_COMMAND", "iot/sensor")
+    # Ack perintah dari perangkat, membawa kembali command_id yang diterima di payload perintah
+    MQTT_TOPIC_COMMAND_ACK = os.getenv("MQTT_TOPIC_COMMAND_ACK", f"{MQTT_BASE_TOPIC_COMMAND}/+/ack")
+    # Scale-out: jika diisi, topik data di-subscribe sebagai $share/<group>/<topik> sehingga
+    # beberapa instance MQTT Worker membagi beban alih-alih menerima pesan yang sama
+    MQTT_SHARED_GROUP = os.getenv("MQTT_SHARED_GROUP", "")
+    MQTT_CLIENT_ID_PREFIX = os.getenv("MQTT_CLIENT_ID_PREFIX", "mqtt-worker")
     # TODO perbarui agar menggunakan env
     REDIS_HOST = 'localhost'
     REDIS_PORT = 6379
@@ -26,3 +32,104 @@ class Config:
     # Backend API Configuration
     BACKEND_API_URL = os.getenv("BACKEND_API_URL")
     WHITELIST_API_URL = os.getenv("WHITELIST_API_URL")
+    # Sinkronisasi whitelist inkremental: interval adaptif antara min dan max (detik)
+    WHITELIST_SYNC_MIN_INTERVAL = float(os.getenv("WHITELIST_SYNC_MIN_INTERVAL", "30"))
+    WHITELIST_SYNC_MAX_INTERVAL = float(os.getenv("WHITELIST_SYNC_MAX_INTERVAL", "3600"))
+    # Whitelist bersama antar proses worker via Redis; hanya leader yang refresh dari Laravel
+    WHITELIST_SHARED = os.getenv("WHITELIST_SHARED", "true").lower() == "true"
+    WHITELIST_LEADER_TTL = float(os.getenv("WHITELIST_LEADER_TTL", "30"))
+
+    # Penolakan perangkat tidak dikenal
+    REJECT_CACHE_TTL = float(os.getenv("REJECT_CACHE_TTL", "60"))         # negative cache per ID (detik)
+    REJECT_LOG_EVERY = int(os.getenv("REJECT_LOG_EVERY", "1000"))         # log 1 baris per N penolakan per ID
+    REJECT_LOG_INTERVAL = float(os.getenv("REJECT_LOG_INTERVAL", "60"))   # ...atau per interval (detik)
+
+    # Statistik MQTT Worker disimpan ke Redis untuk /metrics web server
+    WORKER_METRICS_INTERVAL = float(os.getenv("WORKER_METRICS_INTERVAL", "10"))
+
+    # Supervisor multi-proses (cmd/mqtt_worker/main.py --processes N)
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+    WORKER_REPORT_INTERVAL = float(os.getenv("WORKER_REPORT_INTERVAL", "5"))   # laporan proses -> supervisor
+    WORKER_HEALTH_TIMEOUT = float(os.getenv("WORKER_HEALTH_TIMEOUT", "30"))    # tanpa laporan = hang
+
+    # Engine MQTT Worker: thread (paho + thread pool) atau asyncio (aiomqtt + redis.asyncio + httpx)
+    WORKER_ENGINE = os.getenv("WORKER_ENGINE", "thread")
+    ASYNC_HTTP_CONCURRENCY = int(os.getenv("ASYNC_HTTP_CONCURRENCY", "64"))        # request HTTP bersamaan
+    ASYNC_MAX_INFLIGHT_COMMANDS = int(os.getenv("ASYNC_MAX_INFLIGHT_COMMANDS", "100"))
+
+    # Perintah ke perangkat lewat Redis Stream (consumer group mqtt-workers)
+    COMMAND_STREAM_BATCH = int(os.getenv("COMMAND_STREAM_BATCH", "100"))            # entri per XREADGROUP
+    COMMAND_STREAM_BLOCK_MS = int(os.getenv("COMMAND_STREAM_BLOCK_MS", "1000"))
+    COMMAND_RECLAIM_IDLE_MS = int(os.getenv("COMMAND_RECLAIM_IDLE_MS", "30000"))    # pending lebih lama = diambil alih
+    COMMAND_MAX_DELIVERIES = int(os.getenv("COMMAND_MAX_DELIVERIES", "5"))          # lalu ke dead letter stream
+    COMMAND_MAX_AGE = float(os.getenv("COMMAND_MAX_AGE", "300"))                    # perintah lebih tua dilewati (detik)
+    BULK_REGISTRATION_MAX_DEVICES = int(os.getenv("BULK_REGISTRATION_MAX_DEVICES", "5000"))  # < STREAM_MAXLEN
+    BULK_REGISTRATION_MAX_BYTES = int(os.getenv("BULK_REGISTRATION_MAX_BYTES", str(4 * 1024 * 1024)))  # ditolak sebelum di-parse
+
+    # Nilai terakhir per perangkat (HASH Redis waterlevel:latest) untuk /api/waterlevel/latest
+    LATEST_FLUSH_INTERVAL = float(os.getenv("LATEST_FLUSH_INTERVAL", "0.2"))
+    LATEST_MAX_DEVICES = int(os.getenv("LATEST_MAX_DEVICES", "500"))   # batas sensor_ids per request
+    LATEST_FALLBACK_RANGE = os.getenv("LATEST_FALLBACK_RANGE", "-7d")    # range query InfluxDB saat cache miss
+
+    # Cache tren per jendela (proses web server) untuk /api/waterlevel/trend
+    TREND_DEFAULT_WINDOW = os.getenv("TREND_DEFAULT_WINDOW", "1h")
+    TREND_MAX_WINDOWS = int(os.getenv("TREND_MAX_WINDOWS", "10000"))           # jendela per request
+    TREND_CACHE_MAX_ENTRIES = int(os.getenv("TREND_CACHE_MAX_ENTRIES", "200000"))  # satu entri = satu jendela
+    TREND_CACHE_TTL = int(os.getenv("TREND_CACHE_TTL", "86400"))               # jendela tertutup (detik)
+    TREND_CACHE_SETTLE = int(os.getenv("TREND_CACHE_SETTLE", "120"))           # tunggu data terlambat sebelum di-cache
+
+    # Fan-out perintah grup (per worker): laju publish, publish QoS 1 yang belum di-PUBACK, progres
+    FANOUT_RATE = float(os.getenv("FANOUT_RATE", "200"))                     # publish per detik, 0 = tanpa batas
+    FANOUT_MAX_INFLIGHT = int(os.getenv("FANOUT_MAX_INFLIGHT", "100"))
+    FANOUT_QOS = int(os.getenv("FANOUT_QOS", "1"))
+    FANOUT_PROGRESS_INTERVAL = float(os.getenv("FANOUT_PROGRESS_INTERVAL", "1"))
+
+    # Ingest Pipeline (MQTT Worker)
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+    INGEST_QUEUE_POLICY = os.getenv("INGEST_QUEUE_POLICY", "block")  # block | drop_oldest | drop_newest
+
+    # Heartbeat ke Laravel
+    HEARTBEAT_BASE_URL = os.getenv("HEARTBEAT_BASE_URL", "http://localhost:8000/api/iot")
+    HEARTBEAT_BATCH_URL = os.getenv("HEARTBEAT_BATCH_URL")  # Kosongkan untuk mode per-device
+    HEARTBEAT_FLUSH_INTERVAL = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL", "5"))
+    HEARTBEAT_POOL_SIZE = int(os.getenv("HEARTBEAT_POOL_SIZE", "8"))
+
+    # InfluxDB Batch Writer
+    INFLUX_BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", "5000"))
+    INFLUX_BATCH_MAX_BYTES = int(os.getenv("INFLUX_BATCH_MAX_BYTES", str(1024 * 1024)))
+    INFLUX_BATCH_LINGER = float(os.getenv("INFLUX_BATCH_LINGER", "1.0"))
+    INFLUX_BUFFER_MAX_POINTS = int(os.getenv("INFLUX_BUFFER_MAX_POINTS", "100000"))
+    INFLUX_WRITE_MAX_RETRIES = int(os.getenv("INFLUX_WRITE_MAX_RETRIES", "3"))
+    INFLUX_WRITE_GZIP = os.getenv("INFLUX_WRITE_GZIP", "true").lower() == "true"
+
+    # InfluxDB Spool (buffer disk saat InfluxDB down)
+    INFLUX_SPOOL_ENABLED = os.getenv("INFLUX_SPOOL_ENABLED", "true").lower() == "true"
+    INFLUX_SPOOL_DIR = os.getenv("INFLUX_SPOOL_DIR", "./data/influx_spool")
+    INFLUX_SPOOL_SEGMENT_BYTES = int(os.getenv("INFLUX_SPOOL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+    INFLUX_SPOOL_MAX_BYTES = int(os.getenv("INFLUX_SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+    INFLUX_SPOOL_EVICTION = os.getenv("INFLUX_SPOOL_EVICTION", "drop_oldest")  # drop_oldest | reject
+    INFLUX_REPLAY_RATE = int(os.getenv("INFLUX_REPLAY_RATE", "5000"))  # record per detik
+
+    # InfluxDB Client bersama
+    INFLUX_POOL_MAXSIZE = int(os.getenv("INFLUX_POOL_MAXSIZE", "20"))
+    INFLUX_TIMEOUT_MS = int(os.getenv("INFLUX_TIMEOUT_MS", "10000"))
+
+    # Startup & Readiness
+    FAST_START = os.getenv("FAST_START", "true").lower() == "true"  # false = cek dependensi saat boot (fail-fast)
+    READINESS_INTERVAL = float(os.getenv("READINESS_INTERVAL", "5"))
+    REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+    WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", "5000"))
+
+    # Batch publish ke dashboard (Redis)
+    DASHBOARD_BATCH_MODE = os.getenv("DASHBOARD_BATCH_MODE", "envelope")  # envelope | pipeline
+    DASHBOARD_BATCH_MAX_ITEMS = int(os.getenv("DASHBOARD_BATCH_MAX_ITEMS", "200"))
+    DASHBOARD_BATCH_MAX_DELAY_MS = float(os.getenv("DASHBOARD_BATCH_MAX_DELAY_MS", "5"))
+    DASHBOARD_BATCH_MAX_PENDING = int(os.getenv("DASHBOARD_BATCH_MAX_PENDING", "10000"))  # item tertua dibuang
+
+    # Broadcast Socket.IO ke dashboard
+    SOCKETIO_EMIT_RATE_HZ = float(os.getenv("SOCKETIO_EMIT_RATE_HZ", "4"))
+    # Default: event water_level_update per perangkat (dashboard lama); true = satu event water_level_batch per frame
+    SOCKETIO_COMBINED_EMIT = os.getenv("SOCKETIO_COMBINED_EMIT", "false").lower() == "true"
+    # Klien baru otomatis menerima seluruh armada sampai mengirim subscribe_devices (kompatibel dashboard lama)
+    SOCKETIO_DEFAULT_ALL_DEVICES = os.getenv("SOCKETIO_DEFAULT_ALL_DEVICES", "true").lower() == "true"
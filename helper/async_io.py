@@ -0,0 +1,182 @@
+"""Versi asyncio dari batcher publish dashboard dan agregator heartbeat (engine asyncio MQTT Worker)."""
+import asyncio
+import logging
+from collections import deque
+
+import redis
+
+from helper import json_codec
+from helper.redis_batcher import MODE_ENVELOPE, MODE_PIPELINE, pack_envelope
+
+try:
+    import httpx
+except ImportError:  # httpx hanya dibutuhkan engine asyncio
+    httpx = None
+
+HTTP_ERRORS = (httpx.HTTPError, OSError) if httpx else (OSError,)
+
+logger = logging.getLogger("AsyncIO")
+
+
+class AsyncPublishBatcher:
+    """
+    Padanan RedisPublishBatcher untuk client redis.asyncio. add() dipanggil dari event loop
+    (tanpa await); run() mengirim batch setelah max_delay detik atau saat max_items tercapai.
+    Format pesan di channel sama persis dengan engine thread, termasuk batas max_pending.
+    """
+
+    def __init__(self, redis_client, channel, max_items=200, max_delay=0.005, mode=MODE_ENVELOPE,
+                 max_pending=None):
+        if mode not in (MODE_ENVELOPE, MODE_PIPELINE):
+            raise ValueError(f"Mode batch tidak dikenal: {mode}")
+        self.redis_client = redis_client
+        self.channel = channel
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.mode = mode
+        self.max_pending = max_pending or max_items * 50
+
+        self._items = deque(maxlen=self.max_pending)
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._stats = {"items": 0, "batches": 0, "dropped": 0, "dropped_oldest": 0, "errors": 0, "max_batch": 0}
+
+    def add(self, payload):
+        if len(self._items) == self.max_pending:
+            self._stats["dropped"] += 1
+            self._stats["dropped_oldest"] += 1
+        self._items.append(payload)
+        if len(self._items) == 1:
+            self._ready.set()
+        if len(self._items) >= self.max_items:
+            self._full.set()
+
+    async def flush(self):
+        """Mengirim semua item yang terkumpul. Mengembalikan jumlah item yang terkirim."""
+        items = list(self._items)
+        self._items.clear()
+        self._ready.clear()
+        self._full.clear()
+        sent = 0
+        for start in range(0, len(items), self.max_items):
+            sent += await self._publish(items[start:start + self.max_items])
+        return sent
+
+    async def _publish(self, items):
+        if not items:
+            return 0
+        try:
+            if self.mode == MODE_ENVELOPE:
+                await self.redis_client.publish(self.channel, json_codec.dumps(pack_envelope(items)))
+            else:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for item in items:
+                    pipe.publish(self.channel, json_codec.dumps(item))
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"❌ Gagal publish batch ({len(items)} item) ke Redis: {e}")
+            self._stats["errors"] += 1
+            self._stats["dropped"] += len(items)
+            return 0
+
+        self._stats["items"] += len(items)
+        self._stats["batches"] += 1
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(items))
+        return len(items)
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            # Tunggu item lain sampai max_delay habis atau batch penuh
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats["pending"] = len(self._items)
+        stats["avg_batch"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+
+class AsyncHeartbeatAggregator:
+    """
+    Padanan HeartbeatAggregator untuk client HTTP async (httpx.AsyncClient): heartbeat
+    di-coalesce per perangkat dan dikirim setiap flush_interval detik. Pada mode per-device
+    setiap request adalah coroutine, dibatasi `concurrency` request bersamaan.
+    """
+
+    def __init__(self, client, base_url, flush_interval=5.0, batch_url=None, concurrency=8, timeout=5):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.flush_interval = flush_interval
+        self.batch_url = batch_url
+        self.timeout = timeout
+
+        self._limit = asyncio.Semaphore(concurrency)
+        self._pending = {}
+        self._stats = {"received": 0, "coalesced": 0, "sent": 0, "failed": 0, "flushes": 0}
+
+    def update(self, device_id, fw_version=None, rssi=None):
+        """Mencatat heartbeat terbaru; heartbeat lama yang belum terkirim ditimpa."""
+        self._stats["received"] += 1
+        if device_id in self._pending:
+            self._stats["coalesced"] += 1
+        self._pending[device_id] = {"fw_version": fw_version, "rssi": rssi}
+
+    async def flush(self):
+        """Mengirim semua heartbeat yang tertunda. Mengembalikan jumlah yang berhasil terkirim."""
+        batch, self._pending = self._pending, {}
+        self._stats["flushes"] += 1
+        if not batch:
+            return 0
+
+        if self.batch_url:
+            failed = await self._send_batch(batch)
+        else:
+            results = await asyncio.gather(*(self._send_one(d, data) for d, data in batch.items()))
+            failed = [device_id for device_id, ok in zip(batch, results) if not ok]
+
+        sent = len(batch) - len(failed)
+        self._stats["sent"] += sent
+        self._stats["failed"] += len(failed)
+        # Kembalikan yang gagal untuk dicoba lagi, kecuali sudah ada heartbeat yang lebih baru
+        for device_id in failed:
+            self._pending.setdefault(device_id, batch[device_id])
+        return sent
+
+    async def _send_batch(self, batch):
+        heartbeats = [{"device_id": device_id, **data} for device_id, data in batch.items()]
+        try:
+            response = await self.client.post(self.batch_url, json={"heartbeats": heartbeats}, timeout=self.timeout)
+            response.raise_for_status()
+            return []
+        except HTTP_ERRORS as e:
+            logger.error(f"❌ Gagal mengirim batch heartbeat ({len(batch)} perangkat): {e}")
+            return list(batch)
+
+    async def _send_one(self, device_id, data):
+        async with self._limit:
+            try:
+                response = await self.client.post(f"{self.base_url}/{device_id}/heartbeat",
+                                                  json=data, timeout=self.timeout)
+                response.raise_for_status()
+                return True
+            except HTTP_ERRORS as e:
+                logger.error(f"Gagal update heartbeat {device_id} ke Laravel: {e}")
+                return False
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error saat flush heartbeat: {e}", exc_info=True)
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats["pending"] = len(self._pending)
+        return stats
@@ -0,0 +1,329 @@
+"""Pengiriman perintah dari web server / API ke MQTT Worker lewat Redis (Streams + pub/sub)."""
+import asyncio
+import logging
+import time
+import uuid
+
+import redis
+
+from helper import json_codec
+from helper.command_tracker import track_batch, track_queued
+
+logger = logging.getLogger("CommandBus")
+
+COMMAND_CHANNEL = "command_to_mqtt"       # pub/sub: pesan untuk semua instance (dan produsen lama)
+CLAIM_KEY_PREFIX = "command:claim:"
+COMMAND_STREAM = "commands:mqtt"          # STREAM: perintah ke perangkat, dikonsumsi tepat satu worker
+COMMAND_GROUP = "mqtt-workers"
+DEAD_LETTER_STREAM = "commands:mqtt:dead"  # perintah yang gagal diproses max_deliveries kali
+STREAM_MAXLEN = 10000                     # batas panjang stream (trim ~ saat XADD)
+
+# Tipe pesan yang harus dieksekusi tepat satu instance worker (publish ke perangkat).
+# group_command diekspansi oleh satu worker menjadi publish per perangkat (helper.command_fanout).
+# Tipe lain (mis. whitelist_invalidate) berlaku untuk semua instance.
+EXCLUSIVE_TYPES = ("command", "register_device", "group_command")
+
+
+def new_command_id():
+    return uuid.uuid4().hex
+
+
+def publish_command(redis_client, message, maxlen=STREAM_MAXLEN):
+    """
+    Mengirim pesan ke worker; setiap pesan diberi command_id unik. Perintah ke perangkat
+    ditambahkan ke COMMAND_STREAM (tetap tersimpan selama worker restart dan hanya diambil
+    satu consumer), pesan siaran dipublikasikan ke COMMAND_CHANNEL.
+    """
+    message.setdefault("command_id", new_command_id())
+    if message.get("type") in EXCLUSIVE_TYPES:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_exclusive(pipe, message, maxlen)
+        pipe.execute()
+    else:
+        redis_client.publish(COMMAND_CHANNEL, json_codec.dumps(message))
+    return message["command_id"]
+
+
+def publish_commands(redis_client, messages, batch_id=None, maxlen=STREAM_MAXLEN):
+    """
+    Versi massal publish_command untuk perintah ke perangkat (EXCLUSIVE_TYPES): semua XADD,
+    state awal, dan keanggotaan batch dikirim dalam satu pipeline (satu round trip).
+    Mengembalikan (batch_id, daftar command_id sesuai urutan messages).
+    """
+    batch_id = batch_id or new_command_id()
+    pipe = redis_client.pipeline(transaction=False)
+    for message in messages:
+        if message.get("type") not in EXCLUSIVE_TYPES:
+            raise ValueError(f"Tipe pesan {message.get('type')} tidak bisa dikirim massal")
+        message.setdefault("command_id", new_command_id())
+        message["batch_id"] = batch_id
+        _queue_exclusive(pipe, message, maxlen)
+    if messages:
+        track_batch(pipe, batch_id, messages)
+        pipe.execute()
+    return batch_id, [message["command_id"] for message in messages]
+
+
+def _queue_exclusive(pipe, message, maxlen):
+    # created_at menjadi awal pengukuran latensi dispatch/total; state awal ditulis di round trip yang sama
+    message.setdefault("created_at", time.time())
+    pipe.xadd(COMMAND_STREAM, {"data": json_codec.dumps(message)}, maxlen=maxlen, approximate=True)
+    track_queued(pipe, message)
+
+
+def _claim_key(message):
+    command_id = message.get("command_id")
+    if message.get("type") not in EXCLUSIVE_TYPES or not command_id:
+        return None
+    return CLAIM_KEY_PREFIX + command_id
+
+
+def claim_command(redis_client, message, owner, ttl_ms=60000):
+    """
+    Semua instance worker menerima pesan pub/sub yang sama; hanya instance yang berhasil
+    SET NX pada command_id yang boleh meneruskannya ke MQTT. Pesan lama tanpa command_id
+    dan tipe non-eksklusif selalu diproses.
+    """
+    key = _claim_key(message)
+    if key is None:
+        return True
+    return bool(redis_client.set(key, owner, nx=True, px=ttl_ms))
+
+
+async def claim_command_async(redis_client, message, owner, ttl_ms=60000):
+    """Sama dengan claim_command() untuk client redis.asyncio."""
+    key = _claim_key(message)
+    if key is None:
+        return True
+    return bool(await redis_client.set(key, owner, nx=True, px=ttl_ms))
+
+
+def _stream_entries(response):
+    # XREADGROUP: [[stream, [(id, fields), ...]], ...]; None jika block habis tanpa entri
+    for _, entries in response or ():
+        yield from entries
+
+
+class _StreamConsumerBase:
+    """Logika bersama consumer sinkron dan asyncio: decode entri, umur perintah, dan statistik."""
+
+    def __init__(self, redis_client, consumer, handler, stream=COMMAND_STREAM, group=COMMAND_GROUP,
+                 batch_size=100, block_ms=1000, reclaim_idle_ms=30000, reclaim_interval=10,
+                 max_deliveries=5, max_age=300, consumer_idle_ms=3600000, on_expired=None):
+        self.redis = redis_client
+        self.consumer = consumer
+        self.handler = handler
+        self.stream = stream
+        self.group = group
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.reclaim_interval = reclaim_interval
+        self.max_deliveries = max_deliveries
+        self.max_age = max_age
+        self.consumer_idle_ms = consumer_idle_ms
+        self.on_expired = on_expired
+
+        self._group_ready = False
+        self._next_reclaim = 0.0
+        self._stats = {"read": 0, "batches": 0, "acked": 0, "failed": 0, "expired": 0,
+                       "invalid": 0, "reclaimed": 0, "dead_lettered": 0, "max_batch": 0}
+
+    def _decode(self, entry_id, fields):
+        """Pesan perintah dari entri stream, atau None jika entri rusak / terlalu lama (langsung di-ack)."""
+        if not fields or "data" not in fields:
+            self._stats["invalid"] += 1
+            return None
+        try:
+            message = json_codec.loads(fields["data"])
+        except ValueError as e:
+            logger.error(f"Perintah {entry_id} tidak valid: {e}")
+            self._stats["invalid"] += 1
+            return None
+        # ID entri diawali waktu XADD (ms); perintah yang tertahan terlalu lama tidak dieksekusi
+        age = time.time() - int(entry_id.split("-")[0]) / 1000
+        if self.max_age and age > self.max_age:
+            logger.warning(f"⚠️ Perintah {message.get('command_id')} berumur {age:.0f} detik, dilewati.")
+            self._stats["expired"] += 1
+            if self.on_expired is not None:
+                self.on_expired(message)
+            return None
+        return message
+
+    def _record_batch(self, size, acked, failed):
+        self._stats["read"] += size
+        self._stats["batches"] += 1
+        self._stats["acked"] += acked
+        self._stats["failed"] += failed
+        self._stats["max_batch"] = max(self._stats["max_batch"], size)
+
+    def _split_pending(self, pending):
+        """Entri pending yang idle: (yang diklaim ulang, yang dipindah ke dead letter)."""
+        retry, dead = [], []
+        for entry in pending:
+            (dead if entry["times_delivered"] >= self.max_deliveries else retry).append(entry["message_id"])
+        return retry, dead
+
+    def _reclaim_due(self):
+        now = time.monotonic()
+        if now < self._next_reclaim:
+            return False
+        self._next_reclaim = now + self.reclaim_interval
+        return True
+
+    def _stale_consumers(self, consumers):
+        return [c["name"] for c in consumers
+                if c["name"] != self.consumer and not c["pending"] and c["idle"] > self.consumer_idle_ms]
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats["avg_batch"] = round(stats["read"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+
+class CommandStreamConsumer(_StreamConsumerBase):
+    """
+    Consumer COMMAND_STREAM dalam consumer group: setiap entri diterima tepat satu worker.
+
+    poll() membaca hingga batch_size entri sekaligus (XREADGROUP, blocking block_ms), memanggil
+    handler(message) untuk setiap entri, lalu meng-ack semua yang berhasil dengan satu XACK.
+    Handler mengembalikan False (atau melempar exception) agar entri tetap pending; entri pending
+    yang idle lebih dari reclaim_idle_ms (mis. milik worker yang mati) diklaim ulang, dan setelah
+    max_deliveries kali dipindah ke DEAD_LETTER_STREAM.
+    """
+
+    def ensure_group(self):
+        try:
+            # id=0: perintah yang dikirim sebelum group dibuat tetap diproses
+            self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def poll(self):
+        """Satu putaran baca + proses. Mengembalikan jumlah entri yang di-ack."""
+        if not self._group_ready:
+            self.ensure_group()
+        try:
+            acked = self.reclaim() if self._reclaim_due() else 0
+            response = self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                             count=self.batch_size, block=self.block_ms)
+        except redis.ResponseError as e:
+            if "NOGROUP" in str(e):
+                self._group_ready = False  # stream/group dihapus: dibuat ulang di putaran berikutnya
+                return 0
+            raise
+        return acked + self._process(list(_stream_entries(response)))
+
+    def _process(self, entries):
+        if not entries:
+            return 0
+        done = []
+        for entry_id, fields in entries:
+            message = self._decode(entry_id, fields)
+            if message is not None:
+                try:
+                    if self.handler(message) is False:
+                        continue
+                except Exception as e:
+                    logger.error(f"Error memproses perintah {message.get('command_id')}: {e}")
+                    continue
+            done.append(entry_id)
+        if done:
+            self.redis.xack(self.stream, self.group, *done)
+        self._record_batch(len(entries), len(done), len(entries) - len(done))
+        return len(done)
+
+    def reclaim(self):
+        """Ambil alih entri pending yang idle; yang sudah terlalu sering gagal dipindah ke dead letter."""
+        pending = self.redis.xpending_range(self.stream, self.group, min="-", max="+",
+                                            count=self.batch_size, idle=self.reclaim_idle_ms)
+        retry, dead = self._split_pending(pending)
+        acked = 0
+        if dead:
+            entries = self.redis.xclaim(self.stream, self.group, self.consumer, self.reclaim_idle_ms, dead)
+            pipe = self.redis.pipeline(transaction=True)
+            for entry_id, fields in entries:
+                if fields:
+                    pipe.xadd(DEAD_LETTER_STREAM, fields, maxlen=STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, *dead)
+            pipe.execute()
+            self._stats["dead_lettered"] += len(dead)
+            logger.error(f"❌ {len(dead)} perintah gagal {self.max_deliveries}x, dipindah ke {DEAD_LETTER_STREAM}.")
+        if retry:
+            entries = self.redis.xclaim(self.stream, self.group, self.consumer, self.reclaim_idle_ms, retry)
+            self._stats["reclaimed"] += len(entries)
+            acked = self._process(entries)
+        for name in self._stale_consumers(self.redis.xinfo_consumers(self.stream, self.group)):
+            self.redis.xgroup_delconsumer(self.stream, self.group, name)
+        return acked
+
+
+class AsyncCommandStreamConsumer(_StreamConsumerBase):
+    """CommandStreamConsumer untuk client redis.asyncio; handler adalah coroutine dan satu batch diproses bersamaan."""
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def poll(self):
+        if not self._group_ready:
+            await self.ensure_group()
+        try:
+            acked = await self.reclaim() if self._reclaim_due() else 0
+            response = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                                   count=self.batch_size, block=self.block_ms)
+        except redis.ResponseError as e:
+            if "NOGROUP" in str(e):
+                self._group_ready = False
+                return 0
+            raise
+        return acked + await self._process(list(_stream_entries(response)))
+
+    async def _handle(self, entry_id, fields):
+        message = self._decode(entry_id, fields)
+        if message is None:
+            return True
+        try:
+            return await self.handler(message) is not False
+        except Exception as e:
+            logger.error(f"Error memproses perintah {message.get('command_id')}: {e}")
+            return False
+
+    async def _process(self, entries):
+        if not entries:
+            return 0
+        results = await asyncio.gather(*(self._handle(entry_id, fields) for entry_id, fields in entries))
+        done = [entry_id for (entry_id, _), ok in zip(entries, results) if ok]
+        if done:
+            await self.redis.xack(self.stream, self.group, *done)
+        self._record_batch(len(entries), len(done), len(entries) - len(done))
+        return len(done)
+
+    async def reclaim(self):
+        pending = await self.redis.xpending_range(self.stream, self.group, min="-", max="+",
+                                                  count=self.batch_size, idle=self.reclaim_idle_ms)
+        retry, dead = self._split_pending(pending)
+        acked = 0
+        if dead:
+            entries = await self.redis.xclaim(self.stream, self.group, self.consumer, self.reclaim_idle_ms, dead)
+            pipe = self.redis.pipeline(transaction=True)
+            for entry_id, fields in entries:
+                if fields:
+                    pipe.xadd(DEAD_LETTER_STREAM, fields, maxlen=STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, *dead)
+            await pipe.execute()
+            self._stats["dead_lettered"] += len(dead)
+            logger.error(f"❌ {len(dead)} perintah gagal {self.max_deliveries}x, dipindah ke {DEAD_LETTER_STREAM}.")
+        if retry:
+            entries = await self.redis.xclaim(self.stream, self.group, self.consumer, self.reclaim_idle_ms, retry)
+            self._stats["reclaimed"] += len(entries)
+            acked = await self._process(entries)
+        for name in self._stale_consumers(await self.redis.xinfo_consumers(self.stream, self.group)):
+            await self.redis.xgroup_delconsumer(self.stream, self.group, name)
+        return acked
@@ -0,0 +1,395 @@
+"""Fan-out perintah ke grup perangkat: ekspansi target, pembatasan laju & inflight, dan progres di Redis."""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import redis
+
+from helper import json_codec
+
+logger = logging.getLogger("CommandFanout")
+
+GROUP_KEY_PREFIX = "device:group:"     # SET anggota grup; tag/region memakai nama "tag:<x>" / "region:<x>"
+FANOUT_KEY_PREFIX = "command:fanout:"  # HASH progres per fan-out (command_id perintah grup)
+GROUP_UPDATES_CHANNEL = "device:group:updates"  # pub/sub: nama grup yang anggotanya berubah
+FANOUT_TTL = 86400
+DEVICE_SAMPLE = 100                    # jumlah maksimal ID perangkat gagal/dilewati yang disimpan di progres
+
+
+def group_key(name):
+    return GROUP_KEY_PREFIX + name
+
+
+def fanout_key(fanout_id):
+    return FANOUT_KEY_PREFIX + fanout_id
+
+
+def save_group(redis_client, group, device_ids):
+    """Mengganti anggota grup secara atomik lalu memberi tahu web server (indeks langganan Socket.IO)."""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(group_key(group))
+    if device_ids:
+        pipe.sadd(group_key(group), *device_ids)
+    pipe.publish(GROUP_UPDATES_CHANNEL, group)
+    pipe.execute()
+
+
+def load_groups(redis_client):
+    """Semua grup perangkat {nama: set(device_id)} (SCAN + satu pipeline SMEMBERS)."""
+    names = [key[len(GROUP_KEY_PREFIX):] for key in redis_client.scan_iter(match=GROUP_KEY_PREFIX + "*", count=500)]
+    if not names:
+        return {}
+    pipe = redis_client.pipeline(transaction=False)
+    for name in names:
+        pipe.smembers(group_key(name))
+    return dict(zip(names, pipe.execute()))
+
+
+def selector_groups(target):
+    """Nama grup dari selector: `groups` apa adanya, `tags`/`regions` diberi prefix tag:/region:."""
+    names = list(target.get("groups") or [])
+    names += [f"tag:{tag}" for tag in target.get("tags") or []]
+    names += [f"region:{region}" for region in target.get("regions") or []]
+    return names
+
+
+def validate_target(target):
+    """Pesan error untuk selector yang tidak valid, atau None."""
+    if not isinstance(target, dict):
+        return "target harus berupa objek"
+    for field in ("device_ids", "groups", "tags", "regions"):
+        if not isinstance(target.get(field) or [], list):
+            return f"target.{field} harus berupa list"
+    if not (target.get("all") or target.get("device_ids") or selector_groups(target)):
+        return "target kosong: isi device_ids, groups, tags, regions, atau all"
+    return None
+
+
+def load_group_members(redis_client, target):
+    """Anggota setiap grup pada selector (satu round trip)."""
+    names = [] if target.get("all") else selector_groups(target)
+    if not names:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for name in names:
+        pipe.smembers(group_key(name))
+    return pipe.execute()
+
+
+async def load_group_members_async(redis_client, target):
+    names = [] if target.get("all") else selector_groups(target)
+    if not names:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for name in names:
+        pipe.smembers(group_key(name))
+    return await pipe.execute()
+
+
+def expand_target(target, whitelist, group_members):
+    """
+    Mengembalikan (targets, skipped): perangkat terdaftar yang akan dikirimi perintah dan
+    perangkat pada selector yang tidak ada di whitelist. Keduanya terurut agar progres stabil.
+    """
+    if target.get("all"):
+        candidates = set(whitelist)
+    else:
+        candidates = set(target.get("device_ids") or [])
+        for members in group_members:
+            candidates.update(members)
+    targets = sorted(device_id for device_id in candidates if device_id in whitelist)
+    skipped = sorted(candidates.difference(targets))
+    return targets, skipped
+
+
+def get_fanout_status(redis_client, fanout_id):
+    """Progres satu fan-out (None jika tidak dikenal / sudah kedaluwarsa)."""
+    raw = redis_client.hgetall(fanout_key(fanout_id))
+    if not raw:
+        return None
+    status = {"fanout_id": fanout_id, "state": raw.get("state", "running")}
+    for field in ("total", "published", "failed", "skipped", "acked", "ack_failed"):
+        status[field] = int(raw.get(field, 0))
+    for field in ("started_at", "finished_at"):
+        if raw.get(field):
+            status[field] = float(raw[field])
+    for field in ("failed_devices", "skipped_devices"):
+        status[field] = json_codec.loads(raw[field]) if raw.get(field) else []
+    return status
+
+
+class RateLimiter:
+    """Token bucket: rata-rata `rate` publish per detik dengan burst maksimal `burst` (rate <= 0 = tanpa batas)."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate / 10)
+        self.clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+
+    def delay(self):
+        """Mengambil satu token; mengembalikan berapa detik harus menunggu sebelum publish."""
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+
+class FanoutJob:
+    """
+    Satu perintah grup yang sudah diekspansi menjadi daftar perangkat. Payload per perangkat
+    adalah salinan payload perintah + fanout_id (untuk ack); jika `device_field` diisi
+    (mis. "sensor_id" pada threshold), field itu diisi ID perangkat tujuan.
+    """
+
+    def __init__(self, message, targets, skipped, base_topic, dispatched_at=None):
+        self.message = message
+        self.fanout_id = message["command_id"]
+        self.targets = targets
+        self.skipped = skipped
+        self.base_topic = base_topic
+        self.dispatched_at = dispatched_at
+        self.published = 0
+        self.failed = []
+        self.state = "running"
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def topic(self, device_id):
+        return f"{self.base_topic}/{device_id}"
+
+    def payload(self, device_id):
+        payload = {**(self.message.get("payload") or {}), "fanout_id": self.fanout_id}
+        if self.message.get("device_field"):
+            payload[self.message["device_field"]] = device_id
+        return payload
+
+    def finish(self, state="completed"):
+        self.state = state if not self.failed or state != "completed" else "partial"
+        self.finished_at = time.time()
+
+    def progress(self):
+        progress = {
+            "state": self.state,
+            "total": len(self.targets),
+            "published": self.published,
+            "failed": len(self.failed),
+            "skipped": len(self.skipped),
+            "started_at": self.started_at,
+            "failed_devices": json_codec.dumps_str(self.failed[:DEVICE_SAMPLE]),
+            "skipped_devices": json_codec.dumps_str(self.skipped[:DEVICE_SAMPLE]),
+        }
+        if self.finished_at:
+            progress["finished_at"] = self.finished_at
+        return progress
+
+    def queue_progress(self, pipe, ttl=FANOUT_TTL):
+        pipe.hset(fanout_key(self.fanout_id), mapping=self.progress())
+        pipe.expire(fanout_key(self.fanout_id), ttl)
+
+
+class FanoutDispatcher:
+    """
+    Engine thread: job fan-out dijalankan berurutan di satu thread agar beberapa perintah grup
+    tidak menjumlahkan bebannya ke broker. Setiap publish menunggu token RateLimiter dan slot
+    inflight (publish QoS 1 yang belum di-PUBACK), lalu progres ditulis ke Redis setiap
+    progress_interval detik.
+
+    :param publish: publish(topic, payload) -> MQTTMessageInfo, atau None jika gagal dikirim
+    :param on_done: dipanggil dengan job setelah selesai (mis. untuk CommandTracker)
+    """
+
+    def __init__(self, redis_client, publish, rate=200, max_inflight=100, progress_interval=1.0,
+                 ttl=FANOUT_TTL, on_done=None, drain_timeout=30):
+        self.redis = redis_client
+        self.publish = publish
+        self.rate = rate
+        self.max_inflight = max_inflight
+        self.progress_interval = progress_interval
+        self.ttl = ttl
+        self.on_done = on_done
+        self.drain_timeout = drain_timeout
+
+        self._jobs = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"jobs": 0, "completed": 0, "published": 0, "failed": 0, "max_inflight_seen": 0}
+
+    def submit(self, job):
+        self._write_progress(job)
+        self._jobs.put(job)
+
+    def _write_progress(self, job):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            job.queue_progress(pipe, self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Gagal menyimpan progres fan-out {job.fanout_id}: {e}")
+
+    def _settle(self, inflight, job):
+        """Membuang publish yang sudah dikonfirmasi broker dari antrian inflight."""
+        while inflight and inflight[0][1].is_published():
+            inflight.popleft()
+            job.published += 1
+
+    def run_job(self, job):
+        limiter = RateLimiter(self.rate)
+        inflight = deque()
+        last_progress = time.monotonic()
+        logger.info(f"📣 Fan-out {job.fanout_id}: {len(job.targets)} perangkat, {len(job.skipped)} dilewati.")
+
+        for device_id in job.targets:
+            wait = limiter.delay()
+            if wait and self._stop_event.wait(wait):
+                break
+            self._settle(inflight, job)
+            while len(inflight) >= self.max_inflight and not self._stop_event.wait(0.005):
+                self._settle(inflight, job)
+            if self._stop_event.is_set():
+                break
+
+            info = self.publish(job.topic(device_id), job.payload(device_id))
+            if info is None:
+                job.failed.append(device_id)
+            else:
+                inflight.append((device_id, info))
+                with self._lock:
+                    self._stats["max_inflight_seen"] = max(self._stats["max_inflight_seen"], len(inflight))
+
+            if time.monotonic() - last_progress >= self.progress_interval:
+                self._write_progress(job)
+                last_progress = time.monotonic()
+
+        # Tunggu konfirmasi sisa publish; yang tidak terkonfirmasi dihitung gagal
+        deadline = time.monotonic() + (1 if self._stop_event.is_set() else self.drain_timeout)
+        self._settle(inflight, job)
+        while inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+            self._settle(inflight, job)
+        job.failed.extend(device_id for device_id, _ in inflight)
+
+        job.finish("interrupted" if self._stop_event.is_set() else "completed")
+        self._complete(job)
+
+    def _complete(self, job):
+        """Menulis progres final, statistik, dan memberi tahu on_done untuk job yang sudah finish()."""
+        self._write_progress(job)
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["published"] += job.published
+            self._stats["failed"] += len(job.failed)
+        logger.info(f"✅ Fan-out {job.fanout_id} {job.state}: {job.published}/{len(job.targets)} terkirim.")
+        if self.on_done:
+            try:
+                self.on_done(job)
+            except Exception as e:
+                logger.error(f"❌ Callback fan-out {job.fanout_id} gagal: {e}")
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                job = self._jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._stats["jobs"] += 1
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logger.error(f"❌ Fan-out {job.fanout_id} gagal: {e}", exc_info=True)
+                if job.finished_at is None:
+                    job.finish("failed")
+                    self._complete(job)
+
+    def _drain_queued(self):
+        """Job yang sudah di-ack dari stream tapi belum berjalan ditandai interrupted, bukan dibuang diam-diam."""
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            job.finish("interrupted")
+            self._complete(job)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="command-fanout", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._drain_queued()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._jobs.qsize()
+        return stats
+
+
+async def run_fanout_async(job, redis_client, publish, rate=200, max_inflight=100, progress_interval=1.0,
+                           ttl=FANOUT_TTL):
+    """
+    Padanan FanoutDispatcher.run_job untuk engine asyncio. `publish(topic, payload)` adalah
+    coroutine yang selesai setelah broker mengonfirmasi (QoS 1) dan mengembalikan bool;
+    paling banyak max_inflight coroutine berjalan bersamaan.
+    """
+    async def write_progress():
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            job.queue_progress(pipe, ttl)
+            await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Gagal menyimpan progres fan-out {job.fanout_id}: {e}")
+
+    async def send(device_id):
+        try:
+            if await publish(job.topic(device_id), job.payload(device_id)):
+                job.published += 1
+            else:
+                job.failed.append(device_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Fan-out {job.fanout_id}: publish ke {device_id} gagal: {e}")
+            job.failed.append(device_id)
+        finally:
+            slots.release()
+
+    limiter = RateLimiter(rate)
+    slots = asyncio.Semaphore(max_inflight)
+    last_progress = time.monotonic()
+    logger.info(f"📣 Fan-out {job.fanout_id}: {len(job.targets)} perangkat, {len(job.skipped)} dilewati.")
+    await write_progress()
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            for device_id in job.targets:
+                wait = limiter.delay()
+                if wait:
+                    await asyncio.sleep(wait)
+                await slots.acquire()
+                tasks.create_task(send(device_id))
+                if time.monotonic() - last_progress >= progress_interval:
+                    await write_progress()
+                    last_progress = time.monotonic()
+        job.finish()
+    except asyncio.CancelledError:
+        job.finish("interrupted")
+        raise
+    except Exception as e:
+        logger.error(f"❌ Fan-out {job.fanout_id} gagal: {e}", exc_info=True)
+        job.finish("failed")
+    finally:
+        await write_progress()
+        logger.info(f"✅ Fan-out {job.fanout_id} {job.state}: {job.published}/{len(job.targets)} terkirim.")
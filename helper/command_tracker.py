@@ -0,0 +1,409 @@
+"""Pelacakan perintah end-to-end (API -> Redis -> MQTT -> ack perangkat) dan histogram latensi."""
+import asyncio
+import logging
+import threading
+import time
+
+import redis
+
+from helper import json_codec
+from helper.command_fanout import FANOUT_TTL, fanout_key
+
+logger = logging.getLogger("CommandTracker")
+
+STATE_KEY_PREFIX = "command:state:"    # HASH per command_id: type, device_id, <tahap>_at, result, error
+DEVICE_KEY_PREFIX = "command:device:"  # STRING: perintah registrasi terakhir per perangkat (ack tanpa command_id)
+LATENCY_KEY = "command:latency"        # HASH: "<histogram>:<bucket>" -> jumlah, "<histogram>:sum_ms"
+BATCH_KEY_PREFIX = "command:batch:"    # HASH per batch_id: device_id -> command_id
+ACK_KEY_PREFIX = "command:ack:"        # STRING (SET NX): ack per command_id hanya dicatat sekali
+STATE_TTL = 3600
+
+# Batas atas bucket histogram (ms); di atas bucket terakhir masuk "inf"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# Tahap -> (histogram, field awal pengukuran)
+#   dispatch : API menaruh perintah di stream -> worker mengambilnya
+#   publish  : worker mengambil -> publish MQTT selesai
+#   ack      : publish MQTT -> ack perangkat diterima
+#   total    : API -> ack perangkat
+HISTOGRAMS = {
+    "dispatched": (("dispatch", "created_at"),),
+    "published": (("publish", "dispatched_at"),),
+    "acked": (("ack", "published_at"), ("total", "created_at")),
+}
+STAGES = ("queued", "dispatched", "published", "acked")
+ACK_OK = ("success", "registered", "ok")
+
+
+def _state_key(command_id):
+    return STATE_KEY_PREFIX + command_id
+
+
+def _bucket(latency_ms):
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return str(bound)
+    return "inf"
+
+
+def track_queued(pipe, message, ttl=STATE_TTL):
+    """Menambahkan penulisan state awal ke pipeline produsen (satu round trip dengan XADD)."""
+    pipe.hset(_state_key(message["command_id"]), mapping={
+        "type": message.get("type", ""),
+        "device_id": message.get("device_id") or "",
+        "created_at": message["created_at"],
+    })
+    pipe.expire(_state_key(message["command_id"]), ttl)
+
+
+def track_batch(pipe, batch_id, messages, ttl=STATE_TTL):
+    """Mencatat anggota batch (device_id -> command_id) di pipeline yang sama dengan XADD-nya."""
+    key = BATCH_KEY_PREFIX + batch_id
+    pipe.hset(key, mapping={message["device_id"]: message["command_id"] for message in messages})
+    pipe.expire(key, ttl)
+
+
+def get_command_status(redis_client, command_id):
+    """State satu perintah (None jika tidak dikenal / sudah kedaluwarsa), termasuk latensi per tahap."""
+    return _parse_status(command_id, redis_client.hgetall(_state_key(command_id)))
+
+
+def get_batch_status(redis_client, batch_id):
+    """Ringkasan state semua perintah dalam satu batch (None jika batch tidak dikenal / kedaluwarsa)."""
+    members = redis_client.hgetall(BATCH_KEY_PREFIX + batch_id)
+    if not members:
+        return None
+    pipe = redis_client.pipeline(transaction=False)
+    for command_id in members.values():
+        pipe.hgetall(_state_key(command_id))
+    devices = {}
+    summary = {}
+    for (device_id, command_id), raw in zip(members.items(), pipe.execute()):
+        status = _parse_status(command_id, raw) or {"command_id": command_id, "state": "expired"}
+        devices[device_id] = {"command_id": command_id, "state": status["state"]}
+        if status.get("error"):
+            devices[device_id]["error"] = status["error"]
+        summary[status["state"]] = summary.get(status["state"], 0) + 1
+    return {"batch_id": batch_id, "total": len(devices), "summary": summary, "devices": devices}
+
+
+def _parse_status(command_id, raw):
+    if not raw:
+        return None
+    status = {"command_id": command_id, "type": raw.get("type"), "device_id": raw.get("device_id") or None}
+    timestamps = {}
+    for stage in STAGES:
+        value = raw.get(f"{stage}_at" if stage != "queued" else "created_at")
+        if value:
+            timestamps[stage] = float(value)
+    reached = [stage for stage in STAGES if stage in timestamps]
+    status["state"] = raw.get("result") or (reached[-1] if reached else "unknown")
+    status["timestamps"] = timestamps
+    status["latency_ms"] = {
+        name: round((timestamps[stage] - timestamps[start]) * 1000, 1)
+        for stage, start, name in (("dispatched", "queued", "dispatch"), ("published", "dispatched", "publish"),
+                                   ("acked", "published", "ack"), ("acked", "queued", "total"))
+        if stage in timestamps and start in timestamps
+    }
+    if raw.get("error"):
+        status["error"] = raw["error"]
+    return status
+
+
+def get_latency_histograms(redis_client):
+    """Histogram latensi gabungan semua worker: jumlah per bucket, rata-rata, dan perkiraan persentil."""
+    raw = redis_client.hgetall(LATENCY_KEY)
+    result = {}
+    for name in ("dispatch", "publish", "ack", "total"):
+        buckets = {bound: int(raw.get(f"{name}:{bound}", 0)) for bound in map(str, LATENCY_BUCKETS_MS)}
+        buckets["inf"] = int(raw.get(f"{name}:inf", 0))
+        count = sum(buckets.values())
+        total_ms = float(raw.get(f"{name}:sum_ms", 0))
+        result[name] = {
+            "count": count,
+            "avg_ms": round(total_ms / count, 1) if count else None,
+            "p50_ms": _percentile(buckets, count, 0.50),
+            "p95_ms": _percentile(buckets, count, 0.95),
+            "p99_ms": _percentile(buckets, count, 0.99),
+            "buckets_ms": buckets,
+        }
+    return result
+
+
+def _percentile(buckets, count, quantile):
+    """Batas atas bucket tempat persentil jatuh (None jika kosong)."""
+    if not count:
+        return None
+    seen = 0
+    for bound, value in buckets.items():
+        seen += value
+        if seen >= quantile * count:
+            return None if bound == "inf" else int(bound)
+    return None
+
+
+class CommandTracker:
+    """
+    Mencatat perpindahan tahap perintah dari worker. dispatched()/published()/finished()/acked()
+    hanya menambah event ke buffer (aman dipanggil dari thread MQTT/ingest), dan flush()
+    menulis semuanya ke Redis dalam pipeline: timestamp tahap di hash state + HINCRBY bucket
+    histogram latensi.
+
+    Latensi dihitung dari timestamp event (bukan saat flush). Untuk ack, timestamp awal
+    (published_at/created_at) bisa ditulis proses lain, sehingga dibaca dulu dari Redis.
+    """
+
+    def __init__(self, redis_client, ttl=STATE_TTL, flush_interval=0.5, max_pending=10000):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._events = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {"events": 0, "flushed": 0, "dropped": 0, "errors": 0, "unmatched_acks": 0,
+                       "duplicate_acks": 0}
+
+    # --- Producer (non-blocking) ---
+    def _record(self, event):
+        with self._lock:
+            self._stats["events"] += 1
+            if len(self._events) >= self.max_pending:
+                self._stats["dropped"] += 1
+                return
+            self._events.append(event)
+
+    def dispatched(self, message):
+        """Worker mengambil perintah dari stream. Mengembalikan timestamp untuk published()."""
+        now = time.time()
+        if message.get("command_id"):
+            self._record({"command_id": message["command_id"], "stage": "dispatched", "at": now,
+                          "since": {"created_at": message.get("created_at")}})
+        return now
+
+    def published(self, message, dispatched_at):
+        if not message.get("command_id"):
+            return
+        registering = message.get("device_id") if message.get("type") == "register_device" else None
+        self._record({"command_id": message["command_id"], "stage": "published", "at": time.time(),
+                      "since": {"dispatched_at": dispatched_at}, "created_at": message.get("created_at"),
+                      "register_device": registering})
+
+    def finished(self, message, result, error=None):
+        """Hasil akhir tanpa ack perangkat: rejected (tidak di whitelist), expired (terlalu lama di stream)."""
+        if message.get("command_id"):
+            self._record({"command_id": message["command_id"], "stage": None, "at": time.time(),
+                          "result": result, "error": error})
+
+    def acked(self, command_id, device_id=None, status=None, error=None, fanout_id=None):
+        """
+        Ack perangkat; tanpa command_id dicocokkan ke perintah registrasi terakhir perangkat tersebut.
+        Ack perintah grup (fanout_id) dihitung di progres fan-out.
+        """
+        ok = status is None or str(status).lower() in ACK_OK
+        if fanout_id and not command_id:
+            self._record({"command_id": None, "fanout_id": fanout_id, "stage": "fanout_acked", "ok": ok})
+            return
+        if not command_id and not device_id:
+            return
+        self._record({"command_id": command_id, "device_id": device_id, "stage": "acked", "at": time.time(),
+                      "since": {}, "result": "acked" if ok else "failed", "error": None if ok else error})
+
+    # --- Flush ---
+    def _drain(self):
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    @staticmethod
+    def _pending_lookups(events):
+        """
+        Ack yang perintahnya di-publish dalam batch yang sama diselesaikan langsung (timestamp
+        publish belum ada di Redis); sisanya perlu dibaca dari Redis.
+        """
+        published = {}
+        lookups = []
+        for event in events:
+            if event["stage"] == "published":
+                entry = {"command_id": event["command_id"], "published_at": event["at"],
+                         "created_at": event.get("created_at")}
+                published[event["command_id"]] = entry
+                if event.get("register_device"):
+                    published[("device", event["register_device"])] = entry
+            elif event["stage"] == "acked":
+                local = published.get(event["command_id"] or ("device", event["device_id"]))
+                if local:
+                    event["command_id"] = local["command_id"]
+                    event["since"] = {"published_at": local["published_at"], "created_at": local["created_at"]}
+                else:
+                    lookups.append(event)
+        return lookups
+
+    def _queue_lookup(self, pipe, event):
+        if event["command_id"]:
+            pipe.hmget(_state_key(event["command_id"]), "published_at", "created_at")
+        else:
+            pipe.get(DEVICE_KEY_PREFIX + event["device_id"])
+
+    def _resolve(self, event, value):
+        if event["command_id"]:
+            published_at, created_at = value or (None, None)
+        else:
+            pending = json_codec.loads(value) if value else {}
+            event["command_id"] = pending.get("command_id")
+            published_at, created_at = pending.get("published_at"), pending.get("created_at")
+        event["since"] = {"published_at": published_at, "created_at": created_at}
+
+    def _acks_to_claim(self, events):
+        return [event for event in events if event["stage"] == "acked" and event["command_id"]]
+
+    def _drop_duplicate_acks(self, events, claimed, results):
+        """
+        Topik respons registrasi tidak di-share, sehingga setiap instance/proses worker menerima
+        respons yang sama. Hanya instance yang memenangkan SET NX yang mencatat ack-nya.
+        """
+        duplicates = {id(event) for event, won in zip(claimed, results) if not won}
+        if not duplicates:
+            return events
+        with self._lock:
+            self._stats["duplicate_acks"] += len(duplicates)
+        return [event for event in events if id(event) not in duplicates]
+
+    def _queue_claim(self, pipe, event):
+        pipe.set(ACK_KEY_PREFIX + event["command_id"], 1, nx=True, ex=self.ttl)
+
+    def _queue_write(self, pipe, event):
+        if event["stage"] == "fanout_acked":
+            pipe.hincrby(fanout_key(event["fanout_id"]), "acked" if event["ok"] else "ack_failed", 1)
+            pipe.expire(fanout_key(event["fanout_id"]), FANOUT_TTL)
+            return
+        command_id = event["command_id"]
+        if not command_id:
+            with self._lock:
+                self._stats["unmatched_acks"] += 1
+            return
+        key = _state_key(command_id)
+        fields = {}
+        if event["stage"]:
+            fields[f"{event['stage']}_at"] = event["at"]
+        if event.get("result"):
+            fields["result"] = event["result"]
+        if event.get("error"):
+            fields["error"] = str(event["error"])
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.ttl)
+
+        for histogram, start_field in HISTOGRAMS.get(event["stage"], ()):
+            started = event["since"].get(start_field)
+            if started in (None, ""):
+                continue
+            latency_ms = max(0.0, (event["at"] - float(started)) * 1000)
+            pipe.hincrby(LATENCY_KEY, f"{histogram}:{_bucket(latency_ms)}", 1)
+            pipe.hincrbyfloat(LATENCY_KEY, f"{histogram}:sum_ms", round(latency_ms, 3))
+
+        if event.get("register_device"):
+            # Ack registrasi dari firmware lama tidak membawa command_id; cocokkan lewat device_id
+            pipe.set(DEVICE_KEY_PREFIX + event["register_device"], json_codec.dumps_str({
+                "command_id": command_id, "published_at": event["at"], "created_at": event.get("created_at"),
+            }), ex=self.ttl)
+
+    def _flushed(self, count):
+        with self._lock:
+            self._stats["flushed"] += count
+
+    def _failed(self, events, error):
+        logger.warning(f"⚠️ Gagal menyimpan {len(events)} event pelacakan perintah: {error}")
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def flush(self):
+        events = self._drain()
+        if not events:
+            return 0
+        try:
+            lookups = self._pending_lookups(events)
+            if lookups:
+                pipe = self.redis.pipeline(transaction=False)
+                for event in lookups:
+                    self._queue_lookup(pipe, event)
+                for event, value in zip(lookups, pipe.execute()):
+                    self._resolve(event, value)
+            claimed = self._acks_to_claim(events)
+            if claimed:
+                pipe = self.redis.pipeline(transaction=False)
+                for event in claimed:
+                    self._queue_claim(pipe, event)
+                events = self._drop_duplicate_acks(events, claimed, pipe.execute())
+            pipe = self.redis.pipeline(transaction=False)
+            for event in events:
+                self._queue_write(pipe, event)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Pelacakan bersifat observabilitas; event dibuang agar tidak menahan pengiriman perintah
+            self._failed(events, e)
+            return 0
+        self._flushed(len(events))
+        return len(events)
+
+    # --- Kontrol ---
+    def _loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="command-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._events)
+        return stats
+
+
+class AsyncCommandTracker(CommandTracker):
+    """CommandTracker untuk client redis.asyncio: pencatatan tetap sinkron, flush() berupa coroutine."""
+
+    async def flush(self):
+        events = self._drain()
+        if not events:
+            return 0
+        try:
+            lookups = self._pending_lookups(events)
+            if lookups:
+                pipe = self.redis.pipeline(transaction=False)
+                for event in lookups:
+                    self._queue_lookup(pipe, event)
+                for event, value in zip(lookups, await pipe.execute()):
+                    self._resolve(event, value)
+            claimed = self._acks_to_claim(events)
+            if claimed:
+                pipe = self.redis.pipeline(transaction=False)
+                for event in claimed:
+                    self._queue_claim(pipe, event)
+                events = self._drop_duplicate_acks(events, claimed, await pipe.execute())
+            pipe = self.redis.pipeline(transaction=False)
+            for event in events:
+                self._queue_write(pipe, event)
+            await pipe.execute()
+        except redis.RedisError as e:
+            self._failed(events, e)
+            return 0
+        self._flushed(len(events))
+        return len(events)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,126 @@
+"""Gerbang otorisasi perangkat untuk jalur ingest: negative cache, counter penolakan, dan log tersampel."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("DeviceGate")
+
+
+class DeviceGate:
+    """
+    Memutuskan apakah pesan dari sebuah device_id boleh diproses.
+
+    - Perangkat di whitelist lolos tanpa lock (cek `in` pada set lokal).
+    - Perangkat yang tidak dikenal dicek sekali ke `lookup` (mis. set Redis bersama, untuk
+      perangkat yang baru terdaftar di proses lain), lalu disimpan di negative cache selama
+      negative_ttl detik agar banjir pesan dari ID yang sama tidak memicu lookup berulang.
+    - Dengan local_only=True (thread jaringan MQTT) lookup tidak dilakukan: hanya whitelist dan
+      negative cache yang dicek, ID yang belum diputuskan diteruskan ke worker ingest.
+    - Setiap penolakan dihitung per ID; log hanya ditulis untuk penolakan pertama, lalu
+      setiap log_every penolakan atau setiap log_interval detik per ID (dengan jumlah yang
+      disembunyikan), sehingga perangkat yang membanjiri broker tidak membanjiri log.
+    """
+
+    def __init__(self, whitelist, lookup=None, negative_ttl=60, log_every=1000, log_interval=60,
+                 max_tracked=10000):
+        self.whitelist = whitelist
+        self.lookup = lookup
+        self.negative_ttl = negative_ttl
+        self.log_every = max(1, log_every)
+        self.log_interval = log_interval
+        self.max_tracked = max_tracked
+
+        self._lock = threading.Lock()
+        self._negative = {}   # device_id -> waktu kedaluwarsa (monotonic)
+        self._rejections = {}  # device_id -> [jumlah, jumlah saat terakhir log, waktu terakhir log]
+        self._stats = {
+            "rejected": 0,
+            "rejected_before_decode": 0,
+            "negative_hits": 0,
+            "remote_lookups": 0,
+            "remote_admits": 0,
+            "deferred": 0,
+        }
+
+    def admit(self, device_id, before_decode=False, local_only=False):
+        """
+        True jika device_id boleh diproses; penolakan dicatat dan di-log secara tersampel.
+        local_only=True tidak pernah memanggil lookup (blocking): ID yang belum ada di whitelist
+        maupun negative cache diloloskan agar diputuskan ulang dengan admit() di worker.
+        """
+        if device_id in self.whitelist:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            expiry = self._negative.get(device_id)
+            cached = expiry is not None and expiry > now
+            if cached:
+                self._stats["negative_hits"] += 1
+            elif local_only and self.lookup is not None:
+                self._stats["deferred"] += 1
+                return True
+
+        if not cached and self.lookup is not None:
+            with self._lock:
+                self._stats["remote_lookups"] += 1
+            if self.lookup(device_id):
+                with self._lock:
+                    self._stats["remote_admits"] += 1
+                    self._negative.pop(device_id, None)
+                return True
+
+        self._reject(device_id, now, before_decode, cache=not cached)
+        return False
+
+    def _reject(self, device_id, now, before_decode, cache):
+        with self._lock:
+            if cache:
+                self._negative.pop(device_id, None)
+                self._negative[device_id] = now + self.negative_ttl
+                if len(self._negative) > self.max_tracked:
+                    # Entri paling lama dimasukkan yang dibuang lebih dulu
+                    del self._negative[next(iter(self._negative))]
+
+            self._stats["rejected"] += 1
+            if before_decode:
+                self._stats["rejected_before_decode"] += 1
+
+            entry = self._rejections.get(device_id)
+            if entry is None:
+                if len(self._rejections) >= self.max_tracked:
+                    del self._rejections[next(iter(self._rejections))]
+                entry = self._rejections[device_id] = [0, 0, 0.0]
+            entry[0] += 1
+            count, logged_at_count, logged_at = entry
+            should_log = count == 1 or count - logged_at_count >= self.log_every \
+                or now - logged_at >= self.log_interval
+            if should_log:
+                suppressed = count - logged_at_count - 1
+                entry[1], entry[2] = count, now
+
+        if should_log:
+            suffix = f" ({suppressed} penolakan serupa tidak di-log, total {count})" if suppressed > 0 else ""
+            logger.warning(f"⛔ Perangkat tidak sah: {device_id}. Pesan ditolak.{suffix}")
+
+    def is_rejected(self, device_id):
+        """True jika device_id masih ada di negative cache (lookup remote tidak perlu diulang)."""
+        with self._lock:
+            expiry = self._negative.get(device_id)
+        return expiry is not None and expiry > time.monotonic()
+
+    def forget(self, device_ids):
+        """Hapus entri negative cache, mis. setelah perangkat terdaftar."""
+        with self._lock:
+            for device_id in device_ids:
+                self._negative.pop(device_id, None)
+
+    def get_stats(self, top=10):
+        with self._lock:
+            stats = dict(self._stats)
+            now = time.monotonic()
+            stats["negative_cache_size"] = sum(1 for expiry in self._negative.values() if expiry > now)
+            stats["unique_rejected_ids"] = len(self._rejections)
+            ranked = sorted(self._rejections.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        stats["top_rejected"] = [{"device_id": device_id, "count": entry[0]} for device_id, entry in ranked]
+        return stats
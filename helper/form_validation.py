@@ -17,14 +17,52 @@ def get_form_data(required_fields):
         BadRequest: If any required field is missing or empty.
     """
 
+    body = request.get_json(silent=True) or {}
     data = {}
     for field in required_fields:
-        field_value = request.get_json().get(field)
+        field_value = body.get(field)
         # print(field_value)
         if not field_value:
             err_message = jsonify(
                 {"err_message": f"Missing required field: {field}"})
+            err_message.status_code = 400
             raise BadRequest(response=err_message)
         data[field] = field_value
 
     return data
+
+
+def validate_entries(entries, required_fields, key_field):
+    """
+    Validates a list of entries (bulk requests) in a single pass.
+
+    Args:
+        entries (list): Entries to validate, usually dicts decoded from the request body.
+        required_fields (list): Fields that must be present and non-empty in every entry.
+        key_field (str): Field that must be unique across the batch (e.g. device_id).
+
+    Returns:
+        tuple: (valid, errors) where valid is a list of dicts with only the required fields
+        and errors is a list of {"index", key_field, "error"} dicts, in input order.
+    """
+    valid, errors, seen = [], [], set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({"index": index, key_field: None, "error": "Entry must be an object"})
+            continue
+        missing = [field for field in required_fields if not entry.get(field)]
+        key = entry.get(key_field)
+        if missing:
+            error = f"Missing required field: {', '.join(missing)}"
+        elif not isinstance(key, str):
+            # Nilai list/dict tidak bisa di-hash untuk cek duplikat; tolak per entri, bukan 500
+            error = f"{key_field} must be a string"
+            key = None
+        elif key in seen:
+            error = f"Duplicate {key_field} in request"
+        else:
+            seen.add(key)
+            valid.append({field: entry[field] for field in required_fields})
+            continue
+        errors.append({"index": index, key_field: key, "error": error})
+    return valid, errors
@@ -0,0 +1,183 @@
+"""Agregator heartbeat ke Laravel: coalescing per perangkat + flush berkala lewat session pool."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("HeartbeatAggregator")
+
+# Status 4xx yang tetap layak dicoba lagi; 4xx lain berarti data ditolak permanen oleh Laravel
+RETRYABLE_CLIENT_ERRORS = {408, 425, 429}
+
+
+def _is_rejection(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return False
+    return 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_CLIENT_ERRORS
+
+
+class HeartbeatAggregator:
+    """
+    Menyimpan hanya heartbeat terakhir (fw_version/rssi) per perangkat, lalu mengirimnya
+    ke Laravel setiap flush_interval detik.
+
+    Jika batch_url diisi, seluruh heartbeat dikirim sebagai satu request bulk:
+        POST batch_url  {"heartbeats": [{"device_id": ..., "fw_version": ..., "rssi": ...}, ...]}
+    Jika tidak, dikirim satu request per perangkat ke {base_url}/{device_id}/heartbeat
+    secara paralel di atas session keep-alive.
+
+    Kegagalan sementara (koneksi, timeout, 5xx, 429) dikembalikan ke antrian. Respons 4xx lain
+    dianggap penolakan permanen: heartbeat dibuang dan dihitung `rejected`. Jika request batch
+    ditolak, batch dikirim ulang per perangkat agar satu perangkat tidak valid tidak menahan
+    seluruh armada.
+
+    :param base_url: URL dasar API IoT Laravel, mis. http://localhost:8000/api/iot
+    :param flush_interval: Interval flush (detik)
+    :param batch_url: URL endpoint batch (opsional)
+    :param pool_size: Ukuran connection pool dan jumlah pengirim paralel
+    :param timeout: Timeout setiap request HTTP (detik)
+    """
+
+    def __init__(self, base_url, flush_interval=5.0, batch_url=None, pool_size=8, timeout=5, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.flush_interval = flush_interval
+        self.batch_url = batch_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self.session = session or self._build_session(pool_size)
+        self._executor = None if batch_url else ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="heartbeat")
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {
+            "received": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "failed": 0,
+            "rejected": 0,
+            "flushes": 0,
+        }
+
+    @staticmethod
+    def _build_session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # --- Producer ---
+    def update(self, device_id, fw_version=None, rssi=None):
+        """Mencatat heartbeat terbaru; heartbeat lama yang belum terkirim ditimpa."""
+        with self._lock:
+            self._stats["received"] += 1
+            if device_id in self._pending:
+                self._stats["coalesced"] += 1
+            self._pending[device_id] = {"fw_version": fw_version, "rssi": rssi}
+
+    # --- Flush ---
+    def flush(self):
+        """Mengirim semua heartbeat yang tertunda. Mengembalikan jumlah yang berhasil terkirim."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._stats["flushes"] += 1
+        if not batch:
+            return 0
+
+        if self.batch_url:
+            failed, rejected = self._send_batch(batch)
+        else:
+            failed, rejected = self._send_individual(batch)
+
+        sent = len(batch) - len(failed) - len(rejected)
+        with self._lock:
+            self._stats["sent"] += sent
+            self._stats["failed"] += len(failed)
+            self._stats["rejected"] += len(rejected)
+            # Kembalikan yang gagal untuk dicoba lagi, kecuali sudah ada heartbeat yang lebih baru
+            for device_id in failed:
+                self._pending.setdefault(device_id, batch[device_id])
+        return sent
+
+    def _send_batch(self, batch):
+        """Mengembalikan (gagal sementara, ditolak permanen)."""
+        heartbeats = [{"device_id": device_id, **data} for device_id, data in batch.items()]
+        try:
+            response = self.session.post(self.batch_url, json={"heartbeats": heartbeats}, timeout=self.timeout)
+            response.raise_for_status()
+            return [], []
+        except requests.RequestException as e:
+            if _is_rejection(e):
+                logger.warning(f"⚠️ Batch heartbeat ditolak ({e}); dikirim ulang per perangkat.")
+                return self._send_individual(batch)
+            logger.error(f"❌ Gagal mengirim batch heartbeat ({len(batch)} perangkat): {e}")
+            return list(batch), []
+
+    def _send_one(self, device_id, data):
+        """Mengembalikan "sent", "failed" (dicoba lagi), atau "rejected" (dibuang)."""
+        url = f"{self.base_url}/{device_id}/heartbeat"
+        try:
+            response = self.session.post(url, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            return "sent"
+        except requests.RequestException as e:
+            if _is_rejection(e):
+                logger.warning(f"⚠️ Heartbeat {device_id} ditolak Laravel, dibuang: {e}")
+                return "rejected"
+            logger.error(f"Gagal update heartbeat {device_id} ke Laravel: {e}")
+            return "failed"
+
+    def _send_individual(self, batch):
+        """Mengembalikan (gagal sementara, ditolak permanen)."""
+        if self._executor is None:
+            # Mode batch: executor baru dibuat saat batch pertama kali ditolak
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="heartbeat")
+        futures = {
+            device_id: self._executor.submit(self._send_one, device_id, data)
+            for device_id, data in batch.items()
+        }
+        results = {device_id: future.result() for device_id, future in futures.items()}
+        failed = [device_id for device_id, result in results.items() if result == "failed"]
+        rejected = [device_id for device_id, result in results.items() if result == "rejected"]
+        return failed, rejected
+
+    # --- Kontrol ---
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error saat flush heartbeat: {e}", exc_info=True)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="heartbeat-flush", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Heartbeat aggregator berjalan (interval={self.flush_interval}s, "
+                    f"mode={'batch' if self.batch_url else 'per-device'}).")
+
+    def stop(self):
+        """Menghentikan loop dan melakukan flush terakhir."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + self.timeout)
+        self.flush()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
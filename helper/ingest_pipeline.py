@@ -0,0 +1,158 @@
+"""Antrian ingest terbatas + worker pool untuk memisahkan callback MQTT dari pemrosesan."""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger("IngestPipeline")
+
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DROP_NEWEST)
+
+
+class IngestPipeline:
+    """
+    Pipeline bertahap: producer (mis. thread jaringan paho) hanya memanggil submit(),
+    sedangkan sejumlah worker thread menguras antrian dan memanggil handler.
+
+    :param handler: Fungsi yang dipanggil worker untuk setiap item
+    :param num_workers: Jumlah worker thread pemroses
+    :param max_size: Batas kedalaman antrian
+    :param policy: Perilaku saat antrian penuh: 'block', 'drop_oldest', atau 'drop_newest'
+    :param block_timeout: Batas waktu tunggu (detik) untuk policy 'block' (None = tunggu terus)
+    """
+
+    def __init__(self, handler, num_workers=4, max_size=10000, policy=POLICY_BLOCK,
+                 block_timeout=None, name="ingest"):
+        if policy not in POLICIES:
+            raise ValueError(f"Policy antrian tidak dikenal: {policy}")
+        if num_workers < 1:
+            raise ValueError("num_workers minimal 1")
+
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_size = max_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._workers = []
+        self._running = False
+        self._stopped = False  # True setelah stop(); item baru ditolak karena tidak ada worker yang menguras
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped_oldest": 0,
+            "dropped_newest": 0,
+            "dropped_stopped": 0,
+            "high_watermark": 0,
+        }
+
+    # --- Producer ---
+    def submit(self, item):
+        """
+        Memasukkan item ke antrian sesuai policy. Mengembalikan False jika item dibuang.
+        Item sebelum start() disimpan di antrian; item setelah stop() langsung dibuang.
+        """
+        if self._stopped:
+            self._count("dropped_stopped")
+            return False
+        if self.policy == POLICY_BLOCK:
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped_newest")
+                return False
+        elif self.policy == POLICY_DROP_NEWEST:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._count("dropped_newest")
+                return False
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._queue.task_done()
+                        self._count("dropped_oldest")
+                    except queue.Empty:
+                        pass
+
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+            if depth > self._stats["high_watermark"]:
+                self._stats["high_watermark"] = depth
+        return True
+
+    # --- Consumer ---
+    def _worker_loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if not self._running:
+                    break
+                continue
+
+            try:
+                self.handler(item)
+                self._count("processed")
+            except Exception as e:
+                self._count("failed")
+                logger.error(f"❌ ({self.name}) Error pada handler: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    # --- Kontrol ---
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._stopped = False
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"✅ ({self.name}) {self.num_workers} worker dimulai "
+                    f"(max_size={self.max_size}, policy={self.policy}).")
+
+    def stop(self, timeout=5.0):
+        """Berhenti menerima item baru lalu menunggu worker menguras sisa antrian."""
+        self._stopped = True
+        self._running = False
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        if not any(worker.is_alive() for worker in self._workers):
+            # Item yang lolos pemeriksaan _stopped tepat saat worker keluar tidak akan diproses lagi
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+                self._count("dropped_stopped")
+        self._workers = []
+        logger.info(f"({self.name}) Worker pool berhenti. Sisa antrian: {self._queue.qsize()}")
+
+    # --- Metrik ---
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["depth"] = self._queue.qsize()
+        stats["max_size"] = self.max_size
+        stats["policy"] = self.policy
+        stats["workers"] = self.num_workers
+        return stats
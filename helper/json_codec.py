@@ -0,0 +1,71 @@
+"""
+Codec JSON bersama untuk seluruh jalur data (MQTT, Redis, Socket.IO, HTTP).
+
+Memakai orjson jika terpasang dan jatuh ke json standar jika tidak. Kedua backend
+menghasilkan JSON yang ekuivalen: datetime/date ditulis ISO 8601, Decimal sebagai string,
+set sebagai list. dumps() selalu mengembalikan bytes (siap untuk MQTT/Redis/HTTP body).
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+import dataclasses
+import json
+import uuid
+
+try:
+    import orjson
+except ImportError:  # orjson opsional; fallback ke json standar
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(obj):
+    """Tipe yang tidak dikenal backend JSON."""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Objek bertipe {type(obj).__name__} tidak bisa diserialisasi ke JSON")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        """Serialisasi ke bytes JSON (compact)."""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(data):
+        """Parse JSON dari bytes/str."""
+        return orjson.loads(data)
+else:
+    def dumps(obj):
+        """Serialisasi ke bytes JSON (compact)."""
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def loads(data):
+        """Parse JSON dari bytes/str."""
+        return json.loads(data)
+
+
+def dumps_str(obj):
+    """Seperti dumps() tetapi mengembalikan str, untuk API yang mewajibkan teks."""
+    return dumps(obj).decode()
+
+
+class SocketIOJSON:
+    """Adapter modul json untuk python-socketio (SocketIO(app, json=SocketIOJSON))."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return dumps_str(obj)
+
+    @staticmethod
+    def loads(data, *args, **kwargs):
+        return loads(data)
@@ -1,4 +1,27 @@
 from flask import jsonify
+from flask.json.provider import JSONProvider
+
+from helper import json_codec
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    JSON provider Flask yang memakai helper.json_codec (orjson jika tersedia).
+    Dipasang dengan app.json = FastJSONProvider(app); jsonify() dan create_response()
+    otomatis ikut memakainya, dan datetime cukup dikirim apa adanya (ditulis ISO 8601).
+    """
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps_str(obj)
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_codec.dumps(obj), mimetype=self.mimetype)
 
 def create_response(status=True, message="Success", data=None, extra_message=None, status_code=200):
     """
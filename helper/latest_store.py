@@ -0,0 +1,168 @@
+"""Nilai water level terakhir per perangkat: dict di proses worker, di-mirror ke HASH Redis untuk /latest."""
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+
+import redis
+
+from helper import json_codec
+
+logger = logging.getLogger("LatestStore")
+
+LATEST_KEY = "waterlevel:latest"  # HASH device_id -> {"water_level", "ts"} (ts = epoch detik)
+
+# HSET per perangkat hanya jika pembacaan lebih baru dari yang tersimpan: dengan shared subscription
+# pembacaan satu perangkat bisa diproses worker berbeda dan tiba di Redis tidak berurutan.
+# ARGV: device_id, ts, value, device_id, ts, value, ...
+SET_IF_NEWER_SCRIPT = """
+local written = 0
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    if not current or tonumber(cjson.decode(current)['ts']) <= tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        written = written + 1
+    end
+end
+return written
+"""
+
+
+def _script_args(readings):
+    args = []
+    for device_id, reading in readings.items():
+        args += [device_id, reading["ts"], json_codec.dumps_str(reading)]
+    return args
+
+
+def set_if_newer(redis_client, readings, key=LATEST_KEY):
+    """Menulis {device_id: {"water_level", "ts"}} ke HASH, melewati perangkat yang nilainya sudah lebih baru."""
+    if not readings:
+        return 0
+    return redis_client.eval(SET_IF_NEWER_SCRIPT, 1, key, *_script_args(readings))
+
+
+def to_record(device_id, reading):
+    """Format respons /latest; `height` dipertahankan untuk klien lama."""
+    return {
+        "device_id": device_id,
+        "water_level": reading["water_level"],
+        "height": reading["water_level"],
+        "time": datetime.fromtimestamp(reading["ts"], tz=timezone.utc),
+    }
+
+
+def get_latest(redis_client, device_ids, key=LATEST_KEY):
+    """Nilai terakhir beberapa perangkat dengan satu HMGET; perangkat yang tidak ada bernilai None."""
+    values = redis_client.hmget(key, device_ids) if device_ids else []
+    return {device_id: json_codec.loads(value) if value else None for device_id, value in zip(device_ids, values)}
+
+
+class LatestValueStore:
+    """
+    Dipanggil dari jalur ingest tepat setelah data point diserahkan ke writer InfluxDB. update()
+    hanya menimpa entri dict (O(1), aman dari banyak thread); flush() menulis perangkat yang berubah
+    sejak flush terakhir ke HASH Redis dalam satu round trip, sehingga N pembacaan satu perangkat
+    per interval menjadi satu penulisan.
+    """
+
+    def __init__(self, redis_client, key=LATEST_KEY, flush_interval=0.2):
+        self.redis = redis_client
+        self.key = key
+        self.flush_interval = flush_interval
+
+        self._latest = {}
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {"updates": 0, "coalesced": 0, "flushed": 0, "errors": 0}
+
+    def update(self, device_id, water_level, timestamp_ns):
+        """Mencatat pembacaan; nilai yang bukan angka (data tidak lengkap) diabaikan."""
+        try:
+            reading = {"water_level": float(water_level), "ts": timestamp_ns / 1e9}
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._stats["updates"] += 1
+            if device_id in self._dirty:
+                self._stats["coalesced"] += 1
+            self._latest[device_id] = self._dirty[device_id] = reading
+
+    def get(self, device_id):
+        return self._latest.get(device_id)
+
+    def _drain(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def _requeue(self, dirty, error):
+        logger.warning(f"⚠️ Gagal menyimpan nilai terakhir {len(dirty)} perangkat: {error}")
+        with self._lock:
+            self._stats["errors"] += 1
+            # Pembacaan yang lebih baru (masuk selama flush) tidak ditimpa
+            for device_id, reading in dirty.items():
+                self._dirty.setdefault(device_id, reading)
+
+    def _flushed(self, count):
+        with self._lock:
+            self._stats["flushed"] += count
+
+    def flush(self):
+        dirty = self._drain()
+        if not dirty:
+            return 0
+        try:
+            set_if_newer(self.redis, dirty, self.key)
+        except redis.RedisError as e:
+            self._requeue(dirty, e)
+            return 0
+        self._flushed(len(dirty))
+        return len(dirty)
+
+    def _loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="latest-store", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["devices"] = len(self._latest)
+            stats["pending"] = len(self._dirty)
+        return stats
+
+
+class AsyncLatestValueStore(LatestValueStore):
+    """LatestValueStore untuk client redis.asyncio: update() tetap sinkron, flush() berupa coroutine."""
+
+    async def flush(self):
+        dirty = self._drain()
+        if not dirty:
+            return 0
+        try:
+            await self.redis.eval(SET_IF_NEWER_SCRIPT, 1, self.key, *_script_args(dirty))
+        except redis.RedisError as e:
+            self._requeue(dirty, e)
+            return 0
+        self._flushed(len(dirty))
+        return len(dirty)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,104 @@
+"""Decode/encode payload telemetri MQTT: JSON (perangkat lama), MessagePack, dan CBOR."""
+from datetime import datetime
+
+import msgpack
+
+from helper import json_codec
+
+try:
+    import cbor2
+except ImportError:  # CBOR opsional; perangkat CBOR ditolak jika cbor2 tidak terpasang
+    cbor2 = None
+
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+FORMAT_CBOR = "cbor"
+FORMATS = (FORMAT_JSON, FORMAT_MSGPACK, FORMAT_CBOR)
+
+# Tag CBOR self-describe (0xd9d9f7), opsional di depan payload CBOR
+CBOR_SELF_DESCRIBE = b"\xd9\xd9\xf7"
+
+
+def split_topic(topic):
+    """
+    Memisahkan suffix format dari topik, mis. 'iot/waterlevel/msgpack' -> ('iot/waterlevel', 'msgpack').
+    Topik tanpa suffix format dikembalikan utuh dengan format None.
+    """
+    if topic:
+        base, _, suffix = topic.rpartition("/")
+        if base and suffix in FORMATS:
+            return base, suffix
+    return topic, None
+
+
+def split_device_topic(topic, base):
+    """
+    Mengambil device_id dari topik per perangkat, mis. 'iot/waterlevel/SIM-01' dengan
+    base 'iot/waterlevel' -> ('iot/waterlevel', 'SIM-01'). Topik lain dikembalikan utuh dengan None.
+    Suffix format harus sudah dipisahkan dengan split_topic().
+    """
+    if base and topic and topic.startswith(base + "/"):
+        device_id = topic[len(base) + 1:]
+        if device_id and "/" not in device_id:
+            return base, device_id
+    return topic, None
+
+
+def sniff_format(payload):
+    """
+    Menebak format dari byte pertama. Pembacaan selalu berupa map, sehingga:
+      - JSON     : '{' / '[' / whitespace
+      - MessagePack map : 0x80-0x8f (fixmap), 0xde, 0xdf
+      - CBOR map : 0xa0-0xbf (major type 5), atau diawali tag self-describe
+    """
+    if not payload:
+        return FORMAT_JSON
+    first = payload[0]
+    if 0x80 <= first <= 0x8f or first in (0xde, 0xdf):
+        return FORMAT_MSGPACK
+    if 0xa0 <= first <= 0xbf or payload.startswith(CBOR_SELF_DESCRIBE):
+        return FORMAT_CBOR
+    return FORMAT_JSON
+
+
+def _normalize(data):
+    # Timestamp native (ext msgpack / tag CBOR) disamakan dengan format JSON lama: string ISO 8601
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(value, datetime):
+                data[key] = value.isoformat()
+    return data
+
+
+def decode_payload(payload, topic=None):
+    """
+    Mengubah payload MQTT mentah menjadi dict. Format diambil dari suffix topik jika ada,
+    selain itu dari byte pertama payload. Melempar ValueError jika payload tidak bisa di-decode.
+    """
+    fmt = split_topic(topic)[1] or sniff_format(payload)
+    try:
+        if fmt == FORMAT_MSGPACK:
+            return _normalize(msgpack.unpackb(payload, raw=False, timestamp=3))
+        if fmt == FORMAT_CBOR:
+            if cbor2 is None:
+                raise ValueError("payload CBOR diterima tetapi paket cbor2 tidak terpasang")
+            return _normalize(cbor2.loads(payload))
+        return json_codec.loads(payload)
+    except ValueError:
+        raise
+    except Exception as e:
+        # Error msgpack/cbor2 tidak seragam; satukan agar pemanggil cukup menangkap ValueError
+        raise ValueError(f"payload {fmt} tidak valid: {e}") from e
+
+
+def encode_payload(data, fmt=FORMAT_JSON):
+    """Kebalikan decode_payload; dipakai simulator untuk mengirim format yang dipilih."""
+    if fmt == FORMAT_MSGPACK:
+        return msgpack.packb(data, use_bin_type=True)
+    if fmt == FORMAT_CBOR:
+        if cbor2 is None:
+            raise ValueError("paket cbor2 tidak terpasang")
+        return cbor2.dumps(data)
+    if fmt == FORMAT_JSON:
+        return json_codec.dumps(data)
+    raise ValueError(f"Format payload tidak dikenal: {fmt}")
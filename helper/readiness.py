@@ -0,0 +1,91 @@
+"""Probe kesiapan dependensi (Redis, InfluxDB, MQTT) yang berjalan di background."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("Readiness")
+
+
+class ReadinessProbe:
+    """
+    Menjalankan pemeriksaan dependensi secara berkala tanpa memblokir proses utama.
+
+    Setiap check adalah callable tanpa argumen; dianggap sehat jika mengembalikan nilai truthy
+    dan tidak melempar exception. Proses dianggap siap jika semua check yang required sehat.
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._checks = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.started_at = time.time()
+
+    def register(self, name, check, required=True):
+        with self._lock:
+            self._checks[name] = (check, required)
+            self._results[name] = {"ok": False, "required": required, "error": "belum diperiksa",
+                                   "latency_ms": None, "checked_at": None}
+
+    def run_checks(self):
+        """Menjalankan semua check sekali dan mengembalikan status terbaru."""
+        with self._lock:
+            checks = dict(self._checks)
+
+        for name, (check, required) in checks.items():
+            started = time.monotonic()
+            try:
+                ok, error = bool(check()), None
+                if not ok:
+                    error = "check mengembalikan False"
+            except Exception as e:
+                ok, error = False, str(e)
+            result = {
+                "ok": ok,
+                "required": required,
+                "error": error,
+                "latency_ms": round((time.monotonic() - started) * 1000, 2),
+                "checked_at": time.time(),
+            }
+
+            with self._lock:
+                previous = self._results.get(name, {}).get("ok")
+                self._results[name] = result
+            if previous is not ok:
+                if ok:
+                    logger.info(f"✅ (Readiness) {name} siap.")
+                else:
+                    logger.warning(f"⚠️ (Readiness) {name} belum siap: {error}")
+        return self.status()
+
+    def is_ready(self, name=None):
+        with self._lock:
+            if name is not None:
+                return self._results.get(name, {}).get("ok", False)
+            return all(r["ok"] for r in self._results.values() if r["required"])
+
+    def status(self):
+        with self._lock:
+            checks = {name: dict(result) for name, result in self._results.items()}
+        return {
+            "ready": all(r["ok"] for r in checks.values() if r["required"]),
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "checks": checks,
+        }
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            self.run_checks()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="readiness-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
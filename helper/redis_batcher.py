@@ -0,0 +1,146 @@
+"""Micro-batcher untuk publish Redis dari MQTT Worker ke channel dashboard."""
+import logging
+import threading
+import time
+from collections import deque
+
+import redis
+
+from helper import json_codec
+
+logger = logging.getLogger("RedisPublishBatcher")
+
+MODE_ENVELOPE = "envelope"
+MODE_PIPELINE = "pipeline"
+
+BATCH_TYPE = "water_level_batch"
+
+
+def pack_envelope(items):
+    """Membungkus beberapa pembacaan menjadi satu pesan array."""
+    return {"type": BATCH_TYPE, "readings": items}
+
+
+def unpack_envelope(data):
+    """Mengembalikan daftar pembacaan dari pesan Redis (envelope batch atau pesan tunggal lama)."""
+    if isinstance(data, dict) and data.get("type") == BATCH_TYPE:
+        return data.get("readings", [])
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+class RedisPublishBatcher:
+    """
+    Mengumpulkan payload selama max_delay detik atau sampai max_items, lalu mengirimnya
+    dalam satu round trip Redis.
+
+    Mode 'envelope': satu PUBLISH berisi {"type": "water_level_batch", "readings": [...]}.
+    Mode 'pipeline': banyak PUBLISH (satu per pembacaan) dalam satu pipeline; format pesan
+    di channel tetap sama seperti sebelumnya.
+
+    Buffer dibatasi max_pending item (default max_items * 50): saat Redis lambat/mati, item
+    tertua dibuang (dihitung di dropped/dropped_oldest) agar memori worker tidak terus tumbuh.
+    """
+
+    def __init__(self, redis_client, channel, max_items=200, max_delay=0.005, mode=MODE_ENVELOPE,
+                 max_pending=None):
+        if mode not in (MODE_ENVELOPE, MODE_PIPELINE):
+            raise ValueError(f"Mode batch tidak dikenal: {mode}")
+        self.redis_client = redis_client
+        self.channel = channel
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.mode = mode
+        self.max_pending = max_pending or max_items * 50
+
+        self._items = deque(maxlen=self.max_pending)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._stats = {"items": 0, "batches": 0, "dropped": 0, "dropped_oldest": 0, "errors": 0, "max_batch": 0}
+
+    def add(self, payload):
+        with self._cond:
+            if len(self._items) == self.max_pending:
+                # deque(maxlen) membuang item tertua saat append
+                self._stats["dropped"] += 1
+                self._stats["dropped_oldest"] += 1
+            self._items.append(payload)
+            if len(self._items) == 1 or len(self._items) >= self.max_items:
+                self._cond.notify()
+
+    def flush(self):
+        """Mengirim semua item yang terkumpul. Mengembalikan jumlah item yang terkirim."""
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+        sent = 0
+        for start in range(0, len(items), self.max_items):
+            sent += self._publish(items[start:start + self.max_items])
+        return sent
+
+    def _publish(self, items):
+        if not items:
+            return 0
+        try:
+            if self.mode == MODE_ENVELOPE:
+                self.redis_client.publish(self.channel, json_codec.dumps(pack_envelope(items)))
+            else:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for item in items:
+                    pipe.publish(self.channel, json_codec.dumps(item))
+                pipe.execute()
+        except redis.RedisError as e:
+            # Data dashboard bersifat real-time; jika Redis bermasalah batch ini dilewati
+            logger.error(f"❌ Gagal publish batch ({len(items)} item) ke Redis: {e}")
+            with self._cond:
+                self._stats["errors"] += 1
+                self._stats["dropped"] += len(items)
+            return 0
+
+        with self._cond:
+            self._stats["items"] += len(items)
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(items))
+        return len(items)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._items:
+                    self._cond.wait()
+                if not self._running:
+                    break
+                # Tunggu item lain sampai max_delay habis atau batch penuh
+                deadline = time.monotonic() + self.max_delay
+                while self._running and len(self._items) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name="redis-publish-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._items)
+        stats["avg_batch"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
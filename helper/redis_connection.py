@@ -0,0 +1,29 @@
+"""Koneksi Redis bersama per proses; koneksi TCP baru dibuka saat perintah pertama dikirim."""
+import threading
+
+import redis
+
+from config.settings import Config
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Mengembalikan client Redis bersama untuk proses ini.
+    Tidak melakukan ping, sehingga import/boot tidak tertahan jika Redis sedang down.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = redis.Redis(
+                    host=Config.REDIS_HOST,
+                    port=Config.REDIS_PORT,
+                    db=0,
+                    decode_responses=True, # Otomatis decode dari bytes ke string
+                    socket_connect_timeout=Config.REDIS_CONNECT_TIMEOUT,
+                    health_check_interval=30,
+                )
+    return _client
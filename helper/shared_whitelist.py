@@ -0,0 +1,366 @@
+"""Whitelist perangkat bersama antar proses MQTT Worker: set Redis + cache lokal + invalidasi pub/sub."""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+import redis
+
+from helper import json_codec
+
+logger = logging.getLogger("SharedWhitelist")
+
+DEVICES_KEY = "whitelist:devices"     # SET berisi device_id
+META_KEY = "whitelist:meta"           # HASH: version & etag sinkronisasi terakhir ke Laravel
+LEADER_KEY = "whitelist:leader"       # STRING: instance yang berhak refresh dari Laravel
+UPDATES_CHANNEL = "whitelist_updates"  # pub/sub: delta {"origin", "added", "removed"} atau {"full": true}
+
+# Perpanjang lease hanya jika masih dipegang instance ini
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def default_instance_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WhitelistReplica:
+    """
+    Logika replikasi whitelist tanpa I/O, dipakai bersama oleh SharedWhitelist (redis-py) dan
+    AsyncMQTTWorker (redis.asyncio): isi perintah Redis dan pesan pub/sub, keputusan leader,
+    serta penerapan hasil baca Redis ke cache lokal. Pemanggil hanya menjalankan (atau meng-await)
+    perintah Redis-nya.
+
+    :param local: WhitelistSync yang menjadi cache lokal
+    :param shared: False jika instance berjalan mandiri tanpa Redis (selalu leader)
+    """
+
+    def __init__(self, local, instance_id=None, leader_ttl=30, broadcast_limit=1000, shared=True):
+        self.local = local
+        self.instance_id = instance_id or default_instance_id()
+        self.leader_ttl = leader_ttl
+        self.broadcast_limit = broadcast_limit
+        self.shared = shared
+
+        self.is_leader = not shared
+        self._loaded = False
+        self._stats = {"remote_updates": 0, "redis_reloads": 0, "redis_errors": 0, "follower_skips": 0}
+
+    # --- Perintah Redis ---
+    @property
+    def lease_ms(self):
+        return int(self.leader_ttl * 1000)
+
+    def renew_args(self):
+        """Argumen eval() untuk memperpanjang lease leader milik instance ini."""
+        return RENEW_LEASE_SCRIPT, 1, LEADER_KEY, self.instance_id, self.lease_ms
+
+    def release_args(self):
+        """Argumen eval() untuk melepas lease agar instance lain bisa langsung mengambil alih."""
+        return RELEASE_LEASE_SCRIPT, 1, LEADER_KEY, self.instance_id
+
+    def queue_devices(self, pipe, added, removed, publish=True):
+        """Mengantrikan SADD/SREM (dan siaran delta) ke pipeline; execute() dilakukan pemanggil."""
+        if added:
+            pipe.sadd(DEVICES_KEY, *added)
+        if removed:
+            pipe.srem(DEVICES_KEY, *removed)
+        if publish:
+            if len(added) + len(removed) > self.broadcast_limit:
+                message = {"origin": self.instance_id, "full": True}
+            else:
+                message = {"origin": self.instance_id, "added": list(added), "removed": list(removed)}
+            pipe.publish(UPDATES_CHANNEL, json_codec.dumps(message))
+        return pipe
+
+    def meta_mapping(self):
+        """Cursor sinkronisasi Laravel untuk disimpan di META_KEY."""
+        return {"version": json_codec.dumps_str(self.local.version), "etag": self.local.etag or ""}
+
+    def redis_failed(self, action, error):
+        self._stats["redis_errors"] += 1
+        logger.warning(f"⚠️ Gagal {action}: {error}")
+
+    # --- Penerapan hasil Redis ke cache lokal ---
+    def apply_members(self, members):
+        """Mengganti cache lokal dengan isi set Redis (SMEMBERS DEVICES_KEY)."""
+        self._loaded = True
+        self._stats["redis_reloads"] += 1
+        changed = self.local.replace(members, notify=False)
+        logger.info(f"✅ Whitelist dimuat dari Redis. Total perangkat: {len(self.local)}")
+        return changed
+
+    def apply_update(self, raw):
+        """
+        Menerapkan pesan UPDATES_CHANNEL dari proses lain. Mengembalikan True jika pemanggil
+        harus memuat ulang set Redis. ValueError jika pesan tidak valid.
+        """
+        data = json_codec.loads(raw)
+        if data.get("origin") == self.instance_id:
+            return False
+        self._stats["remote_updates"] += 1
+        if data.get("full"):
+            return True
+        self.local.apply_delta(data.get("added") or [], data.get("removed") or [], notify=False)
+        return False
+
+    def apply_lookup(self, device_id, found):
+        """Hasil SISMEMBER read-through: ID yang ditemukan langsung masuk cache lokal."""
+        if found:
+            self.local.apply_delta(added=(device_id,), notify=False)
+        return bool(found)
+
+    def apply_meta(self, meta):
+        if meta.get("version"):
+            self.local.version = json_codec.loads(meta["version"])
+        self.local.etag = meta.get("etag") or None
+
+    def invalidate_local(self, added, removed):
+        """
+        Push dari backend diterapkan lokal di setiap proses. Mengembalikan True jika instance ini
+        (leader) juga harus menulis delta ke set Redis.
+        """
+        self.local.apply_delta(added, removed, notify=False)
+        return self.shared and self.is_leader and bool(added or removed)
+
+    # --- Keputusan leader & sinkronisasi ---
+    def elected(self, leader):
+        """
+        Mencatat hasil pemilihan. Mengembalikan True jika instance baru saja menjadi leader,
+        sehingga pemanggil perlu memuat cursor (META_KEY) dan membangunkan refresh.
+        """
+        was_leader = self.is_leader
+        self.is_leader = leader
+        if leader and not was_leader:
+            logger.info(f"👑 Instance {self.instance_id} menjadi leader refresh whitelist.")
+            return True
+        if was_leader and not leader:
+            logger.info(f"Instance {self.instance_id} bukan lagi leader refresh whitelist.")
+        return False
+
+    def election_failed(self, error):
+        """Tanpa Redis tidak ada koordinasi; setiap instance sinkron sendiri sampai Redis kembali."""
+        self._stats["redis_errors"] += 1
+        if self.is_leader is False:
+            logger.warning(f"⚠️ Redis tidak tersedia untuk pemilihan leader whitelist ({error}), berjalan mandiri.")
+        return self.elected(True)
+
+    @property
+    def needs_reload(self):
+        """True jika set Redis belum pernah dimuat (cursor META_KEY hanya berlaku untuk isinya)."""
+        return self.shared and not self._loaded
+
+    def follower_skipped(self):
+        self._stats["follower_skips"] += 1
+
+    def get_stats(self):
+        stats = self.local.get_stats()
+        stats.update(self._stats)
+        stats.update({"leader": self.is_leader, "instance_id": self.instance_id, "shared": self.shared})
+        return stats
+
+
+class SharedWhitelist(WhitelistReplica):
+    """
+    Satu tampilan whitelist untuk N proses worker.
+
+    - Cek keanggotaan (`device_id in whitelist`) tetap di memori proses, O(1), tanpa I/O
+      (didelegasikan ke WhitelistSync yang menukar frozenset secara atomik).
+    - Set Redis DEVICES_KEY adalah sumber bersama; setiap perubahan lokal (registrasi via MQTT,
+      hasil sinkronisasi) ditulis ke sana dan disiarkan di UPDATES_CHANNEL.
+    - Hanya leader (lease SET NX PX di LEADER_KEY) yang sinkronisasi ke Laravel; cursor
+      version/etag disimpan di META_KEY agar leader pengganti tetap inkremental.
+    - Jika redis_client None (atau Redis tidak bisa dihubungi), instance berjalan mandiri
+      seperti WhitelistSync biasa.
+    """
+
+    def __init__(self, redis_client, sync, instance_id=None, leader_ttl=30, broadcast_limit=1000):
+        super().__init__(sync, instance_id=instance_id, leader_ttl=leader_ttl, broadcast_limit=broadcast_limit,
+                         shared=redis_client is not None)
+        self.redis = redis_client
+        self.local.on_change = self._propagate
+        self._running = False
+        self._threads = []
+
+    # --- Akses set (hot path, tanpa I/O) ---
+    def __contains__(self, device_id):
+        return device_id in self.local
+
+    def __len__(self):
+        return len(self.local)
+
+    def __iter__(self):
+        return iter(self.local)
+
+    @property
+    def devices(self):
+        return self.local.devices
+
+    def add(self, device_id):
+        return self.local.add(device_id)
+
+    def discard(self, device_id):
+        return self.local.discard(device_id)
+
+    def lookup_remote(self, device_id):
+        """
+        Read-through ke set Redis untuk ID yang tidak ada di cache lokal (mis. baru terdaftar
+        di proses lain dan siaran pub/sub belum sampai). Dipanggil jarang: hasil negatif
+        di-cache oleh pemanggil.
+        """
+        if self.redis is None:
+            return False
+        try:
+            found = self.redis.sismember(DEVICES_KEY, device_id)
+        except redis.RedisError as e:
+            self.redis_failed("mengecek whitelist di Redis", e)
+            return False
+        return self.apply_lookup(device_id, found)
+
+    # --- Replikasi ke Redis ---
+    def _propagate(self, added, removed):
+        """on_change WhitelistSync: tulis delta ke set Redis lalu siarkan ke proses lain."""
+        if self.redis is None:
+            return
+        try:
+            self.queue_devices(self.redis.pipeline(transaction=True), added, removed).execute()
+        except redis.RedisError as e:
+            self.redis_failed("menyimpan perubahan whitelist ke Redis", e)
+
+    def _reload_from_redis(self):
+        try:
+            members = self.redis.smembers(DEVICES_KEY)
+        except redis.RedisError as e:
+            self.redis_failed("membaca whitelist dari Redis", e)
+            return False
+        return self.apply_members(members)
+
+    def _handle_update(self, raw):
+        if self.apply_update(raw):
+            self._reload_from_redis()
+
+    def _listen_loop(self):
+        backoff = 1
+        while self._running:
+            try:
+                pubsub = self.redis.pubsub()
+                pubsub.subscribe(UPDATES_CHANNEL)
+                # Muat ulang setelah (re)subscribe agar perubahan selama terputus tidak terlewat
+                self._reload_from_redis()
+                backoff = 1
+                for message in pubsub.listen():
+                    if not self._running:
+                        break
+                    if message["type"] == "message":
+                        try:
+                            self._handle_update(message["data"])
+                        except ValueError as e:
+                            logger.error(f"Pesan whitelist tidak valid: {e}")
+            except redis.RedisError as e:
+                logger.warning(f"⚠️ Listener whitelist terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    # --- Leader election ---
+    def _elect(self):
+        if self.redis is None:
+            return True
+        try:
+            leader = bool(self.redis.set(LEADER_KEY, self.instance_id, nx=True, px=self.lease_ms)) or \
+                bool(self.redis.eval(*self.renew_args()))
+        except redis.RedisError as e:
+            if self.election_failed(e):
+                self.local.wake()
+            return True
+
+        if self.elected(leader):
+            self._load_meta()
+            self.local.wake()
+        return leader
+
+    def _election_loop(self):
+        while self._running:
+            self._elect()
+            time.sleep(self.leader_ttl / 3)
+
+    def _load_meta(self):
+        try:
+            self.apply_meta(self.redis.hgetall(META_KEY))
+        except redis.RedisError:
+            return
+
+    def _save_meta(self):
+        if self.redis is None:
+            return
+        try:
+            self.redis.hset(META_KEY, mapping=self.meta_mapping())
+        except redis.RedisError as e:
+            self.redis_failed("menyimpan cursor whitelist ke Redis", e)
+
+    # --- API yang dipakai worker ---
+    def sync(self):
+        """Leader sinkron ke Laravel; follower cukup memuat set Redis sekali (sisanya via pub/sub)."""
+        if self._elect():
+            if self.needs_reload:
+                # Cursor di META_KEY hanya berlaku untuk isi set Redis; muat dulu sebelum delta
+                self._reload_from_redis()
+            changed = self.local.sync()
+            self._save_meta()
+            return changed
+        self.follower_skipped()
+        if self.needs_reload:
+            return self._reload_from_redis()
+        return False
+
+    def invalidate(self, added=(), removed=()):
+        """
+        Push dari backend (diterima setiap proses lewat channel perintah): delta diterapkan
+        lokal di semua proses, tetapi hanya leader yang menulisnya ke Redis dan sinkron ulang.
+        """
+        if self.invalidate_local(added, removed):
+            try:
+                self.queue_devices(self.redis.pipeline(transaction=True), added, removed, publish=False).execute()
+            except redis.RedisError as e:
+                self.redis_failed("menyimpan invalidasi whitelist ke Redis", e)
+        self.local.invalidate()
+
+    def wait(self):
+        return self.local.wait()
+
+    def wake(self):
+        self.local.wake()
+
+    def start(self):
+        if self.redis is None or self._running:
+            return
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._listen_loop, name="whitelist-listener", daemon=True),
+            threading.Thread(target=self._election_loop, name="whitelist-election", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self.local.wake()
+        if self.redis is not None and self.is_leader:
+            try:
+                # Lepaskan lease agar instance lain bisa langsung mengambil alih
+                self.redis.eval(*self.release_args())
+            except redis.RedisError:
+                pass
+        self.is_leader = self.redis is None
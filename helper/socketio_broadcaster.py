@@ -0,0 +1,142 @@
+"""Broadcaster Socket.IO dengan conflation per perangkat dan batas frame rate."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("ConflatingBroadcaster")
+
+
+class ConflatingBroadcaster:
+    """
+    Menyimpan hanya pembacaan terbaru per perangkat dan meng-emit semuanya sekaligus
+    rate_hz kali per detik. Pembacaan yang tertimpa sebelum sempat di-emit dihitung
+    sebagai dropped_intermediate. Latensi maksimum satu pembacaan kira-kira 1/rate_hz detik.
+
+    :param emit: Callable emit(event, data), mis. socketio.emit
+    :param rate_hz: Frekuensi emit (frame per detik)
+    :param combined: False (default) = satu event per perangkat (format lama, tetap di-conflate);
+                     True = satu event batch berisi semua perangkat (opt-in untuk dashboard baru)
+    :param batch_event: Nama event untuk mode combined
+    :param event: Nama event per perangkat
+    :param router: Callable router(readings) -> {room: [reading, ...]}, mis.
+                   DeviceSubscriptionIndex.route. Jika diisi, setiap room hanya menerima
+                   pembacaan perangkat yang dilanggannya; jika None, frame disiarkan ke semua klien.
+    """
+
+    def __init__(self, emit, rate_hz=4.0, combined=False, batch_event="water_level_batch",
+                 event="water_level_update", key_field="device_id", router=None):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz harus lebih dari 0")
+        self.emit = emit
+        self.interval = 1.0 / rate_hz
+        self.combined = combined
+        self.batch_event = batch_event
+        self.event = event
+        self.key_field = key_field
+        self.router = router
+
+        self._latest = {}
+        self._first_seen = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {
+            "received": 0,
+            "emitted_readings": 0,
+            "frames": 0,
+            "dropped_intermediate": 0,
+            "emit_errors": 0,
+            "room_emits": 0,
+            "last_frame_latency_ms": 0.0,
+            "max_frame_latency_ms": 0.0,
+        }
+
+    def _key(self, reading):
+        if isinstance(reading, dict):
+            return reading.get(self.key_field) or reading.get("sensor_id")
+        return None
+
+    def publish(self, reading):
+        """Mencatat pembacaan terbaru; pembacaan lama perangkat yang sama ditimpa."""
+        key = self._key(reading)
+        with self._lock:
+            self._stats["received"] += 1
+            if key is None:
+                # Tanpa ID perangkat tidak bisa di-conflate; simpan dengan kunci unik
+                key = ("_anon", self._stats["received"])
+            elif key in self._latest:
+                self._stats["dropped_intermediate"] += 1
+            if not self._latest:
+                self._first_seen = time.monotonic()
+            self._latest[key] = reading
+
+    def flush(self):
+        """Meng-emit frame berisi semua pembacaan terbaru. Mengembalikan jumlah pembacaan."""
+        with self._lock:
+            if not self._latest:
+                return 0
+            readings = list(self._latest.values())
+            first_seen = self._first_seen
+            self._latest = {}
+            self._first_seen = None
+
+        room_emits = 0
+        try:
+            if self.router is None:
+                self._emit_frame(readings)
+                delivered = len(readings)
+            else:
+                # Pembacaan tanpa subscriber tidak di-emit sama sekali
+                delivered = 0
+                for room, room_readings in self.router(readings).items():
+                    self._emit_frame(room_readings, to=room)
+                    delivered += len(room_readings)
+                    room_emits += 1
+        except Exception as e:
+            logger.error(f"❌ Gagal emit frame Socket.IO: {e}")
+            with self._lock:
+                self._stats["emit_errors"] += 1
+            return 0
+
+        latency_ms = (time.monotonic() - first_seen) * 1000
+        with self._lock:
+            self._stats["frames"] += 1
+            self._stats["emitted_readings"] += delivered
+            self._stats["room_emits"] += room_emits
+            self._stats["last_frame_latency_ms"] = round(latency_ms, 2)
+            self._stats["max_frame_latency_ms"] = round(max(self._stats["max_frame_latency_ms"], latency_ms), 2)
+        return len(readings)
+
+    def _emit_frame(self, readings, **kwargs):
+        if self.combined:
+            self.emit(self.batch_event, {"readings": readings, "count": len(readings)}, **kwargs)
+        else:
+            for reading in readings:
+                self.emit(self.event, reading, **kwargs)
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="socketio-broadcaster", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Broadcaster Socket.IO berjalan ({1 / self.interval:g} Hz, "
+                    f"mode={'combined' if self.combined else 'per-device'}).")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_devices"] = len(self._latest)
+        stats["rate_hz"] = round(1 / self.interval, 3)
+        return stats
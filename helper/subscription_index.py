@@ -0,0 +1,152 @@
+"""Indeks langganan Socket.IO per perangkat / grup perangkat untuk routing update water level."""
+import threading
+
+ALL_DEVICES_ROOM = "all_devices"
+
+
+def device_room(device_id):
+    return f"device:{device_id}"
+
+
+def group_room(group):
+    return f"group:{group}"
+
+
+class DeviceSubscriptionIndex:
+    """
+    Mencatat room mana yang punya subscriber dan menyimpan reverse index perangkat -> room,
+    sehingga routing satu pembacaan hanya menyentuh room yang benar-benar didengarkan.
+
+    Room yang dipakai:
+      - device:<device_id>  : klien yang memantau satu sensor
+      - group:<nama>        : klien yang memantau grup sensor (anggota dari SET Redis device:group:*)
+      - all_devices         : klien lama yang menerima seluruh armada
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._room_members = {}    # room -> set(sid)
+        self._client_rooms = {}    # sid -> set(room)
+        self._device_groups = {}   # device_id -> set(group)
+        self._group_devices = {}   # group -> set(device_id)
+        self._routes = {}          # cache: device_id -> tuple(room aktif)
+
+    # --- Langganan klien ---
+    def _join(self, sid, room):
+        members = self._room_members.setdefault(room, set())
+        if sid in members:
+            return False
+        members.add(sid)
+        self._client_rooms.setdefault(sid, set()).add(room)
+        return True
+
+    def _leave(self, sid, room):
+        members = self._room_members.get(room)
+        if not members or sid not in members:
+            return False
+        members.discard(sid)
+        if not members:
+            del self._room_members[room]
+        rooms = self._client_rooms.get(sid)
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._client_rooms[sid]
+        return True
+
+    def subscribe(self, sid, device_ids=(), groups=(), all_devices=False):
+        """Mendaftarkan klien ke room; mengembalikan daftar room yang baru di-join."""
+        rooms = [device_room(d) for d in device_ids] + [group_room(g) for g in groups]
+        if all_devices:
+            rooms.append(ALL_DEVICES_ROOM)
+        with self._lock:
+            joined = [room for room in rooms if self._join(sid, room)]
+            if joined:
+                self._routes.clear()
+        return joined
+
+    def unsubscribe(self, sid, device_ids=(), groups=(), all_devices=False):
+        """Mengeluarkan klien dari room; mengembalikan daftar room yang ditinggalkan."""
+        rooms = [device_room(d) for d in device_ids] + [group_room(g) for g in groups]
+        if all_devices:
+            rooms.append(ALL_DEVICES_ROOM)
+        with self._lock:
+            left = [room for room in rooms if self._leave(sid, room)]
+            if left:
+                self._routes.clear()
+        return left
+
+    def remove_client(self, sid):
+        """Dipanggil saat klien disconnect."""
+        with self._lock:
+            rooms = list(self._client_rooms.get(sid, ()))
+            for room in rooms:
+                self._leave(sid, room)
+            if rooms:
+                self._routes.clear()
+        return rooms
+
+    def client_rooms(self, sid):
+        with self._lock:
+            return set(self._client_rooms.get(sid, ()))
+
+    # --- Grup perangkat ---
+    def set_group(self, group, device_ids):
+        """Mengganti seluruh anggota grup."""
+        device_ids = set(device_ids)
+        with self._lock:
+            for device_id in self._group_devices.get(group, set()) - device_ids:
+                groups = self._device_groups.get(device_id)
+                if groups:
+                    groups.discard(group)
+                    if not groups:
+                        del self._device_groups[device_id]
+            for device_id in device_ids:
+                self._device_groups.setdefault(device_id, set()).add(group)
+            if device_ids:
+                self._group_devices[group] = device_ids
+            else:
+                self._group_devices.pop(group, None)
+            self._routes.clear()
+
+    def load_groups(self, groups):
+        """Mengganti seluruh grup sekaligus ({nama: device_ids}), mis. saat memuat ulang dari Redis."""
+        for group in set(self.groups()) - set(groups):
+            self.set_group(group, ())
+        for group, device_ids in groups.items():
+            self.set_group(group, device_ids)
+
+    def groups(self):
+        with self._lock:
+            return {group: sorted(devices) for group, devices in self._group_devices.items()}
+
+    # --- Routing ---
+    def rooms_for(self, device_id):
+        """Room yang punya subscriber untuk perangkat ini (di-cache sampai langganan berubah)."""
+        with self._lock:
+            rooms = self._routes.get(device_id)
+            if rooms is None:
+                candidates = [device_room(device_id), ALL_DEVICES_ROOM]
+                candidates += [group_room(g) for g in self._device_groups.get(device_id, ())]
+                rooms = tuple(room for room in candidates if room in self._room_members)
+                self._routes[device_id] = rooms
+            return rooms
+
+    def route(self, readings, key_field="device_id"):
+        """Mengelompokkan pembacaan per room tujuan: {room: [reading, ...]}."""
+        routed = {}
+        for reading in readings:
+            device_id = reading.get(key_field) or reading.get("sensor_id")
+            for room in self.rooms_for(device_id):
+                routed.setdefault(room, []).append(reading)
+        return routed
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._client_rooms),
+                "rooms": len(self._room_members),
+                "subscriptions": sum(len(m) for m in self._room_members.values()),
+                "all_devices_subscribers": len(self._room_members.get(ALL_DEVICES_ROOM, ())),
+                "groups": len(self._group_devices),
+            }
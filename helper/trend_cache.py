@@ -0,0 +1,154 @@
+"""Cache hasil agregasi tren water level per jendela waktu (aggregateWindow) untuk /api/waterlevel/trend."""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+_DURATION = re.compile(r"^(\d+)(s|m|h|d|w)$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(value):
+    """'15m' / '1h' / '7d' -> detik; ValueError jika format tidak dikenal."""
+    match = _DURATION.match(str(value).strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Durasi tidak valid: {value}")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+def parse_time(value, now):
+    """
+    Waktu request -> epoch detik. Mendukung 'now', durasi relatif Flux ('-7d', '-12h') dan
+    RFC3339 ('2024-05-01T00:00:00Z').
+    """
+    value = str(value).strip()
+    if value in ("now", "now()"):
+        return now
+    if value.startswith("-"):
+        return now - parse_duration(value[1:])
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        raise ValueError(f"Waktu harus menyertakan zona waktu: {value}")
+    return parsed.timestamp()
+
+
+def align(ts, window):
+    return math.floor(ts / window) * window
+
+
+class TrendCache:
+    """
+    Nilai agregat (mean) per jendela: kunci (sensor_id, window, awal jendela). Jendela yang
+    seluruhnya berada di dalam rentang request memakai kunci yang sama untuk semua request, sehingga
+    '-7d' dari banyak dashboard berbagi entri meskipun start-nya berbeda beberapa detik.
+
+    Jendela yang sudah tertutup (akhir jendela + settle detik sudah lewat, memberi waktu data
+    dari batch writer/spool masuk) disimpan sebagai entri immutable dengan TTL panjang. Jendela
+    yang masih terbuka dan jendela tepi yang terpotong oleh start/stop tidak pernah di-cache; keduanya
+    dihitung ulang dengan batas persis setiap request. Jendela yang belum ada di cache diambil
+    dengan satu query per rangkaian jendela berurutan.
+
+    Memori dibatasi max_entries; entri paling lama tidak dipakai dibuang lebih dulu (LRU).
+
+    :param fetch: fetch(sensor_id, start, stop, window) -> {awal jendela (epoch detik): mean}
+    """
+
+    def __init__(self, fetch, max_entries=200000, ttl=86400, settle=120, clock=time.time):
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.settle = settle
+        self.clock = clock
+
+        self._entries = OrderedDict()  # (sensor_id, window, awal jendela) -> (mean atau None, kedaluwarsa)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "open_windows": 0, "queries": 0, "evictions": 0, "expired": 0}
+
+    def _lookup(self, keys, now):
+        """Mengembalikan (nilai yang ada di cache, kunci yang harus diambil)."""
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self._stats["expired"] += 1
+                    entry = None
+                if entry is None:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[0]
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(missing)
+        return found, missing
+
+    def _store(self, values, now):
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (value, now + self.ttl)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _fetch_runs(self, sensor_id, start, stop, windows, window):
+        """
+        Mengambil jendela yang berurutan dengan satu query per rangkaian, dibatasi ke [start, stop)
+        agar jendela tepi yang terpotong hanya merata-ratakan data di dalam rentang request.
+        """
+        values = {}
+        runs = []
+        for w in windows:
+            if runs and runs[-1][1] == w:
+                runs[-1][1] = w + window
+            else:
+                runs.append([w, w + window])
+        for run_start, run_stop in runs:
+            with self._lock:
+                self._stats["queries"] += 1
+            fetched = self.fetch(sensor_id, max(start, run_start), min(stop, run_stop), window)
+            # Jendela pertama yang terpotong dilaporkan dengan awal = start; dikembalikan ke batas jendela
+            values.update({align(key, window): value for key, value in fetched.items()})
+        return values
+
+    def series(self, sensor_id, start, stop, window=3600):
+        """Daftar (awal jendela, mean) untuk jendela yang berisi data, terurut, dalam rentang [start, stop)."""
+        now = self.clock()
+        first = align(start, window)
+        end = math.ceil(min(stop, now) / window) * window
+        windows = range(int(first), int(end), window)
+        # Hanya jendela yang tertutup dan seluruhnya berada di dalam [start, stop) yang di-cache;
+        # jendela tepi yang terpotong dan jendela terbuka selalu diambil dengan batas persis
+        cacheable, uncached = [], []
+        for w in windows:
+            full = w >= start and w + window <= stop and w + window + self.settle <= now
+            (cacheable if full else uncached).append(w)
+
+        found, missing = self._lookup([(sensor_id, window, w) for w in cacheable], now)
+        to_fetch = sorted([key[2] for key in missing] + uncached)
+        if to_fetch:
+            with self._lock:
+                self._stats["open_windows"] += len(uncached)
+            fetched = self._fetch_runs(sensor_id, start, stop, to_fetch, window)
+            # Jendela tertutup tanpa data juga di-cache (None) agar tidak ditanyakan ulang
+            self._store({key: fetched.get(key[2]) for key in missing}, now)
+            found.update({(sensor_id, window, w): fetched.get(w) for w in to_fetch})
+
+        return [(w, found[(sensor_id, window, w)]) for w in windows
+                if found.get((sensor_id, window, w)) is not None]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        return stats
@@ -1,4 +1,5 @@
 from influxdb.connection import write_data
+from influxdb.line_protocol import get_encoder, datetime_to_ns
 from influxdb_client import Point
 from datetime import datetime
 from typing import Dict, Any, Optional, Tuple
@@ -34,13 +35,13 @@ def write_sensor_data(
     :return: Tuple of (success: bool, result: str, error: str)
     """
     try:
-        point = create_point(
-            measurement=measurement,
-            tags={"device_id": device_id},
-            fields=sensor_data,
-            timestamp=timestamp
+        # Encoder cepat menghasilkan line protocol yang sama dengan create_point(...).to_line_protocol()
+        line_protocol = get_encoder(measurement).encode(
+            device_id,
+            sensor_data,
+            datetime_to_ns(timestamp or datetime.utcnow())
         )
-        write_data(point)
+        write_data(line_protocol)
         return True, "Data successfully written", None
     except Exception as e:
         return False, None, str(e)
@@ -0,0 +1,187 @@
+"""Sinkronisasi whitelist perangkat secara inkremental (ETag / cursor versi) dari backend Laravel."""
+import logging
+import threading
+
+import requests
+
+logger = logging.getLogger("WhitelistSync")
+
+
+class WhitelistSync:
+    """
+    Whitelist perangkat yang disinkronkan dengan request kondisional.
+
+    Protokol ke backend (GET url):
+      - Header If-None-Match berisi ETag terakhir, parameter since=<version> jika versi diketahui.
+      - 304                                      : tidak ada perubahan
+      - 200 {"version", "added", "removed"}      : delta, diterapkan ke set yang ada
+      - 200 {"version", "device_ids"}            : daftar lengkap (backend lama tetap didukung)
+      - 410                                      : cursor kedaluwarsa, diulang sebagai full reload
+
+    Set perangkat tidak pernah diubah di tempat: perubahan dibuat pada salinan lalu referensinya
+    ditukar, sehingga `device_id in whitelist` dari thread lain tidak perlu lock dan tidak pernah
+    melihat delta setengah jadi.
+
+    Interval refresh adaptif: kembali ke min_interval setiap ada perubahan, dan berlipat dua
+    (sampai max_interval) selama tidak ada perubahan atau backend gagal. invalidate() dipakai
+    untuk jalur push (mis. pesan Redis) agar perubahan langsung berlaku.
+    """
+
+    def __init__(self, url, min_interval=30, max_interval=3600, timeout=10, session=None, on_change=None):
+        self.url = url
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.timeout = timeout
+        self.session = session
+        # on_change(added, removed) dipanggil setelah pertukaran, mis. untuk meneruskan ke Redis
+        self.on_change = on_change
+
+        self._devices = frozenset()
+        self._lock = threading.Lock()   # hanya untuk writer; reader cukup membaca referensi
+        self._wake = threading.Event()
+        self.etag = None
+        self.version = None
+        self.interval = min_interval
+        self._stats = {"syncs": 0, "not_modified": 0, "deltas": 0, "full_reloads": 0,
+                       "errors": 0, "pushes": 0}
+
+    # --- Akses set (tanpa lock) ---
+    def __contains__(self, device_id):
+        return device_id in self._devices
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    @property
+    def devices(self):
+        return self._devices
+
+    # --- Perubahan lokal ---
+    def _swap(self, build, notify):
+        # build(previous) -> set baru; dihitung dan ditukar di bawah lock yang sama
+        with self._lock:
+            previous = self._devices
+            current = self._devices = frozenset(build(previous))
+        added, removed = current - previous, previous - current
+        if notify and self.on_change and (added or removed):
+            self.on_change(added, removed)
+        return bool(added or removed)
+
+    def apply_delta(self, added=(), removed=(), notify=True):
+        """Menerapkan penambahan/penghapusan sebagai satu pertukaran atomik."""
+        added, removed = set(added), set(removed)
+        return self._swap(lambda previous: (previous | added) - removed, notify)
+
+    def replace(self, device_ids, notify=True):
+        return self._swap(lambda previous: device_ids, notify)
+
+    def add(self, device_id):
+        return self.apply_delta(added=(device_id,))
+
+    def discard(self, device_id):
+        return self.apply_delta(removed=(device_id,))
+
+    # --- Sinkronisasi dengan backend ---
+    def _get(self, headers, params):
+        http = self.session or requests
+        return http.get(self.url, headers=headers, params=params, timeout=self.timeout)
+
+    def sync(self):
+        """Satu kali sinkronisasi kondisional. Mengembalikan True jika whitelist berubah."""
+        headers, params = self.request_args()
+        try:
+            response = self._get(headers, params)
+            if self.cursor_expired(response, params):
+                response = self._get({}, {})
+        except requests.RequestException as e:
+            return self.sync_failed(e)
+        return self.apply_response(response)
+
+    # Langkah-langkah sync() dipisah agar engine asyncio bisa memakai client HTTP async
+    def request_args(self):
+        """Header dan parameter request kondisional berikutnya."""
+        self._stats["syncs"] += 1
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        params = {"since": self.version} if self.version is not None else {}
+        return headers, params
+
+    def cursor_expired(self, response, params):
+        """True jika backend menolak cursor (410); cursor dihapus dan request harus diulang tanpa parameter."""
+        if response.status_code == 410 and params:
+            logger.info("Cursor whitelist kedaluwarsa, memuat ulang daftar lengkap...")
+            self.etag = self.version = None
+            return True
+        return False
+
+    def sync_failed(self, error):
+        logger.error(f"❌ Error saat sinkronisasi whitelist: {error}")
+        self._stats["errors"] += 1
+        self._adapt(changed=False)
+        return False
+
+    def apply_response(self, response):
+        """Menerapkan respons backend (304 / delta / daftar lengkap). Mengembalikan True jika berubah."""
+        if response.status_code == 304:
+            self._stats["not_modified"] += 1
+            self._adapt(changed=False)
+            return False
+        if response.status_code != 200:
+            logger.error(f"❌ Gagal sinkronisasi whitelist. Status: {response.status_code}")
+            self._stats["errors"] += 1
+            self._adapt(changed=False)
+            return False
+        try:
+            data = response.json()
+        except ValueError as e:
+            return self.sync_failed(e)
+
+        if "device_ids" in data:
+            changed = self.replace(data.get("device_ids") or [])
+            self._stats["full_reloads"] += 1
+            logger.info(f"✅ Whitelist dimuat lengkap. Total perangkat: {len(self)}")
+        else:
+            added, removed = data.get("added") or [], data.get("removed") or []
+            changed = self.apply_delta(added, removed)
+            self._stats["deltas"] += 1
+            if changed:
+                logger.info(f"✅ Delta whitelist: +{len(added)} / -{len(removed)}. Total perangkat: {len(self)}")
+
+        self.etag = response.headers.get("ETag") or None
+        self.version = data.get("version", self.version)
+        self._adapt(changed)
+        return changed
+
+    def _adapt(self, changed):
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+    # --- Jalur push & penjadwalan ---
+    def invalidate(self, added=(), removed=()):
+        """
+        Jalur push: terapkan delta yang dibawa notifikasi (jika ada) dan bangunkan loop
+        refresh agar segera sinkron dengan backend.
+        """
+        self._stats["pushes"] += 1
+        if added or removed:
+            self.apply_delta(added, removed)
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def wait(self):
+        """Menunggu sampai jadwal refresh berikutnya atau sampai invalidate()/wake() dipanggil."""
+        woken = self._wake.wait(self.interval)
+        self._wake.clear()
+        return woken
+
+    def wake(self):
+        self._wake.set()
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats.update({"devices": len(self), "version": self.version, "interval": self.interval})
+        return stats
@@ -0,0 +1,347 @@
+import gzip
+import logging
+import random
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger("InfluxDBBatchWriter")
+
+# Status HTTP yang layak dicoba ulang (server sibuk / sementara tidak tersedia)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class BatchWriter:
+    """
+    Menampung record line protocol dan mengirimnya ke InfluxDB (HTTP /api/v2/write) secara batch.
+
+    Batch di-flush ketika salah satu batas tercapai: max_batch_size record, max_bytes byte,
+    atau record tertua sudah menunggu selama linger detik. Pemanggil write() tidak pernah
+    menunggu round trip HTTP; jika buffer penuh, write() mengembalikan False (backpressure).
+
+    :param url: URL InfluxDB, mis. http://localhost:8086
+    :param token: Token InfluxDB
+    :param org: Organisasi InfluxDB
+    :param bucket: Bucket tujuan
+    :param max_batch_size: Jumlah record maksimum per request
+    :param max_bytes: Ukuran body (sebelum kompresi) maksimum per request
+    :param linger: Waktu tunggu maksimum (detik) sebelum batch yang belum penuh dikirim
+    :param max_buffer_points: Kapasitas buffer; di atas ini write() ditolak
+    :param max_retries: Jumlah percobaan ulang untuk error sementara
+    :param backoff_base: Dasar backoff eksponensial (detik)
+    :param backoff_max: Batas atas backoff (detik)
+    :param use_gzip: Kompres body dengan gzip
+    :param spool: DiskSpool opsional; batch yang gagal (dan semua batch selama InfluxDB tidak sehat)
+                  ditulis ke disk lalu di-replay di background saat InfluxDB pulih
+    :param replay_rate: Laju replay maksimum (record per detik)
+    :param probe_interval: Jeda (detik) antar percobaan replay saat InfluxDB masih tidak sehat
+    """
+
+    def __init__(self, url, token, org, bucket, max_batch_size=5000, max_bytes=1024 * 1024, linger=1.0,
+                 max_buffer_points=100000, max_retries=3, backoff_base=0.5, backoff_max=10.0,
+                 use_gzip=True, timeout=10, session=None, spool=None, replay_rate=5000,
+                 probe_interval=5.0):
+        self.write_url = f"{str(url).rstrip('/')}/api/v2/write"
+        self.ping_url = f"{str(url).rstrip('/')}/ping"
+        self.params = {"org": org, "bucket": bucket, "precision": "ns"}
+        self.headers = {"Authorization": f"Token {token}", "Content-Type": "text/plain; charset=utf-8"}
+        if use_gzip:
+            self.headers["Content-Encoding"] = "gzip"
+
+        self.max_batch_size = max_batch_size
+        self.max_bytes = max_bytes
+        self.linger = linger
+        self.max_buffer_points = max_buffer_points
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.use_gzip = use_gzip
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.spool = spool
+        self.replay_rate = replay_rate
+        self.probe_interval = probe_interval
+
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._replay_thread = None
+        self._replay_stop = threading.Event()
+        self._healthy = True
+        self._stats = {
+            "points_received": 0,
+            "points_written": 0,
+            "points_dropped": 0,
+            "points_spooled": 0,
+            "points_replayed": 0,
+            "batches_written": 0,
+            "batches_failed": 0,
+            "retries": 0,
+            "last_batch_size": 0,
+            "max_batch_size_seen": 0,
+            "last_flush_latency_ms": 0.0,
+            "max_flush_latency_ms": 0.0,
+            "total_flush_latency_ms": 0.0,
+        }
+
+    # --- Producer ---
+    def write(self, line):
+        """
+        Menambahkan satu record line protocol (str atau bytes) ke buffer.
+        Mengembalikan False jika buffer penuh dan record dibuang.
+        """
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer_points:
+                self._stats["points_dropped"] += 1
+                return False
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(line)
+            self._buffer_bytes += len(line) + 1
+            self._stats["points_received"] += 1
+            if len(self._buffer) >= self.max_batch_size or self._buffer_bytes >= self.max_bytes:
+                self._cond.notify()
+        return True
+
+    @property
+    def is_backpressured(self):
+        """True jika buffer sudah mencapai kapasitas sehingga write() akan ditolak."""
+        with self._cond:
+            return len(self._buffer) >= self.max_buffer_points
+
+    # --- Flush ---
+    def _take_batch(self):
+        """Mengambil satu batch dari depan buffer sesuai batas jumlah dan ukuran. Harus di bawah lock."""
+        count, size = 0, 0
+        for line in self._buffer:
+            if count >= self.max_batch_size or (count and size + len(line) + 1 > self.max_bytes):
+                break
+            count += 1
+            size += len(line) + 1
+
+        batch = self._buffer[:count]
+        del self._buffer[:count]
+        self._buffer_bytes -= size
+        self._oldest = time.monotonic() if self._buffer else None
+        return batch
+
+    def _batch_ready(self):
+        if not self._buffer:
+            return False
+        if len(self._buffer) >= self.max_batch_size or self._buffer_bytes >= self.max_bytes:
+            return True
+        return time.monotonic() - self._oldest >= self.linger
+
+    def flush(self):
+        """Mengirim seluruh isi buffer secara sinkron (dipakai saat shutdown)."""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._send(batch)
+
+    def _encode(self, lines):
+        body = b"\n".join(lines)
+        if self.use_gzip:
+            body = gzip.compress(body, compresslevel=5)
+        return body
+
+    def _spool(self, batch):
+        """Menyimpan batch ke spool disk. Mengembalikan False jika spool menolak."""
+        if self.spool.append(batch):
+            with self._cond:
+                self._stats["points_spooled"] += len(batch)
+            return True
+        with self._cond:
+            self._stats["points_dropped"] += len(batch)
+        logger.error(f"❌ Spool penuh, {len(batch)} record dibuang.")
+        return False
+
+    def _send(self, batch):
+        if self.spool is not None and not self._healthy:
+            # InfluxDB sedang tidak sehat: langsung ke spool, replayer yang akan mengirim
+            return self._spool(batch)
+
+        started = time.monotonic()
+        ok, retryable = self._post_with_retry(self._encode(batch), len(batch), self.max_retries)
+        latency_ms = (time.monotonic() - started) * 1000
+
+        spooled = False
+        if not ok and retryable and self.spool is not None:
+            self._healthy = False
+            logger.warning("⚠️ InfluxDB tidak sehat, data dialihkan ke spool disk.")
+            spooled = self._spool(batch)
+
+        with self._cond:
+            stats = self._stats
+            stats["last_flush_latency_ms"] = latency_ms
+            stats["max_flush_latency_ms"] = max(stats["max_flush_latency_ms"], latency_ms)
+            stats["total_flush_latency_ms"] += latency_ms
+            stats["last_batch_size"] = len(batch)
+            stats["max_batch_size_seen"] = max(stats["max_batch_size_seen"], len(batch))
+            if ok:
+                stats["batches_written"] += 1
+                stats["points_written"] += len(batch)
+            else:
+                stats["batches_failed"] += 1
+                if not spooled and (self.spool is None or not retryable):
+                    # Jika spool menolak, _spool() sudah menghitungnya sebagai dropped
+                    stats["points_dropped"] += len(batch)
+        return ok
+
+    def _post_with_retry(self, body, count, max_retries):
+        """Mengembalikan (ok, retryable); retryable=False berarti InfluxDB menolak datanya."""
+        for attempt in range(max_retries + 1):
+            try:
+                response = self.session.post(self.write_url, params=self.params, headers=self.headers,
+                                             data=body, timeout=self.timeout)
+                if response.status_code < 300:
+                    return True, False
+                if response.status_code not in RETRYABLE_STATUS:
+                    logger.error(f"❌ InfluxDB menolak batch ({count} record): "
+                                 f"{response.status_code} {response.text[:200]}")
+                    return False, False
+                reason = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                reason = str(e)
+
+            if attempt < max_retries:
+                # Full jitter agar banyak worker tidak mencoba ulang bersamaan
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                with self._cond:
+                    self._stats["retries"] += 1
+                logger.warning(f"⚠️ Gagal menulis batch ke InfluxDB ({reason}), "
+                               f"coba lagi dalam {delay:.2f}s ({attempt + 1}/{max_retries})")
+                time.sleep(delay)
+
+        logger.error(f"❌ Batch {count} record gagal ditulis setelah {max_retries} percobaan ulang ({reason}).")
+        return False, True
+
+    def _ping(self):
+        """True jika endpoint /ping InfluxDB menjawab sukses."""
+        try:
+            return self.session.get(self.ping_url, timeout=self.timeout).status_code < 300
+        except requests.RequestException as e:
+            logger.debug(f"Ping InfluxDB gagal: {e}")
+            return False
+
+    def replay_once(self, max_records=5000):
+        """
+        Mengirim satu potongan dari spool. Mengembalikan jumlah record yang terkirim,
+        0 jika spool kosong, atau None jika InfluxDB masih tidak sehat.
+        """
+        cursor, lines = self.spool.read_chunk(max_records)
+        if not lines:
+            # Spool kosong bukan bukti InfluxDB pulih; pulihkan status hanya jika ping berhasil
+            if not self._healthy:
+                if not self._ping():
+                    return None
+                logger.info("✅ InfluxDB pulih, penulisan langsung dilanjutkan.")
+                self._healthy = True
+            return 0
+
+        ok, retryable = self._post_with_retry(self._encode(lines), len(lines), 0)
+        if not ok and retryable:
+            self._healthy = False
+            return None
+
+        if not ok:
+            # Data rusak tidak boleh memblokir antrian replay selamanya; status sehat tidak diubah
+            # karena tidak ada penulisan yang berhasil
+            logger.error(f"❌ {len(lines)} record dari spool ditolak InfluxDB dan dibuang.")
+            with self._cond:
+                self._stats["points_dropped"] += len(lines)
+        else:
+            with self._cond:
+                self._stats["points_replayed"] += len(lines)
+            if not self._healthy:
+                logger.info("✅ InfluxDB pulih, replay spool berjalan.")
+            self._healthy = True
+
+        self.spool.commit(cursor, len(lines))
+        return len(lines)
+
+    def _replay_loop(self):
+        chunk = max(1, min(self.max_batch_size, int(self.replay_rate)))
+        while not self._replay_stop.is_set():
+            try:
+                sent = self.replay_once(chunk)
+            except Exception as e:
+                logger.error(f"❌ Error saat replay spool: {e}", exc_info=True)
+                sent = None
+
+            if sent is None or sent == 0:
+                self._replay_stop.wait(self.probe_interval)
+            else:
+                # Batasi laju replay agar tidak membanjiri InfluxDB yang baru pulih
+                self._replay_stop.wait(sent / self.replay_rate)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._batch_ready():
+                    if self._buffer:
+                        remaining = self.linger - (time.monotonic() - self._oldest)
+                        self._cond.wait(timeout=max(remaining, 0.001))
+                    else:
+                        self._cond.wait(timeout=self.linger)
+                if not self._running:
+                    break
+                batch = self._take_batch()
+            try:
+                self._send(batch)
+            except Exception as e:
+                logger.error(f"❌ Error tak terduga saat flush batch: {e}", exc_info=True)
+
+    # --- Kontrol ---
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name="influx-batch-writer", daemon=True)
+        self._thread.start()
+        if self.spool is not None:
+            self._replay_stop.clear()
+            self._replay_thread = threading.Thread(target=self._replay_loop, name="influx-spool-replay",
+                                                   daemon=True)
+            self._replay_thread.start()
+        logger.info(f"✅ Batch writer InfluxDB berjalan (batch={self.max_batch_size}, "
+                    f"linger={self.linger}s, gzip={self.use_gzip}).")
+
+    def stop(self, timeout=10.0):
+        """Menghentikan thread flush lalu mengirim sisa buffer."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self._replay_stop.set()
+        if self._replay_thread:
+            self._replay_thread.join(timeout=timeout)
+            self._replay_thread = None
+        self.flush()
+        if self.spool is not None:
+            self.spool.close()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["buffer_points"] = len(self._buffer)
+            stats["buffer_bytes"] = self._buffer_bytes
+            stats["backpressure"] = len(self._buffer) >= self.max_buffer_points
+            stats["healthy"] = self._healthy
+        batches = stats["batches_written"] + stats["batches_failed"]
+        stats["avg_flush_latency_ms"] = stats.pop("total_flush_latency_ms") / batches if batches else 0.0
+        stats["avg_batch_size"] = (stats["points_written"] / stats["batches_written"]
+                                   if stats["batches_written"] else 0.0)
+        return stats
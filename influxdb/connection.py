@@ -1,7 +1,8 @@
 import logging
 import traceback
-from influxdb_client import InfluxDBClient
 from config.settings import Config
+from influxdb.registry import registry
+from influxdb.spool import spool_line_protocol
 
 
 # Setup Logger
@@ -15,37 +16,41 @@ if not logger.hasHandlers():
     logger.addHandler(handler)
 
 def connect_influxdb():
-    """Create and return a write API for InfluxDB"""
+    """Return the shared write API for InfluxDB (created on first use by the registry)"""
     logger.info("🔌 Attempting to connect to InfluxDB...")
     try:
-        client = InfluxDBClient(
-            url=Config.INFLUXDB_URL,
-            token=Config.INFLUXDB_TOKEN,
-            org=Config.INFLUXDB_ORG
-        )
-        write_api = client.write_api()
+        write_api = registry.write_api()
         logger.info("✅ Successfully connected to InfluxDB")
         return write_api
     except Exception as e:
         logger.error("❌ Failed to connect to InfluxDB", exc_info=True)
         return None
 
-# Singleton instance of write API
-influxdb = connect_influxdb()
+def _to_line_protocol(point):
+    if isinstance(point, (str, bytes)):
+        return point
+    return point.to_line_protocol()
 
 def write_data(point):
     """
     Write a single data point to InfluxDB.
     
-    :param point: A data point object compatible with InfluxDB.
+    :param point: A data point object compatible with InfluxDB, or an encoded line protocol str/bytes.
     """
-    if not influxdb:
-        logger.error("🚫 No InfluxDB connection. Cannot write data.")
+    try:
+        influxdb = registry.write_api()
+    except Exception:
+        logger.error("🚫 No InfluxDB connection.", exc_info=True)
+        if spool_line_protocol(_to_line_protocol(point)):
+            logger.warning("💾 Data saved to spool for replay.")
+        else:
+            logger.error("🚫 Cannot write data.")
         return
 
     try:
         influxdb.write(bucket=Config.INFLUXDB_BUCKET, record=point)
-        logger.info(f"📊 Data written to InfluxDB: {point.to_line_protocol()}")
+        logger.info(f"📊 Data written to InfluxDB: {_to_line_protocol(point)}")
     except Exception as e:
         logger.error("❌ Error occurred while writing to InfluxDB", exc_info=True)
         logger.debug(f"Failed point data: {point}")
+        spool_line_protocol(_to_line_protocol(point))
@@ -1,7 +1,8 @@
+import time
 from datetime import datetime
-from influxdb.connection import connect_influxdb
+from influxdb.registry import registry
+from influxdb.line_protocol import get_encoder
 from config.settings import Config
-from influxdb_client import Point
 import logging
 
 logger = logging.getLogger("InfluxDBWriter")
@@ -13,16 +14,22 @@ if not logger.hasHandlers():
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
-write_api = connect_influxdb()
+# Skema data point water level (dipakai juga oleh query di api/waterlevel)
+MEASUREMENT = "TestingIoTFinal"
+FIELD = "water_level"
+TAG = "device_id"
 
-def write_data(data):
+# Encoder line protocol dengan cache prefix per perangkat (identik dengan Point.to_line_protocol())
+encoder = get_encoder(MEASUREMENT, TAG)
+
+def write_data(data, timestamp_ns=None):
     """
-    Menulis satu data point ke InfluxDB dengan skema yang sudah disatukan.
+    Menyerahkan satu data point ke batch writer InfluxDB dengan skema yang sudah disatukan.
+    Tidak menunggu round trip HTTP; pengiriman dilakukan oleh thread flush.
+    timestamp_ns diisi pemanggil jika timestamp yang sama dipakai di tempat lain (nilai terakhir /latest).
     """
     try:
-        if not write_api:
-            logger.error("❌ Koneksi ke InfluxDB (write_api) gagal didapatkan.")
-            return None
+        batch_writer = registry.batch_writer()
 
         # PERBAIKAN: Ambil 'height' dari data, bukan 'water_level'
         device_id = data.get("device_id")
@@ -33,21 +40,15 @@ def write_data(data):
             return None
 
         # PERBAIKAN: Gunakan skema yang konsisten
-        point = Point("TestingIoTFinal") \
-            .tag("device_id", device_id) \
-            .field("water_level", float(water_level))
-        
-        line_protocol = point.to_line_protocol()
-        logger.info(f"📤 Menulis data: {line_protocol}")
-        
-        write_api.write(
-            bucket=Config.INFLUXDB_BUCKET,
-            org=Config.INFLUXDB_ORG, 
-            record=point
-        )
-
-        logger.info("✅ Data berhasil ditulis ke InfluxDB.")
-        return "Data written successfully"
+        # Timestamp diisi saat diterima, bukan saat batch dikirim
+        line_protocol = encoder.encode(device_id, {FIELD: float(water_level)}, timestamp_ns or time.time_ns())
+        logger.debug(f"📤 Menulis data: {line_protocol}")
+
+        if not batch_writer.write(line_protocol):
+            logger.warning(f"⚠️ Buffer InfluxDB penuh, data dari {device_id} dibuang.")
+            return None
+
+        return "Data queued for write"
 
     except ValueError:
         logger.error(f"❌ Tipe data height tidak valid: {data.get('height')}")
@@ -56,3 +57,8 @@ def write_data(data):
         logger.error(f"❌ Terjadi exception saat menulis ke InfluxDB: {e}")
         logger.exception("Traceback:")
         return None
+
+def flush_writes():
+    """Mengirim semua data yang masih di buffer lalu menutup koneksi InfluxDB bersama."""
+    logger.info(f"📊 Statistik pool InfluxDB: {registry.get_pool_stats()}")
+    registry.close()
@@ -0,0 +1,129 @@
+import math
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
+
+EPOCH = datetime.fromtimestamp(0, tz=timezone.utc)
+
+# Aturan escape sama persis dengan influxdb_client.Point
+_ESCAPE_MEASUREMENT = str.maketrans({",": r"\,", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_ESCAPE_KEY = str.maketrans({",": r"\,", "=": r"\=", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_ESCAPE_STRING = str.maketrans({'"': r"\"", "\\": r"\\"})
+
+
+def datetime_to_ns(value):
+    """Mengubah datetime ke epoch nanodetik (datetime naive dianggap UTC, sama seperti Point)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 9 + delta.microseconds * 10 ** 3
+
+
+@lru_cache(maxsize=1024)
+def _escape_field_key(key):
+    return str(key).translate(_ESCAPE_KEY).encode("utf-8")
+
+
+class LineProtocolEncoder:
+    """
+    Encoder line protocol cepat untuk satu measurement dengan satu tag per perangkat.
+
+    Prefix 'measurement,tag=value ' yang sudah di-escape di-cache per perangkat (LRU),
+    field dan timestamp integer ditulis langsung ke bytearray. Hasilnya identik byte-per-byte
+    dengan Point(measurement).tag(tag_key, device_id).field(...).time(ts).to_line_protocol().
+
+    :param measurement: Nama measurement
+    :param tag_key: Nama tag untuk ID perangkat
+    :param cache_size: Jumlah maksimum prefix perangkat yang di-cache
+    """
+
+    def __init__(self, measurement, tag_key="device_id", cache_size=10000):
+        self.measurement = measurement
+        self.tag_key = tag_key
+        self._measurement = str(measurement).translate(_ESCAPE_MEASUREMENT).encode("utf-8")
+        self._tag_key = str(tag_key).translate(_ESCAPE_KEY)
+        self.prefix = lru_cache(maxsize=cache_size)(self._build_prefix)
+        self._local = threading.local()
+
+    def _build_prefix(self, device_id):
+        if device_id is None:
+            return self._measurement + b" "
+        value = str(device_id).translate(_ESCAPE_KEY)
+        if value.endswith("\\"):
+            value += " "
+        if not self._tag_key or not value:
+            return self._measurement + b" "
+        return self._measurement + b"," + f"{self._tag_key}={value} ".encode("utf-8")
+
+    def encode_into(self, buf, device_id, fields, timestamp_ns=None):
+        """
+        Menambahkan satu record ke buf (bytearray) tanpa newline.
+        Mengembalikan jumlah byte yang ditambahkan (0 jika tidak ada field yang valid).
+        """
+        start = len(buf)
+        buf += self.prefix(device_id)
+        body_start = len(buf)
+
+        for key in sorted(fields):
+            value = fields[key]
+            if value is None:
+                continue
+            if isinstance(value, (float, Decimal)):
+                if not math.isfinite(value):
+                    continue
+                text = str(value)
+                if text.endswith(".0"):
+                    text = text[:-2]
+                encoded = text.encode("ascii")
+            elif isinstance(value, bool):
+                encoded = b"true" if value else b"false"
+            elif isinstance(value, int):
+                encoded = b"%di" % value
+            elif isinstance(value, str):
+                encoded = b'"' + value.translate(_ESCAPE_STRING).encode("utf-8") + b'"'
+            else:
+                raise ValueError(f'Type: "{type(value)}" of field: "{key}" is not supported.')
+
+            if len(buf) != body_start:
+                buf += b","
+            buf += _escape_field_key(key)
+            buf += b"="
+            buf += encoded
+
+        if len(buf) == body_start:
+            # Sama seperti Point: record tanpa field menghasilkan string kosong
+            del buf[start:]
+            return 0
+
+        if timestamp_ns is not None:
+            buf += b" %d" % timestamp_ns
+        return len(buf) - start
+
+    def encode(self, device_id, fields, timestamp_ns=None):
+        """Meng-encode satu record menjadi bytes memakai bytearray per-thread yang dipakai ulang."""
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = bytearray()
+        try:
+            self.encode_into(buf, device_id, fields, timestamp_ns)
+            return bytes(buf)
+        finally:
+            buf.clear()
+
+    def cache_info(self):
+        return self.prefix.cache_info()
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(measurement, tag_key="device_id"):
+    """Mengembalikan encoder bersama untuk pasangan measurement/tag."""
+    key = (measurement, tag_key)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        with _encoders_lock:
+            encoder = _encoders.setdefault(key, LineProtocolEncoder(measurement, tag_key))
+    return encoder
@@ -0,0 +1,186 @@
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from influxdb_client import InfluxDBClient
+
+from config.settings import Config
+from influxdb.batch_writer import BatchWriter
+from influxdb.spool import get_default_spool, spool_line_protocol
+
+logger = logging.getLogger("InfluxDBRegistry")
+
+
+class InfluxDBRegistry:
+    """
+    Registry tunggal untuk koneksi InfluxDB dalam satu proses.
+
+    Client, write API, query API, dan batch writer baru dibuat saat pertama kali dipakai,
+    dan semuanya berbagi satu connection pool urllib3 (milik InfluxDBClient) sehingga
+    tidak ada pool HTTP atau thread background ganda per modul.
+    """
+
+    def __init__(self, url, token, org, bucket, pool_maxsize=20, timeout_ms=10000, batch_options=None):
+        self.url = url
+        self.token = token
+        self.org = org
+        self.bucket = bucket
+        self.pool_maxsize = pool_maxsize
+        self.timeout_ms = timeout_ms
+        self.batch_options = batch_options or {}
+
+        self._lock = threading.RLock()
+        self._client = None
+        self._write_api = None
+        self._query_api = None
+        self._session = None
+        self._batch_writer = None
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            url=Config.INFLUXDB_URL,
+            token=Config.INFLUXDB_TOKEN,
+            org=Config.INFLUXDB_ORG,
+            bucket=Config.INFLUXDB_BUCKET,
+            pool_maxsize=Config.INFLUX_POOL_MAXSIZE,
+            timeout_ms=Config.INFLUX_TIMEOUT_MS,
+            batch_options={
+                "max_batch_size": Config.INFLUX_BATCH_SIZE,
+                "max_bytes": Config.INFLUX_BATCH_MAX_BYTES,
+                "linger": Config.INFLUX_BATCH_LINGER,
+                "max_buffer_points": Config.INFLUX_BUFFER_MAX_POINTS,
+                "max_retries": Config.INFLUX_WRITE_MAX_RETRIES,
+                "use_gzip": Config.INFLUX_WRITE_GZIP,
+                "replay_rate": Config.INFLUX_REPLAY_RATE,
+            },
+        )
+
+    # --- Lazy getters ---
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                logger.info("🔌 Membuat InfluxDB client bersama...")
+                self._client = InfluxDBClient(
+                    url=self.url,
+                    token=self.token,
+                    org=self.org,
+                    timeout=self.timeout_ms,
+                    connection_pool_maxsize=self.pool_maxsize,
+                )
+            return self._client
+
+    def write_api(self):
+        """
+        Write API batching milik influxdb_client; batch yang gagal disimpan ke spool.
+        Replay spool ikut dijalankan agar data yang gagal ditulis lewat jalur ini juga terkirim.
+        """
+        with self._lock:
+            if self._write_api is None:
+                self._write_api = self.client().write_api(error_callback=_on_write_error)
+                self.ensure_replay()
+            return self._write_api
+
+    def query_api(self):
+        with self._lock:
+            if self._query_api is None:
+                self._query_api = self.client().query_api()
+            return self._query_api
+
+    def http_session(self):
+        """requests.Session yang memakai connection pool urllib3 milik InfluxDBClient."""
+        with self._lock:
+            if self._session is None:
+                adapter = HTTPAdapter(pool_maxsize=self.pool_maxsize)
+                adapter.poolmanager = self._pool_manager()
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def batch_writer(self):
+        """Batch writer line protocol (dijalankan saat pertama kali diminta)."""
+        with self._lock:
+            if self._batch_writer is None:
+                self._batch_writer = BatchWriter(
+                    url=self.url,
+                    token=self.token,
+                    org=self.org,
+                    bucket=self.bucket,
+                    timeout=self.timeout_ms / 1000,
+                    session=self.http_session(),
+                    spool=get_default_spool(),
+                    **self.batch_options,
+                )
+                self._batch_writer.start()
+            return self._batch_writer
+
+    def ensure_replay(self):
+        """
+        Menjalankan replay spool (lewat batch writer) jika spool aktif. Spool yang diisi oleh
+        write_data() atau error callback write API hanya di-replay oleh thread replay batch writer.
+        """
+        if get_default_spool() is None:
+            return None
+        return self.batch_writer()
+
+    def _pool_manager(self):
+        return self.client().api_client.rest_client.pool_manager
+
+    # --- Shutdown & metrik ---
+    def close(self):
+        """Flush semua writer lalu menutup client. Aman dipanggil berkali-kali."""
+        with self._lock:
+            if self._batch_writer is not None:
+                self._batch_writer.stop()
+                self._batch_writer = None
+            if self._write_api is not None:
+                self._write_api.close()
+                self._write_api = None
+            self._query_api = None
+            self._session = None
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+                logger.info("InfluxDB client ditutup.")
+
+    def get_pool_stats(self):
+        """Utilisasi connection pool per host: koneksi dibuat, sedang dipakai, dan total request."""
+        with self._lock:
+            if self._client is None:
+                return {"initialized": False, "pools": []}
+            pools = []
+            manager = self._pool_manager()
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                maxsize = pool.pool.maxsize
+                pools.append({
+                    "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                    "maxsize": maxsize,
+                    "in_use": maxsize - pool.pool.qsize(),
+                    "connections_created": pool.num_connections,
+                    "requests": pool.num_requests,
+                })
+            return {
+                "initialized": True,
+                "write_api": self._write_api is not None,
+                "query_api": self._query_api is not None,
+                "batch_writer": self._batch_writer is not None,
+                "pools": pools,
+            }
+
+
+def _on_write_error(conf, data, exception):
+    """Error callback write API batching: simpan batch yang gagal ke spool untuk di-replay."""
+    if spool_line_protocol(data):
+        logger.warning(f"💾 Gagal menulis ke InfluxDB ({exception}), batch disimpan ke spool.")
+    else:
+        logger.error(f"❌ Gagal menulis ke InfluxDB dan batch tidak bisa disimpan ke spool: {exception}")
+
+
+# Registry bersama untuk proses ini; belum ada koneksi yang dibuat saat import
+registry = InfluxDBRegistry.from_config()
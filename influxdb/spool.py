@@ -0,0 +1,281 @@
+import logging
+import os
+import threading
+
+from config.settings import Config
+
+logger = logging.getLogger("InfluxDBSpool")
+
+EVICT_DROP_OLDEST = "drop_oldest"
+EVICT_REJECT = "reject"
+
+SEGMENT_PREFIX = "spool-"
+SEGMENT_SUFFIX = ".lp"
+OFFSET_FILE = "replay.offset"
+
+
+class DiskSpool:
+    """
+    Write-ahead spool append-only di disk untuk record line protocol saat InfluxDB tidak sehat.
+
+    Data ditulis ke segmen berurutan (spool-000000000001.lp, ...) dengan buffered append;
+    segmen dirotasi saat melewati segment_max_bytes. Posisi replay disimpan di file
+    replay.offset sehingga tidak ada data yang hilang atau terkirim ulang saat proses restart.
+    Isi spool tidak pernah dimuat utuh ke memori; replay membaca per potongan.
+
+    Segmen aktif dibaca di tempat (di bawah lock yang sama dengan append) tanpa ditutup, sehingga
+    probe replay berkala selama InfluxDB mati tidak memecah spool menjadi banyak segmen kecil.
+    Segmen hanya dihapus setelah seluruh isinya di-commit dan tidak lagi menjadi segmen aktif.
+
+    :param directory: Direktori spool
+    :param segment_max_bytes: Ukuran maksimum satu segmen sebelum dirotasi
+    :param max_total_bytes: Batas total ukuran spool di disk
+    :param eviction: 'drop_oldest' (hapus segmen tertua) atau 'reject' (tolak data baru) saat penuh
+    """
+
+    def __init__(self, directory, segment_max_bytes=16 * 1024 * 1024, max_total_bytes=1024 * 1024 * 1024,
+                 eviction=EVICT_DROP_OLDEST, fsync=False):
+        if eviction not in (EVICT_DROP_OLDEST, EVICT_REJECT):
+            raise ValueError(f"Eviction policy tidak dikenal: {eviction}")
+
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.eviction = eviction
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_seq = 0
+        self._total_bytes = 0  # ukuran semua segmen di disk, diperbarui append/evict/hapus segmen
+        self._stats = {
+            "records_spooled": 0,
+            "records_replayed": 0,
+            "records_rejected": 0,
+            "segments_evicted": 0,
+            "bytes_evicted": 0,
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        # Satu-satunya pemindaian direktori penuh; setelah ini ukuran dihitung secara inkremental
+        self._total_bytes = sum(os.path.getsize(self._path(name)) for name in segments)
+        if segments:
+            self._active_seq = self._seq(segments[-1])
+            logger.info(f"📦 Spool ditemukan: {len(segments)} segmen, {self._total_bytes} byte menunggu replay.")
+
+    # --- Utilitas segmen ---
+    @staticmethod
+    def _seq(name):
+        return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _segment_name(self, seq):
+        return f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}"
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segments(self):
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def size_bytes(self):
+        return self._total_bytes
+
+    def _remove_segment(self, name):
+        """Menghapus segmen dan mengurangi total ukuran; mengembalikan ukuran yang dibebaskan."""
+        path = self._path(name)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        self._total_bytes = max(0, self._total_bytes - size)
+        return size
+
+    def is_empty(self):
+        with self._lock:
+            segments = self._segments()
+            if not segments:
+                return True
+            offset_segment, offset = self._read_offset()
+            return (len(segments) == 1 and offset_segment == segments[0]
+                    and offset >= os.path.getsize(self._path(segments[0])))
+
+    def _rotate(self):
+        if self._active:
+            self._active.close()
+        self._active_seq += 1
+        self._active = open(self._path(self._segment_name(self._active_seq)), "ab")
+
+    def _seal_active(self):
+        if self._active:
+            self._active.close()
+            self._active = None
+
+    def _active_name(self):
+        return self._active and os.path.basename(self._active.name)
+
+    # --- Tulis ---
+    def append(self, lines):
+        """
+        Menambahkan record line protocol (bytes) ke spool.
+        Mengembalikan False jika spool penuh dan policy = 'reject'.
+        """
+        data = b"".join(line.rstrip(b"\n") + b"\n" for line in lines)
+        if not data:
+            return True
+
+        with self._lock:
+            if not self._make_room(len(data)):
+                self._stats["records_rejected"] += len(lines)
+                return False
+
+            if self._active is None or self._active.tell() >= self.segment_max_bytes:
+                self._rotate()
+            self._active.write(data)
+            self._active.flush()
+            self._total_bytes += len(data)
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            self._stats["records_spooled"] += len(lines)
+        return True
+
+    def _make_room(self, incoming):
+        if self._total_bytes + incoming <= self.max_total_bytes:
+            return True
+        if self.eviction == EVICT_REJECT:
+            return False
+
+        active_name = self._active_name()
+        for name in self._segments():
+            if self._total_bytes + incoming <= self.max_total_bytes:
+                break
+            if name == active_name:
+                # Segmen aktif juga harus dikorbankan; mulai segmen baru setelahnya
+                self._seal_active()
+            size = self._remove_segment(name)
+            self._stats["segments_evicted"] += 1
+            self._stats["bytes_evicted"] += size
+            logger.warning(f"⚠️ Spool penuh, segmen {name} ({size} byte) dihapus.")
+        return self._total_bytes + incoming <= self.max_total_bytes
+
+    # --- Replay ---
+    def _read_offset(self):
+        try:
+            with open(self._path(OFFSET_FILE)) as f:
+                name, offset = f.read().split()
+                return name, int(offset)
+        except (OSError, ValueError):
+            return None, 0
+
+    def _write_offset(self, name, offset):
+        tmp = self._path(OFFSET_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{name} {offset}")
+        os.replace(tmp, self._path(OFFSET_FILE))
+
+    def read_chunk(self, max_records=5000):
+        """
+        Membaca potongan record tertua yang belum di-replay.
+        Mengembalikan (cursor, lines); cursor diteruskan ke commit() setelah berhasil dikirim.
+        Mengembalikan (None, []) jika spool kosong.
+        """
+        with self._lock:
+            while True:
+                segments = self._segments()
+                if not segments:
+                    return None, []
+
+                name = segments[0]
+                offset_segment, offset = self._read_offset()
+                if offset_segment != name:
+                    offset = 0
+
+                lines = []
+                end = offset
+                with open(self._path(name), "rb") as f:
+                    f.seek(offset)
+                    while len(lines) < max_records:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            # EOF, atau record terakhir tidak lengkap (mis. crash saat menulis)
+                            break
+                        lines.append(line[:-1])
+                        end += len(line)
+                    at_end = end >= os.path.getsize(self._path(name)) or not line.endswith(b"\n")
+
+                if lines:
+                    return (name, end, at_end), lines
+                if name == self._active_name():
+                    # Semua record di segmen aktif sudah di-replay; segmen tetap dipakai append
+                    return None, []
+
+                # Segmen sudah habis di-replay
+                self._remove_segment(name)
+
+    def commit(self, cursor, count):
+        """Menandai record sampai cursor sebagai sudah terkirim."""
+        name, end, at_end = cursor
+        with self._lock:
+            self._stats["records_replayed"] += count
+            # Segmen aktif (atau yang mendapat append setelah dibaca) belum boleh dihapus
+            try:
+                finished = at_end and name != self._active_name() and end >= os.path.getsize(self._path(name))
+            except FileNotFoundError:
+                finished = True
+            if finished:
+                self._remove_segment(name)
+                self._write_offset("-", 0)
+            else:
+                self._write_offset(name, end)
+
+    def close(self):
+        with self._lock:
+            self._seal_active()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["segments"] = len(self._segments())
+        stats["size_bytes"] = self.size_bytes()
+        return stats
+
+
+_default_spool = None
+_default_spool_lock = threading.Lock()
+
+
+def get_default_spool():
+    """
+    Mengembalikan spool bersama untuk proses ini sesuai Config,
+    atau None jika spool dinonaktifkan (INFLUX_SPOOL_ENABLED=false).
+    """
+    global _default_spool
+    if not Config.INFLUX_SPOOL_ENABLED:
+        return None
+    with _default_spool_lock:
+        if _default_spool is None:
+            _default_spool = DiskSpool(
+                directory=Config.INFLUX_SPOOL_DIR,
+                segment_max_bytes=Config.INFLUX_SPOOL_SEGMENT_BYTES,
+                max_total_bytes=Config.INFLUX_SPOOL_MAX_BYTES,
+                eviction=Config.INFLUX_SPOOL_EVICTION,
+            )
+        return _default_spool
+
+
+def spool_line_protocol(data):
+    """
+    Menyimpan line protocol (str/bytes, boleh multi-baris) ke spool bersama.
+    Mengembalikan False jika spool nonaktif atau menolak data. Replay-nya dijalankan oleh
+    batch writer registry (InfluxDBRegistry.ensure_replay, otomatis saat write_api() dibuat).
+    """
+    spool = get_default_spool()
+    if spool is None:
+        return False
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return spool.append(data.splitlines())
@@ -5,6 +5,9 @@ import random
 import string
 from datetime import datetime
 import threading
+import os
+
+from helper.payload_codec import encode_payload
 
 # ====================== Konstanta MQTT ======================
 MQTT_BROKER = "localhost"  # Ganti dengan alamat broker
@@ -13,6 +16,12 @@ REGISTER_COMMAND_TOPIC = "iot/register-device/request"
 REGISTER_RESPONSE_TOPIC = "iot/register-device/response"
 WATERLEVEL_TOPIC = "iot/waterlevel"
 
+# ====================== Format Payload ======================
+# json (default, perangkat lama) | msgpack | cbor
+PAYLOAD_FORMAT = os.getenv("SIM_PAYLOAD_FORMAT", "json")
+# true = publish ke topik bersuffix format (mis. iot/waterlevel/msgpack), false = worker menebak dari byte pertama
+USE_FORMAT_TOPIC = os.getenv("SIM_FORMAT_TOPIC", "false").lower() == "true"
+
 # ====================== Simulasi Device ID ======================
 def generate_random_device_id(prefix="SIM-"):
     return prefix + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
@@ -48,6 +57,9 @@ def on_message(client, userdata, msg):
                     "message": "Device successfully registered",
                     "timestamp": int(time.time())
                 }
+                # Kembalikan command_id agar worker bisa mencatat ack perintah
+                if payload.get("command_id"):
+                    response["command_id"] = payload["command_id"]
 
                 client.publish(REGISTER_RESPONSE_TOPIC, json.dumps(response))
                 print(f"📤 Sent registration response: {response}")
@@ -70,8 +82,10 @@ def publish_dummy_water_level(client, interval=10):  # Ganti interval jika perlu
             "height": round(random.uniform(0.0, 100.0),2),  # Simulasi level air antara 0.0 hingga 1.0
             "timestamp": datetime.now().isoformat()
             }
-            client.publish(WATERLEVEL_TOPIC, json.dumps(dummy_data))
-            print(f"💧 Published water level: {dummy_data}")
+            topic = f"{WATERLEVEL_TOPIC}/{PAYLOAD_FORMAT}" if USE_FORMAT_TOPIC else WATERLEVEL_TOPIC
+            packed = encode_payload(dummy_data, PAYLOAD_FORMAT)
+            client.publish(topic, packed)
+            print(f"💧 Published water level ({PAYLOAD_FORMAT}, {len(packed)} bytes): {dummy_data}")
         else:
             print("⏳ Waiting for DEVICE_ID...")
         time.sleep(interval)
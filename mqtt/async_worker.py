@@ -0,0 +1,517 @@
+"""Engine asyncio untuk MQTT Worker: aiomqtt + redis.asyncio + httpx dalam satu event loop."""
+import asyncio
+import logging
+import signal
+
+import redis
+import redis.asyncio as aioredis
+
+from config.settings import Config
+from influxdb.influxdb_helper import write_data, flush_writes
+from helper import json_codec
+from helper.async_io import HTTP_ERRORS, AsyncHeartbeatAggregator, AsyncPublishBatcher, httpx
+from helper.command_bus import COMMAND_CHANNEL, AsyncCommandStreamConsumer, claim_command_async
+from helper.command_fanout import FanoutJob, expand_target, load_group_members_async, run_fanout_async
+from helper.command_tracker import AsyncCommandTracker
+from helper.device_gate import DeviceGate
+from helper.latest_store import AsyncLatestValueStore
+from helper.shared_whitelist import (DEVICES_KEY, LEADER_KEY, META_KEY, UPDATES_CHANNEL, WhitelistReplica,
+                                     default_instance_id)
+from helper.whitelist_sync import WhitelistSync
+from mqtt.message_handler import MessageHandler
+
+try:
+    import aiomqtt
+except ImportError:  # hanya dibutuhkan saat engine asyncio dipilih
+    aiomqtt = None
+
+# Sama dengan engine thread (cmd/mqtt_worker/main.py)
+DATA_CHANNEL = "data_for_dashboard"
+METRICS_KEY = "metrics:mqtt_worker"
+BROADCAST_LIMIT = 1000  # delta lebih besar disiarkan sebagai {"full": true}
+
+
+class _Shutdown(Exception):
+    """Dilempar di dalam TaskGroup untuk membatalkan semua task saat stop()."""
+
+
+class AsyncMQTTWorker:
+    """
+    Padanan MQTTWorker tanpa thread per dependensi: koneksi MQTT, listener Redis, refresh
+    whitelist, batch dashboard, heartbeat, dan metrik berjalan sebagai task di satu
+    asyncio.TaskGroup. stop() membatalkan seluruh group; flush terakhir dilakukan setelahnya.
+
+    Pemrosesan pesan memakai MessageHandler yang sama dengan engine thread, dan format
+    Redis (channel dashboard, set/lease/pub-sub whitelist, claim perintah, metrik) identik,
+    sehingga instance thread dan asyncio bisa berjalan berdampingan.
+    """
+
+    def __init__(self, redis_client=None, http_client=None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.instance_id = f"{Config.MQTT_CLIENT_ID_PREFIX}-{default_instance_id()}".replace(":", "-")
+
+        self.redis = redis_client or aioredis.Redis(
+            host=Config.REDIS_HOST,
+            port=Config.REDIS_PORT,
+            db=0,
+            decode_responses=True,
+            socket_connect_timeout=Config.REDIS_CONNECT_TIMEOUT,
+            health_check_interval=30,
+        )
+        if http_client is None and httpx is not None:
+            http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=Config.ASYNC_HTTP_CONCURRENCY))
+        self.http = http_client
+        self.client = None  # aiomqtt.Client selama terhubung
+
+        # --- Whitelist: cache lokal, direplikasi lewat set Redis yang sama dengan SharedWhitelist ---
+        self.shared = Config.WHITELIST_SHARED
+        self.whitelist = WhitelistSync(
+            url=Config.WHITELIST_API_URL,
+            min_interval=Config.WHITELIST_SYNC_MIN_INTERVAL,
+            max_interval=Config.WHITELIST_SYNC_MAX_INTERVAL,
+            on_change=self._on_whitelist_change if self.shared else None,
+        )
+        # Keputusan leader, format pesan, dan penerapan hasil Redis dipakai bersama SharedWhitelist
+        self.replica = WhitelistReplica(self.whitelist, instance_id=self.instance_id,
+                                        leader_ttl=Config.WHITELIST_LEADER_TTL, broadcast_limit=BROADCAST_LIMIT,
+                                        shared=self.shared)
+
+        # Lookup ke Redis untuk ID tidak dikenal dilakukan async di _on_message
+        self.device_gate = DeviceGate(
+            self.whitelist,
+            negative_ttl=Config.REJECT_CACHE_TTL,
+            log_every=Config.REJECT_LOG_EVERY,
+            log_interval=Config.REJECT_LOG_INTERVAL,
+        )
+        self.dashboard_publisher = AsyncPublishBatcher(
+            self.redis,
+            DATA_CHANNEL,
+            max_items=Config.DASHBOARD_BATCH_MAX_ITEMS,
+            max_delay=Config.DASHBOARD_BATCH_MAX_DELAY_MS / 1000,
+            mode=Config.DASHBOARD_BATCH_MODE,
+            max_pending=Config.DASHBOARD_BATCH_MAX_PENDING,
+        )
+        self.heartbeats = AsyncHeartbeatAggregator(
+            self.http,
+            base_url=Config.HEARTBEAT_BASE_URL,
+            flush_interval=Config.HEARTBEAT_FLUSH_INTERVAL,
+            batch_url=Config.HEARTBEAT_BATCH_URL,
+            concurrency=Config.ASYNC_HTTP_CONCURRENCY,
+        )
+        self.command_tracker = AsyncCommandTracker(self.redis)
+        self.latest = AsyncLatestValueStore(self.redis, flush_interval=Config.LATEST_FLUSH_INTERVAL)
+        self.handler = MessageHandler(Config, self.whitelist, self.device_gate,
+                                      self.dashboard_publisher, self.heartbeats, write_data, self.logger,
+                                      tracker=self.command_tracker, latest=self.latest)
+
+        self.commands = AsyncCommandStreamConsumer(
+            self.redis,
+            self.instance_id,
+            self._handle_command,
+            batch_size=Config.COMMAND_STREAM_BATCH,
+            block_ms=Config.COMMAND_STREAM_BLOCK_MS,
+            reclaim_idle_ms=Config.COMMAND_RECLAIM_IDLE_MS,
+            max_deliveries=Config.COMMAND_MAX_DELIVERIES,
+            max_age=Config.COMMAND_MAX_AGE,
+            on_expired=lambda message: self.command_tracker.finished(message, "expired"),
+        )
+
+        self._tasks = None
+        self._stopping = None
+        self._refresh_now = asyncio.Event()
+        self._inflight = asyncio.Semaphore(Config.ASYNC_MAX_INFLIGHT_COMMANDS)
+        # Fan-out perintah grup dijalankan satu per satu per worker (sama dengan FanoutDispatcher)
+        self._fanout_lock = asyncio.Lock()
+        self._fanout_stats = {"jobs": 0, "completed": 0, "published": 0, "failed": 0}
+        self._stats = {"received": 0, "processed": 0, "remote_lookups": 0, "commands": 0}
+
+    # --- MQTT ---
+    @staticmethod
+    def _data_topic(topic):
+        if Config.MQTT_SHARED_GROUP:
+            return f"$share/{Config.MQTT_SHARED_GROUP}/{topic}"
+        return topic
+
+    async def _mqtt_loop(self):
+        backoff = 1
+        while True:
+            try:
+                async with aiomqtt.Client(Config.MQTT_BROKER, Config.MQTT_PORT, identifier=self.instance_id,
+                                          keepalive=60,
+                                          max_queued_incoming_messages=Config.INGEST_QUEUE_SIZE,
+                                          max_inflight_messages=Config.FANOUT_MAX_INFLIGHT) as client:
+                    self.client = client
+                    self.logger.info("✅ (MQTT) Berhasil terhubung ke Broker!")
+                    await client.subscribe([
+                        (self._data_topic(f"{Config.MQTT_TOPIC_WATERLEVEL}/#"), 0),
+                        (self._data_topic(Config.MQTT_TOPIC_STATUS), 1),
+                        (self._data_topic(Config.MQTT_TOPIC_COMMAND_ACK), 1),
+                        (Config.REGISTRATION_RESPONSE_TOPIC, 0),
+                    ])
+                    self.logger.info(f"👂 (MQTT) Berlangganan ke topik data (client ID {self.instance_id}).")
+                    backoff = 1
+                    async for message in client.messages:
+                        await self._on_message(str(message.topic), message.payload)
+            except aiomqtt.MqttError as e:
+                self.logger.warning(f"🔌 (MQTT) Koneksi terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+            finally:
+                self.client = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 120)
+
+    async def _on_message(self, topic, payload):
+        self._stats["received"] += 1
+        device_id = self.handler.topic_device_id(topic)
+        if device_id is not None and device_id not in self.whitelist and not self.device_gate.is_rejected(device_id):
+            await self._lookup_remote(device_id)
+        if self.handler.admit_topic(topic):
+            self.handler.handle(topic, payload)
+            self._stats["processed"] += 1
+
+    async def _lookup_remote(self, device_id):
+        """Read-through ke set Redis untuk perangkat yang baru terdaftar di proses lain."""
+        if not self.shared:
+            return
+        self._stats["remote_lookups"] += 1
+        try:
+            found = await self.redis.sismember(DEVICES_KEY, device_id)
+        except redis.RedisError as e:
+            self.replica.redis_failed("mengecek whitelist di Redis", e)
+            return
+        self.replica.apply_lookup(device_id, found)
+
+    async def _publish(self, topic, payload):
+        if self.client is None:
+            self.logger.error("MQTT client tidak terhubung. Perintah ditunda.")
+            return False
+        try:
+            await self.client.publish(topic, json_codec.dumps(payload))
+        except aiomqtt.MqttError as e:
+            self.logger.error(f"Gagal mempublikasikan perintah ke {topic}: {e}")
+            return False
+        self.logger.info(f"📡 (MQTT) Perintah dipublikasikan ke topik: {topic}")
+        return True
+
+    async def _publish_command(self, data, dispatched_at):
+        payload = data['payload']
+        if data.get('command_id') and isinstance(payload, dict):
+            # command_id ikut ke perangkat agar ack-nya bisa dikorelasikan
+            payload = {**payload, "command_id": data['command_id']}
+        if not await self._publish(data['topic'], payload):
+            return False
+        self.command_tracker.published(data, dispatched_at)
+        return True
+
+    async def _publish_fanout(self, topic, payload):
+        """Publish satu perangkat dari fan-out; selesai setelah PUBACK (QoS 1)."""
+        if self.client is None:
+            return False
+        try:
+            await self.client.publish(topic, json_codec.dumps(payload), qos=Config.FANOUT_QOS)
+        except aiomqtt.MqttError:
+            return False
+        return True
+
+    async def _run_fanout(self, job):
+        async with self._fanout_lock:
+            self._fanout_stats["jobs"] += 1
+            try:
+                await run_fanout_async(job, self.redis, self._publish_fanout, rate=Config.FANOUT_RATE,
+                                       max_inflight=Config.FANOUT_MAX_INFLIGHT,
+                                       progress_interval=Config.FANOUT_PROGRESS_INTERVAL)
+            except Exception as e:
+                # Satu fan-out yang gagal tidak boleh ikut menghentikan TaskGroup utama worker
+                self.logger.error(f"❌ Fan-out {job.fanout_id} gagal: {e}", exc_info=True)
+                if job.finished_at is None:
+                    job.finish("failed")
+            finally:
+                self._fanout_stats["completed"] += 1
+                self._fanout_stats["published"] += job.published
+                self._fanout_stats["failed"] += len(job.failed)
+                self.command_tracker.published(job.message, job.dispatched_at)
+                error = f"{len(job.failed)} perangkat gagal" if job.failed else None
+                self.command_tracker.finished(job.message, job.state, error)
+
+    # --- Redis: perintah & replikasi whitelist ---
+    async def _redis_loop(self):
+        channels = [COMMAND_CHANNEL] + ([UPDATES_CHANNEL] if self.shared else [])
+        backoff = 1
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(*channels)
+                if self.shared:
+                    # Muat ulang setelah (re)subscribe agar perubahan selama terputus tidak terlewat
+                    await self._reload_from_redis()
+                backoff = 1
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    if message["channel"] == UPDATES_CHANNEL:
+                        self._handle_whitelist_update(message["data"])
+                    else:
+                        self._spawn(self._handle_redis_command(message["data"]))
+            except redis.RedisError as e:
+                self.logger.warning(f"⚠️ Listener Redis terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _spawn(self, coro):
+        if self._tasks is None:
+            coro.close()
+            return
+        self._tasks.create_task(coro)
+
+    async def _command_stream_loop(self):
+        """Perintah ke perangkat dari Redis Stream: satu batch XREADGROUP diproses bersamaan lalu di-ack."""
+        backoff = 1
+        while True:
+            try:
+                await self.commands.poll()
+                backoff = 1
+            except redis.RedisError as e:
+                self.logger.warning(f"⚠️ Consumer stream perintah terputus ({e}). Mencoba lagi dalam {backoff} detik...")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    async def _handle_redis_command(self, raw):
+        """Pesan pub/sub: siaran (whitelist_invalidate) dan perintah dari produsen lama (di-claim)."""
+        try:
+            data = json_codec.loads(raw)
+            if not await claim_command_async(self.redis, data, self.instance_id):
+                self.logger.debug(f"Perintah {data.get('command_id')} sudah ditangani instance lain.")
+                return
+            await self._handle_command(data)
+        except Exception as e:
+            self.logger.error(f"Error memproses pesan dari Redis: {e}")
+
+    async def _handle_command(self, data):
+        """Mengeksekusi satu perintah; False = belum terkirim (entri stream tidak di-ack)."""
+        async with self._inflight:
+            self._stats["commands"] += 1
+            self.logger.info(f"Menerima perintah dari Redis: {data.get('type')}")
+
+            if data['type'] == 'register_device':
+                return await self._publish_command(data, self.command_tracker.dispatched(data))
+            elif data['type'] == 'command':
+                dispatched_at = self.command_tracker.dispatched(data)
+                if data['device_id'] in self.whitelist:
+                    return await self._publish_command(data, dispatched_at)
+                self.logger.warning(f"Perintah ditolak: {data['device_id']} tidak ada di whitelist.")
+                self.command_tracker.finished(data, "rejected", "perangkat tidak ada di whitelist")
+            elif data['type'] == 'group_command':
+                # Ekspansi di sini, pengiriman di task terpisah agar consumer stream tidak tertahan
+                dispatched_at = self.command_tracker.dispatched(data)
+                targets, skipped = expand_target(data['target'], self.whitelist,
+                                                 await load_group_members_async(self.redis, data['target']))
+                self._spawn(self._run_fanout(FanoutJob(data, targets, skipped, Config.MQTT_BASE_TOPIC_COMMAND,
+                                                       dispatched_at)))
+            elif data['type'] == 'whitelist_invalidate':
+                await self._invalidate(data.get('added') or [], data.get('removed') or [])
+            return True
+
+    def _on_whitelist_change(self, added, removed):
+        # Callback sinkron dari WhitelistSync; penulisan ke Redis dijadwalkan sebagai task
+        self._spawn(self._write_devices(added, removed, publish=True))
+
+    async def _write_devices(self, added, removed, publish):
+        try:
+            await self.replica.queue_devices(self.redis.pipeline(transaction=True), added, removed, publish).execute()
+        except redis.RedisError as e:
+            self.replica.redis_failed("menyimpan perubahan whitelist ke Redis", e)
+
+    def _handle_whitelist_update(self, raw):
+        try:
+            reload = self.replica.apply_update(raw)
+        except ValueError as e:
+            self.logger.error(f"Pesan whitelist tidak valid: {e}")
+            return
+        if reload:
+            self._spawn(self._reload_from_redis())
+
+    async def _reload_from_redis(self):
+        try:
+            members = await self.redis.smembers(DEVICES_KEY)
+        except redis.RedisError as e:
+            self.replica.redis_failed("membaca whitelist dari Redis", e)
+            return False
+        return self.replica.apply_members(members)
+
+    async def _invalidate(self, added, removed):
+        """Push dari backend: delta diterapkan di setiap proses, hanya leader yang menulis ke Redis."""
+        if self.replica.invalidate_local(added, removed):
+            await self._write_devices(set(added), set(removed), publish=False)
+        self.whitelist.invalidate()
+        self._refresh_now.set()
+
+    # --- Whitelist: leader election & sinkronisasi ke Laravel ---
+    async def _elect(self):
+        if not self.shared:
+            return True
+        replica = self.replica
+        try:
+            leader = bool(await self.redis.set(LEADER_KEY, self.instance_id, nx=True, px=replica.lease_ms)) or \
+                bool(await self.redis.eval(*replica.renew_args()))
+        except redis.RedisError as e:
+            if replica.election_failed(e):
+                self._refresh_now.set()
+            return True
+
+        if replica.elected(leader):
+            await self._load_meta()
+            self._refresh_now.set()
+        return leader
+
+    async def _election_loop(self):
+        while True:
+            await self._elect()
+            await asyncio.sleep(Config.WHITELIST_LEADER_TTL / 3)
+
+    async def _load_meta(self):
+        try:
+            self.replica.apply_meta(await self.redis.hgetall(META_KEY))
+        except redis.RedisError:
+            return
+
+    async def _save_meta(self):
+        try:
+            await self.redis.hset(META_KEY, mapping=self.replica.meta_mapping())
+        except redis.RedisError as e:
+            self.replica.redis_failed("menyimpan cursor whitelist ke Redis", e)
+
+    async def load_whitelist_from_backend(self):
+        """Leader sinkron ke Laravel (request kondisional); follower cukup memuat set Redis sekali."""
+        if self.shared:
+            if not await self._elect():
+                self.replica.follower_skipped()
+                return await self._reload_from_redis() if self.replica.needs_reload else False
+            if self.replica.needs_reload:
+                await self._reload_from_redis()
+
+        whitelist = self.whitelist
+        headers, params = whitelist.request_args()
+        try:
+            response = await self.http.get(whitelist.url, headers=headers, params=params, timeout=whitelist.timeout)
+            if whitelist.cursor_expired(response, params):
+                response = await self.http.get(whitelist.url, timeout=whitelist.timeout)
+        except HTTP_ERRORS as e:
+            return whitelist.sync_failed(e)
+        changed = whitelist.apply_response(response)
+        if self.shared:
+            await self._save_meta()
+        return changed
+
+    async def _whitelist_loop(self):
+        while True:
+            await self.load_whitelist_from_backend()
+            # Interval adaptif; dibangunkan lebih awal oleh invalidasi atau pergantian leader
+            try:
+                await asyncio.wait_for(self._refresh_now.wait(), self.whitelist.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_now.clear()
+
+    # --- Metrik ---
+    def get_stats(self):
+        return {
+            "engine": "asyncio",
+            "ingest": dict(self._stats),
+            "dashboard": self.dashboard_publisher.get_stats(),
+            "heartbeat": self.heartbeats.get_stats(),
+            "whitelist": self.replica.get_stats(),
+            "rejections": self.device_gate.get_stats(),
+            "commands": self.commands.get_stats(),
+            "command_tracking": self.command_tracker.get_stats(),
+            "fanout": dict(self._fanout_stats),
+            "latest": self.latest.get_stats(),
+        }
+
+    async def _metrics_loop(self):
+        interval = Config.WORKER_METRICS_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hset(METRICS_KEY, self.instance_id, json_codec.dumps(self.get_stats()))
+                pipe.expire(METRICS_KEY, int(interval * 3))
+                await pipe.execute()
+            except redis.RedisError as e:
+                self.logger.debug(f"Gagal menyimpan metrik worker ke Redis: {e}")
+
+    async def _report_loop(self, reporter):
+        while True:
+            reporter(self.get_stats())
+            await asyncio.sleep(Config.WORKER_REPORT_INTERVAL)
+
+    # --- Kontrol Service ---
+    async def run(self, reporter=None):
+        """Menjalankan worker sampai stop() dipanggil. reporter(stats) dipanggil berkala (supervisor)."""
+        if aiomqtt is None or self.http is None:
+            raise RuntimeError("Engine asyncio membutuhkan paket aiomqtt dan httpx (pip install aiomqtt httpx).")
+        self._stopping = asyncio.Event()
+        self.logger.info("🚀 Memulai MQTT Worker (engine asyncio)...")
+        if not Config.FAST_START:
+            try:
+                await self.redis.ping()
+                self.logger.info("✅ (MQTT Worker) Berhasil terhubung ke Redis.")
+            except Exception as e:
+                self.logger.error(f"❌ (MQTT Worker) Gagal terhubung ke Redis: {e}")
+                raise SystemExit(1)
+            await self.load_whitelist_from_backend()
+
+        try:
+            async with asyncio.TaskGroup() as tasks:
+                self._tasks = tasks
+                loops = [self._mqtt_loop(), self._redis_loop(), self._command_stream_loop(),
+                         self._whitelist_loop(), self.dashboard_publisher.run(), self.heartbeats.run(),
+                         self.command_tracker.run(), self.latest.run(), self._metrics_loop()]
+                if self.shared:
+                    loops.append(self._election_loop())
+                if reporter is not None:
+                    loops.append(self._report_loop(reporter))
+                for coro in loops:
+                    tasks.create_task(coro)
+                self.logger.info("✅ MQTT Worker berjalan.")
+                await self._stopping.wait()
+                raise _Shutdown()
+        except* _Shutdown:
+            pass
+        finally:
+            self._tasks = None
+            await self._shutdown()
+
+    def stop(self):
+        self.logger.info("🛑 Menghentikan MQTT Worker...")
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def _shutdown(self):
+        await self.dashboard_publisher.flush()
+        await self.heartbeats.flush()
+        await self.command_tracker.flush()
+        await self.latest.flush()
+        if self.shared and self.replica.is_leader:
+            try:
+                # Lepaskan lease agar instance lain bisa langsung mengambil alih
+                await self.redis.eval(*self.replica.release_args())
+            except redis.RedisError:
+                pass
+        # Batch writer InfluxDB tetap thread tunggal; flush terakhir tidak boleh menahan event loop
+        await asyncio.to_thread(flush_writes)
+        await self.http.aclose()
+        await self.redis.aclose()
+        self.logger.info(f"MQTT Worker berhenti. Statistik: {self.get_stats()}")
+
+
+def run_async_worker(reporter=None):
+    """Entry point engine asyncio: SIGTERM/SIGINT memanggil stop() di dalam event loop."""
+    async def main():
+        worker = AsyncMQTTWorker()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, worker.stop)
+        await worker.run(reporter)
+
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""Pemrosesan pesan MQTT masuk yang dipakai bersama engine thread dan engine asyncio MQTT Worker."""
+import logging
+import time
+
+from paho.mqtt.client import topic_matches_sub
+
+from helper.payload_codec import decode_payload, split_topic, split_device_topic
+
+
+class MessageHandler:
+    """
+    Otorisasi dan pemrosesan satu pesan (topic, payload mentah): decode, cek whitelist,
+    tulis ke InfluxDB, teruskan ke dashboard, dan catat heartbeat.
+
+    Semua dependensi hanya dipanggil secara non-blocking (enqueue ke batcher/aggregator),
+    sehingga handle() aman dipanggil dari worker thread maupun dari event loop asyncio.
+
+    :param config: Kelas Config (topik data dan topik respons registrasi)
+    :param whitelist: Set perangkat terdaftar (mendukung `in` dan add())
+    :param device_gate: DeviceGate untuk penolakan perangkat tidak dikenal
+    :param dashboard: Objek dengan add(payload), mis. RedisPublishBatcher
+    :param heartbeats: Objek dengan update(device_id, fw_version, rssi), mis. HeartbeatAggregator
+    :param write: Fungsi penulis data point ke InfluxDB (write_data)
+    :param tracker: CommandTracker untuk ack perintah / registrasi (opsional)
+    :param latest: LatestValueStore untuk nilai terakhir per perangkat (opsional)
+    """
+
+    def __init__(self, config, whitelist, device_gate, dashboard, heartbeats, write, logger=None, tracker=None,
+                 latest=None):
+        self.config = config
+        self.whitelist = whitelist
+        self.device_gate = device_gate
+        self.dashboard = dashboard
+        self.heartbeats = heartbeats
+        self.write = write
+        self.logger = logger or logging.getLogger("MQTTWorker")
+        self.tracker = tracker
+        self.latest = latest
+
+    def topic_device_id(self, topic):
+        """device_id dari topik per perangkat (iot/waterlevel/SIM-01[/format]), atau None."""
+        return split_device_topic(split_topic(topic)[0], self.config.MQTT_TOPIC_WATERLEVEL)[1]
+
+    def admit_topic(self, topic):
+        """
+        Topik per perangkat: tolak ID tidak dikenal sebelum antri dan sebelum decode payload.
+        Dipanggil dari thread jaringan MQTT, sehingga hanya memakai whitelist lokal dan negative
+        cache; lookup Redis untuk ID yang belum diputuskan dilakukan di handle() (worker ingest).
+        """
+        device_id = self.topic_device_id(topic)
+        return device_id is None or self.device_gate.admit(device_id, before_decode=True, local_only=True)
+
+    def handle(self, topic, raw_payload):
+        config = self.config
+        try:
+            # JSON, MessagePack, atau CBOR (dari suffix topik atau byte pertama payload)
+            payload = decode_payload(raw_payload, topic)
+            topic, topic_device_id = split_device_topic(split_topic(topic)[0], config.MQTT_TOPIC_WATERLEVEL)
+            device_id = payload.get("device_id") or payload.get("sensor_id")
+            if topic_device_id is not None:
+                # Payload tidak boleh mengaku perangkat lain; ID topik diotorisasi penuh di bawah
+                if device_id and device_id != topic_device_id:
+                    self.logger.warning(f"⛔ device_id payload ({device_id}) tidak cocok dengan topik "
+                                        f"({topic_device_id}). Pesan ditolak.")
+                    return
+                device_id = payload["device_id"] = topic_device_id
+
+            # --- Logika untuk Respons Registrasi ---
+            if topic == config.REGISTRATION_RESPONSE_TOPIC:
+                if self.tracker is not None:
+                    self.tracker.acked(payload.get("command_id"), device_id, payload.get("status"),
+                                       payload.get("message"))
+                if payload.get("status") == "success" and device_id:
+                    self.whitelist.add(device_id)
+                    self.device_gate.forget((device_id,))
+                    self.logger.info(f"✅ (Whitelist) Perangkat {device_id} berhasil terdaftar via MQTT.")
+                else:
+                    self.logger.warning(f"Registrasi MQTT gagal: {payload.get('message')}")
+                return
+
+            # --- Ack perintah dari perangkat: {"command_id", "status", "message"} ---
+            if self.tracker is not None and topic_matches_sub(config.MQTT_TOPIC_COMMAND_ACK, topic):
+                self.tracker.acked(payload.get("command_id"), device_id, payload.get("status"), payload.get("message"),
+                                   fanout_id=payload.get("fanout_id"))
+                return
+
+            # --- Logika untuk Data Sensor ---
+            if not device_id:
+                self.logger.warning("❌ Payload tidak ada device_id. Diabaikan.")
+                return
+
+            # ID dari topik yang lolos admit_topic() tanpa lookup Redis diputuskan di sini
+            if not self.device_gate.admit(device_id):
+                return
+
+            if topic == config.MQTT_TOPIC_WATERLEVEL:
+                # 1. Tulis ke InfluxDB; nilai terakhir dicatat dengan timestamp yang sama untuk /latest
+                # (tetap diperbarui walau buffer InfluxDB penuh, agar dashboard tidak melihat nilai basi)
+                timestamp_ns = time.time_ns()
+                self.write(payload, timestamp_ns)
+                if self.latest is not None:
+                    self.latest.update(device_id, payload.get("water_level"), timestamp_ns)
+                # 2. Teruskan data ke Dashboard (via Redis)
+                self.dashboard.add(payload)
+                self.logger.info(f"Menerima data dari {device_id} dan meneruskannya ke dashboard.")
+                # 3. Catat heartbeat (dikirim ke Laravel secara berkala oleh aggregator)
+                self.heartbeats.update(device_id, payload.get("fw_version"), payload.get("rssi"))
+
+                self.logger.info(f"Data diproses untuk {device_id} (Ver: {payload.get('fw_version')})")
+
+        except Exception as e:
+            self.logger.error(f"❌ Error memproses pesan MQTT: {e}", exc_info=True)
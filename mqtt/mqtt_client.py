@@ -1,14 +1,15 @@
 # File: helper/mqtt_helper.py (atau di mana pun Anda meletakkannya)
 
-import json
 import logging
 import paho.mqtt.client as mqtt
 import threading
-import time
-from queue import Queue
-import requests
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from config.settings import Config
 from influxdb.influxdb_helper import write_data
+from helper import json_codec
+from helper.whitelist_sync import WhitelistSync
+from helper.payload_codec import decode_payload, split_topic, FORMAT_MSGPACK, FORMAT_CBOR
 
 # Setup logging di level modul
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
@@ -20,11 +21,17 @@ class MQTTHelper:
         # --- State sekarang menjadi instance attributes, bukan global ---
         self.client = None
         self.is_running = False
-        self.whitelist_cache = set()
+        # Incrementally synced whitelist (ETag / since=version deltas), lock-free lookups
+        self.whitelist_cache = WhitelistSync(
+            url=Config.WHITELIST_API_URL,
+            min_interval=Config.WHITELIST_SYNC_MIN_INTERVAL,
+            max_interval=Config.WHITELIST_SYNC_MAX_INTERVAL,
+        )
         
-        # Untuk mekanisme request/response
-        self.response_queue = Queue()
-        self.register_event = threading.Event()
+        # Untuk mekanisme request/response: satu Future per registrasi yang sedang berjalan,
+        # dicari lewat command_id (jika perangkat mengembalikannya) atau device_id
+        self._pending = {}
+        self._pending_lock = threading.Lock()
         # --- PENAMBAHAN: Variabel untuk mengontrol thread refresh ---
         self.refresh_thread = None
 
@@ -34,6 +41,8 @@ class MQTTHelper:
             self.logger.info("✅ MQTT Connected Successfully!")
             client.subscribe([
                 (Config.MQTT_TOPIC_WATERLEVEL, 0),
+                (f"{Config.MQTT_TOPIC_WATERLEVEL}/{FORMAT_MSGPACK}", 0),
+                (f"{Config.MQTT_TOPIC_WATERLEVEL}/{FORMAT_CBOR}", 0),
                 (Config.MQTT_TOPIC_STATUS, 1),
                 (Config.REGISTRATION_RESPONSE_TOPIC, 0)
             ])
@@ -43,12 +52,13 @@ class MQTTHelper:
 
     def on_message(self, client, userdata, msg):
         try:
-            payload = json.loads(msg.payload.decode())
+            # JSON for legacy devices, MessagePack/CBOR detected by topic suffix or first byte
+            payload = decode_payload(msg.payload, msg.topic)
+            topic = split_topic(msg.topic)[0]
             
-            if msg.topic == Config.REGISTRATION_RESPONSE_TOPIC:
+            if topic == Config.REGISTRATION_RESPONSE_TOPIC:
                 self.logger.info(f"📥 Registration response received: {payload}")
-                self.response_queue.put(payload)
-                self.register_event.set()
+                self._resolve_registration(payload)
                 return
 
             device_id = payload.get("device_id") or payload.get("sensor_id")
@@ -60,7 +70,7 @@ class MQTTHelper:
                 self.logger.warning(f"⛔ Unauthorized device ID: {device_id}. Message rejected.")
                 return
 
-            if msg.topic == Config.MQTT_TOPIC_WATERLEVEL:
+            if topic == Config.MQTT_TOPIC_WATERLEVEL:
                 # Disarankan untuk memanggil fungsi write_data di sini jika ini adalah 'jembatan'
                 response = write_data(payload)
                 if response is None:
@@ -118,23 +128,13 @@ class MQTTHelper:
             self.client.loop_stop()
             self.client.disconnect()
         self.is_running = False
+        self.whitelist_cache.wake()
         self.logger.info("MQTT Client stopped.")
 
     # --- Bagian Metode Fungsional ---
     def load_whitelist_from_backend(self):
-        # PERBAIKAN: Gunakan URL dari Config
-        backend_url = Config.WHITELIST_API_URL 
-        try:
-            self.logger.info("⏳ Requesting whitelist from backend...")
-            response = requests.get(backend_url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                self.whitelist_cache = set(data.get("device_ids", []))
-                self.logger.info(f"✅ Whitelist loaded successfully. Total devices: {len(self.whitelist_cache)}")
-            else:
-                self.logger.error(f"❌ Failed to fetch whitelist. Status: {response.status_code}")
-        except requests.RequestException as e:
-            self.logger.error(f"❌ Error fetching whitelist: {e}")
+        """Conditional sync: only changes since the last known version are downloaded."""
+        return self.whitelist_cache.sync()
 
     def publish_register_device(self, device_id: str, payload: dict, timeout=15):
         if not self.is_running or not self.client:
@@ -144,26 +144,53 @@ class MQTTHelper:
             self.logger.warning(f"Device {device_id} is already in whitelist cache.")
             return {"status": "ignored", "message": "Device already registered"}
 
-        # Bersihkan event & queue sebelum request baru
-        self.register_event.clear()
-        while not self.response_queue.empty():
-            self.response_queue.get()
-            
-        # Publish
-        topic = Config.REGISTRATION_REQUEST_TOPIC
-        self.client.publish(topic, json.dumps(payload))
-        self.logger.info(f"📡 Published registration command for {device_id}")
-
-        # Tunggu response
-        if self.register_event.wait(timeout=timeout):
-            response = self.response_queue.get()
-            if response.get("device_id") == device_id:
-                self.whitelist_cache.add(device_id)
-                self.logger.info(f"✅ Registration successful for {device_id}")
-                return response
-        
-        self.logger.error(f"⏰ Timeout waiting for registration response from {device_id}")
-        return None
+        # Registrasi yang sama sedang berjalan: ikut menunggu respons yang sama, jangan publish ulang
+        with self._pending_lock:
+            future = self._pending.get(device_id)
+            owner = future is None
+            if owner:
+                request_id = payload.get("command_id") or uuid.uuid4().hex
+                future = Future()
+                self._pending[device_id] = self._pending[request_id] = future
+
+        try:
+            if owner:
+                # Publish
+                topic = Config.REGISTRATION_REQUEST_TOPIC
+                self.client.publish(topic, json_codec.dumps({**payload, "command_id": request_id}))
+                self.logger.info(f"📡 Published registration command for {device_id}")
+
+            # Tunggu response milik perangkat ini saja
+            response = future.result(timeout=timeout)
+        except FutureTimeout:
+            self.logger.error(f"⏰ Timeout waiting for registration response from {device_id}")
+            return None
+        finally:
+            if owner:
+                with self._pending_lock:
+                    self._pending.pop(device_id, None)
+                    self._pending.pop(request_id, None)
+
+        self.whitelist_cache.add(device_id)
+        self.logger.info(f"✅ Registration successful for {device_id}")
+        return response
+
+    def _resolve_registration(self, payload):
+        """Menyelesaikan Future registrasi yang cocok (command_id lebih dulu, lalu device_id)."""
+        with self._pending_lock:
+            future = self._pending.get(payload.get("command_id")) or self._pending.get(payload.get("device_id"))
+        if future is None:
+            self.logger.warning(f"⚠️ Registration response without pending request: {payload.get('device_id')}")
+            return False
+        if not future.done():
+            future.set_result(payload)
+        return True
+
+    def pending_registrations(self):
+        """Jumlah perangkat yang registrasinya masih menunggu respons."""
+        with self._pending_lock:
+            return len({id(future) for future in self._pending.values()})
+
         # --- PERBAIKAN: Fungsi refresh sekarang berjalan dalam loop ---
     def _periodic_whitelist_refresh_loop(self):
         """Fungsi ini dimaksudkan untuk dijalankan di thread terpisah."""
@@ -171,8 +198,8 @@ class MQTTHelper:
         while self.is_running:
             self.logger.info("🔄 Refreshing whitelist from background thread...")
             self.load_whitelist_from_backend()
-            # Gunakan time.sleep() untuk interval
-            time.sleep(3600) # Tunggu 1 jam
+            # Adaptive interval; woken early by whitelist_cache.invalidate()
+            self.whitelist_cache.wait()
         self.logger.info("Background whitelist refresh thread stopped.")
     
     def publish_command(self, device_id: str, payload: dict):
@@ -183,7 +210,7 @@ class MQTTHelper:
             raise PermissionError(f"Device {device_id} is not whitelisted.")
 
         topic = f"{Config.MQTT_BASE_TOPIC_COMMAND}/{device_id}"
-        self.client.publish(topic, json.dumps(payload))
+        self.client.publish(topic, json_codec.dumps(payload))
         self.logger.info(f"📡 Command published to {device_id} on topic {topic}")
 
 
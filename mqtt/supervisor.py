@@ -0,0 +1,199 @@
+"""Supervisor multi-proses untuk MQTT Worker: fork N proses, health check, restart, dan statistik gabungan."""
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+logger = logging.getLogger("WorkerSupervisor")
+
+
+def aggregate_stats(stats_list):
+    """
+    Menggabungkan statistik beberapa worker: nilai numerik dijumlahkan, kecuali kunci
+    berawalan 'max' yang diambil maksimumnya. Nilai non-numerik diabaikan.
+    """
+    result = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                result[key] = aggregate_stats([result.get(key, {}), value])
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key.startswith("max"):
+                    result[key] = max(result.get(key, value), value)
+                else:
+                    result[key] = result.get(key, 0) + value
+    return result
+
+
+def _child_main(target, index, reports):
+    # Proses hasil fork mewarisi handler sinyal supervisor; kembalikan ke default
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    target(index, reports)
+
+
+class _Slot:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started_at = 0.0
+        self.last_report = 0.0
+        self.stats = {}
+        self.restarts = 0
+        self.restart_delay = 0.0
+        self.restart_at = None
+
+
+class WorkerSupervisor:
+    """
+    Menjalankan `target(index, report_queue)` di N proses terpisah (satu GIL per proses).
+
+    Setiap worker melapor (index, pid, stats) secara berkala ke report_queue; laporan ini
+    menjadi health check. Proses yang mati di-restart dengan backoff eksponensial jika
+    crash berulang dalam waktu singkat, dan proses yang tidak melapor lebih dari
+    health_timeout detik dianggap hang lalu dihentikan dan di-restart.
+    """
+
+    def __init__(self, target, processes, health_timeout=30, startup_grace=60, stats_interval=60,
+                 min_restart_delay=1.0, max_restart_delay=60.0, stable_after=30.0, on_stats=None,
+                 start_method="fork"):
+        if processes < 1:
+            raise ValueError("processes minimal 1")
+        self.target = target
+        self.health_timeout = health_timeout
+        self.startup_grace = startup_grace
+        self.stats_interval = stats_interval
+        self.min_restart_delay = min_restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.on_stats = on_stats
+
+        self._ctx = multiprocessing.get_context(start_method)
+        self._reports = self._ctx.Queue()
+        self._slots = [_Slot(i) for i in range(processes)]
+        self._running = False
+        self._last_stats_log = time.monotonic()
+
+    # --- Siklus hidup proses ---
+    def _spawn(self, slot):
+        slot.process = self._ctx.Process(target=_child_main, args=(self.target, slot.index, self._reports),
+                                         name=f"mqtt-worker-{slot.index}", daemon=False)
+        slot.process.start()
+        slot.started_at = slot.last_report = time.monotonic()
+        slot.restart_at = None
+        logger.info(f"🚀 Worker #{slot.index} dimulai (PID {slot.process.pid}).")
+
+    def _schedule_restart(self, slot, reason):
+        now = time.monotonic()
+        if now - slot.started_at < self.stable_after:
+            # Crash beruntun: perlambat restart agar tidak menghabiskan CPU / membanjiri broker
+            slot.restart_delay = min(max(slot.restart_delay * 2, self.min_restart_delay), self.max_restart_delay)
+        else:
+            slot.restart_delay = self.min_restart_delay
+        slot.restart_at = now + slot.restart_delay
+        slot.restarts += 1
+        slot.process = None
+        logger.warning(f"⚠️ Worker #{slot.index} {reason}. Restart dalam {slot.restart_delay:.0f} detik.")
+
+    def _terminate(self, process, timeout=10):
+        if process is None or not process.is_alive():
+            return
+        process.terminate()  # SIGTERM: worker menjalankan stop() dan flush data
+        process.join(timeout)
+        if process.is_alive():
+            logger.error(f"❌ PID {process.pid} tidak berhenti, dipaksa kill.")
+            process.kill()
+            process.join(1)
+
+    # --- Health check & laporan ---
+    def _drain_reports(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                index, pid, stats = self._reports.get(timeout=remaining)
+            except queue.Empty:
+                return
+            slot = self._slots[index]
+            # Laporan dari proses lama (sebelum restart) diabaikan
+            if slot.process is not None and slot.process.pid == pid:
+                slot.last_report = time.monotonic()
+                slot.stats = stats
+
+    def check(self):
+        """Satu putaran health check: restart proses mati/hang dan mulai yang terjadwal."""
+        now = time.monotonic()
+        for slot in self._slots:
+            process = slot.process
+            if process is None:
+                if slot.restart_at is not None and now >= slot.restart_at:
+                    self._spawn(slot)
+                continue
+            if not process.is_alive():
+                self._schedule_restart(slot, f"berhenti (exit code {process.exitcode})")
+            elif now - slot.last_report > self.health_timeout and now - slot.started_at > self.startup_grace:
+                logger.error(f"❌ Worker #{slot.index} tidak melapor selama {now - slot.last_report:.0f} detik.")
+                self._terminate(process)
+                self._schedule_restart(slot, "hang")
+
+    def get_stats(self):
+        alive = [s for s in self._slots if s.process is not None and s.process.is_alive()]
+        return {
+            "processes": len(self._slots),
+            "alive": len(alive),
+            "restarts": sum(s.restarts for s in self._slots),
+            "workers": [
+                {"index": s.index, "pid": s.process.pid if s.process else None, "restarts": s.restarts,
+                 "last_report_age": round(time.monotonic() - s.last_report, 1) if s.process else None}
+                for s in self._slots
+            ],
+            "totals": aggregate_stats([s.stats for s in self._slots if s.stats]),
+        }
+
+    def _maybe_log_stats(self):
+        if time.monotonic() - self._last_stats_log < self.stats_interval:
+            return
+        self._last_stats_log = time.monotonic()
+        stats = self.get_stats()
+        logger.info(f"📊 Supervisor: {stats['alive']}/{stats['processes']} worker hidup, "
+                    f"{stats['restarts']} restart. Total: {stats['totals']}")
+        if self.on_stats:
+            try:
+                self.on_stats(stats)
+            except Exception as e:
+                logger.debug(f"Gagal meneruskan statistik supervisor: {e}")
+
+    # --- Main loop ---
+    def run(self, poll_interval=1.0):
+        """Menjalankan semua worker dan mengawasinya sampai stop() / SIGTERM / SIGINT."""
+        self._running = True
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop())
+
+        logger.info(f"🧭 Supervisor (PID {os.getpid()}) menjalankan {len(self._slots)} proses MQTT Worker.")
+        for slot in self._slots:
+            self._spawn(slot)
+        try:
+            while self._running:
+                self._drain_reports(poll_interval)
+                if self._running:
+                    self.check()
+                    self._maybe_log_stats()
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._running = False
+
+    def shutdown(self):
+        logger.info("🛑 Supervisor menghentikan semua worker...")
+        for slot in self._slots:
+            if slot.process is not None and slot.process.is_alive():
+                slot.process.terminate()
+        for slot in self._slots:
+            self._terminate(slot.process)
+        logger.info(f"Supervisor berhenti. Statistik terakhir: {self.get_stats()['totals']}")
@@ -0,0 +1,176 @@
+# File: tests/test_async_worker.py
+
+import asyncio
+import json
+
+from helper.async_io import AsyncHeartbeatAggregator, AsyncPublishBatcher
+from mqtt.async_worker import AsyncMQTTWorker
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+    async def execute(self):
+        self.redis_client.executed.extend(self.calls)
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.published = []
+        self.executed = []
+        self.keys = {}
+        self.members = set()
+
+    async def publish(self, channel, data):
+        self.published.append((channel, data))
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    async def sismember(self, key, member):
+        return member in self.members
+
+    async def eval(self, script, numkeys, key, owner, *args):
+        return 1 if self.keys.get(key) == owner else 0
+
+    async def hgetall(self, key):
+        return {}
+
+    async def smembers(self, key):
+        return set(self.members)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(f"HTTP {self.status_code}")
+
+
+class FakeHTTP:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.active = self.max_active = 0
+        self.posts = []
+
+    async def post(self, url, json=None, timeout=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        self.posts.append(url)
+        return FakeResponse(500 if any(device_id in url for device_id in self.failing) else 200)
+
+
+class FakeMQTT:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+
+def test_publish_batcher_sends_one_envelope():
+    """Tes 1: Pembacaan dalam satu jendela max_delay dikirim sebagai satu envelope."""
+    async def scenario():
+        redis_client = FakeAsyncRedis()
+        batcher = AsyncPublishBatcher(redis_client, "data_for_dashboard", max_delay=0.01)
+        task = asyncio.create_task(batcher.run())
+        for i in range(5):
+            batcher.add({"device_id": f"s{i}"})
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return redis_client, batcher
+
+    redis_client, batcher = asyncio.run(scenario())
+    assert len(redis_client.published) == 1
+    assert len(json.loads(redis_client.published[0][1])["readings"]) == 5
+    assert batcher.get_stats()["batches"] == 1
+
+
+def test_heartbeats_are_bounded_coroutines():
+    """Tes 2: Heartbeat per perangkat dikirim paralel dengan batas concurrency; yang gagal diantrikan lagi."""
+    http = FakeHTTP(failing={"s3"})
+    aggregator = AsyncHeartbeatAggregator(http, "http://laravel/api/iot", concurrency=4)
+    for i in range(20):
+        aggregator.update(f"s{i}", "1.0", -50)
+
+    sent = asyncio.run(aggregator.flush())
+
+    assert sent == 19
+    assert http.max_active == 4
+    assert aggregator.get_stats()["pending"] == 1
+
+
+def test_command_is_claimed_once_and_published():
+    """Tes 3: Perintah pub/sub lama ke perangkat terdaftar hanya diteruskan oleh instance yang mengklaimnya."""
+    async def scenario():
+        redis_client = FakeAsyncRedis()
+        first = AsyncMQTTWorker(redis_client=redis_client, http_client=FakeHTTP())
+        second = AsyncMQTTWorker(redis_client=redis_client, http_client=FakeHTTP())
+        for worker in (first, second):
+            worker.client = FakeMQTT()
+            worker.whitelist.replace({"s1"}, notify=False)
+        raw = json.dumps({"type": "command", "command_id": "c1", "device_id": "s1",
+                          "topic": "iot/sensor/s1/command", "payload": {"action": "reset"}})
+        await first._handle_redis_command(raw)
+        await second._handle_redis_command(raw)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.client.published == [("iot/sensor/s1/command", {"action": "reset", "command_id": "c1"})]
+    assert second.client.published == []
+
+
+def test_unknown_topic_device_is_looked_up_in_redis():
+    """Tes 4: Perangkat yang hanya ada di set Redis bersama diloloskan lewat lookup async."""
+    async def scenario():
+        redis_client = FakeAsyncRedis()
+        redis_client.members.add("baru")
+        worker = AsyncMQTTWorker(redis_client=redis_client, http_client=FakeHTTP())
+        worker.handler.write = lambda payload, timestamp_ns=None: None
+        await worker._on_message("iot/waterlevel/baru", json.dumps({"water_level": 3}).encode())
+        await worker._on_message("iot/waterlevel/intruder", json.dumps({"water_level": 3}).encode())
+        return worker
+
+    worker = asyncio.run(scenario())
+    stats = worker.get_stats()
+    assert "baru" in worker.whitelist
+    assert stats["ingest"]["processed"] == 1
+    assert stats["rejections"]["rejected_before_decode"] == 1
+    assert stats["heartbeat"]["received"] == 1
+
+
+def test_whitelist_leader_and_updates_use_shared_replica_logic():
+    """Tes 5: Engine asyncio memakai logika leader dan pesan whitelist yang sama dengan SharedWhitelist."""
+    async def scenario():
+        redis_client = FakeAsyncRedis()
+        first = AsyncMQTTWorker(redis_client=redis_client, http_client=FakeHTTP())
+        second = AsyncMQTTWorker(redis_client=redis_client, http_client=FakeHTTP())
+        elected = (await first._elect(), await second._elect(), await first._elect())
+
+        await first._write_devices({"s9"}, set(), publish=True)
+        raw = next(args[1] for name, args in redis_client.executed if name == "publish")
+        first._handle_whitelist_update(raw)
+        second._handle_whitelist_update(raw)
+        return elected, first, second
+
+    elected, first, second = asyncio.run(scenario())
+    assert elected == (True, False, True)
+    assert "s9" in second.whitelist and "s9" not in first.whitelist
+    assert first.get_stats()["whitelist"]["leader"] is True
+    assert second.get_stats()["whitelist"]["remote_updates"] == 1
+    assert first.get_stats()["whitelist"]["remote_updates"] == 0
@@ -0,0 +1,91 @@
+# File: tests/test_batch_writer.py
+
+import gzip
+import time
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+
+from influxdb.batch_writer import BatchWriter
+
+
+@pytest.fixture
+def session():
+    session = MagicMock()
+    session.post.return_value = MagicMock(status_code=204)
+    return session
+
+
+def make_writer(session, **kwargs):
+    return BatchWriter("http://influx:8086", "token", "org", "bucket", session=session, **kwargs)
+
+
+def sent_lines(call):
+    return gzip.decompress(call.kwargs["data"]).decode().split("\n")
+
+
+def test_flush_sends_gzip_batches_by_size(session):
+    """Tes 1: flush() memecah buffer sesuai max_batch_size dan mengirim body gzip."""
+    writer = make_writer(session, max_batch_size=2)
+    for i in range(5):
+        assert writer.write(f"m,device_id=d{i} water_level={i}")
+
+    writer.flush()
+
+    assert session.post.call_count == 3
+    first = session.post.call_args_list[0]
+    assert first.kwargs["headers"]["Content-Encoding"] == "gzip"
+    assert sent_lines(first) == ["m,device_id=d0 water_level=0", "m,device_id=d1 water_level=1"]
+    stats = writer.get_stats()
+    assert stats["points_written"] == 5
+    assert stats["batches_written"] == 3
+
+
+def test_background_flush_on_linger(session):
+    """Tes 2: Batch yang belum penuh tetap dikirim setelah waktu linger."""
+    writer = make_writer(session, linger=0.05)
+    writer.start()
+    writer.write("m value=1")
+    time.sleep(0.3)
+
+    assert session.post.call_count == 1
+    writer.stop()
+
+
+def test_backpressure_when_buffer_full(session):
+    """Tes 3: write() ditolak saat buffer penuh dan dihitung sebagai dropped."""
+    writer = make_writer(session, max_buffer_points=2)
+    assert writer.write("m value=1")
+    assert writer.write("m value=2")
+
+    assert writer.is_backpressured
+    assert writer.write("m value=3") is False
+    assert writer.get_stats()["points_dropped"] == 1
+
+
+@patch("influxdb.batch_writer.time.sleep")
+def test_retries_transient_errors(mock_sleep, session):
+    """Tes 4: Error sementara dicoba ulang dengan backoff sampai berhasil."""
+    session.post.side_effect = [requests.ConnectionError("down"), MagicMock(status_code=503),
+                                MagicMock(status_code=204)]
+    writer = make_writer(session, max_retries=3)
+    writer.write("m value=1")
+
+    writer.flush()
+
+    assert session.post.call_count == 3
+    assert mock_sleep.call_count == 2
+    assert writer.get_stats()["retries"] == 2
+    assert writer.get_stats()["points_written"] == 1
+
+
+def test_client_error_is_not_retried(session):
+    """Tes 5: Error 4xx (mis. line protocol salah) tidak dicoba ulang."""
+    session.post.return_value = MagicMock(status_code=400, text="bad line")
+    writer = make_writer(session, max_retries=3)
+    writer.write("m value=")
+
+    writer.flush()
+
+    assert session.post.call_count == 1
+    assert writer.get_stats()["batches_failed"] == 1
@@ -0,0 +1,151 @@
+# File: tests/test_bulk_registration.py
+
+import json
+
+import pytest
+import redis
+from flask import Flask
+
+from api.iot import endpoints
+from helper.command_bus import COMMAND_STREAM
+from helper.form_validation import validate_entries
+from helper.json_formatter import FastJSONProvider
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        self.redis_client.executions += 1
+        return [getattr(self.redis_client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeStreamRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.stream = []
+        self.executions = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def expire(self, key, ttl):
+        return True
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.stream.append((stream, json.loads(fields["data"])))
+
+
+def device(device_id, **overrides):
+    return {"device_id": device_id, "device_token": "t", "warning_level": 10, "danger_level": 20,
+            "sensor_height": 100, **overrides}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis_client = FakeStreamRedis()
+    monkeypatch.setattr(endpoints, "redis_client", redis_client)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(endpoints.iotdevice, url_prefix="/api/iot")
+    test_client = app.test_client()
+    test_client.redis = redis_client
+    return test_client
+
+
+def test_validate_entries_single_pass():
+    """Tes 1: Entri tidak lengkap, bukan objek, dan device_id ganda dilaporkan per indeks."""
+    valid, errors = validate_entries([device("a"), device("b", device_token=""), "x", device("a")],
+                                     ["device_id", "device_token"], "device_id")
+    assert valid == [{"device_id": "a", "device_token": "t"}]
+    assert [(e["index"], e["error"]) for e in errors] == [
+        (1, "Missing required field: device_token"), (2, "Entry must be an object"),
+        (3, "Duplicate device_id in request")]
+
+
+def test_bulk_array_is_dispatched_in_one_round_trip(client):
+    """Tes 2: Array 500 perangkat dikirim dalam satu pipeline; hasil per perangkat dan batch_id dikembalikan."""
+    devices = [device(f"s{i}") for i in range(500)] + [device("", device_token="t")]
+    response = client.post("/api/iot/register-devices", json=devices)
+
+    data = response.get_json()["data"]
+    assert response.status_code == 202
+    assert client.redis.executions == 1
+    assert len(client.redis.stream) == 500
+    assert all(stream == COMMAND_STREAM and m["type"] == "register_device" for stream, m in client.redis.stream)
+    assert len(data["accepted"]) == 500
+    assert data["rejected"][0]["index"] == 500
+
+    status = client.get(f"/api/iot/register-devices/{data['batch_id']}").get_json()["data"]
+    assert status["total"] == 500
+    assert status["summary"] == {"queued": 500}
+    assert status["devices"]["s7"]["command_id"] == data["accepted"][7]["command_id"]
+
+
+def test_bulk_ndjson_and_invalid_bodies(client):
+    """Tes 3: Body NDJSON diterima; baris rusak ditolak per nomor baris asli; body tanpa perangkat valid -> 400."""
+    body = "\n".join([json.dumps(device("n1")), "", "{rusak", json.dumps(device("n2"))])
+    response = client.post("/api/iot/register-devices", data=body, content_type="application/x-ndjson")
+    data = response.get_json()["data"]
+    assert response.status_code == 202
+    assert [a["device_id"] for a in data["accepted"]] == ["n1", "n2"]
+    assert data["rejected"][0]["index"] == 2  # baris kosong ikut dihitung
+
+    assert client.post("/api/iot/register-devices", json={"devices": []}).status_code == 400
+    assert client.post("/api/iot/register-devices", json={"foo": 1}).status_code == 400
+    assert client.get("/api/iot/register-devices/tidak-ada").status_code == 404
+
+
+def test_oversized_body_is_rejected_before_parsing(client, monkeypatch):
+    """Tes 4: Body di atas BULK_REGISTRATION_MAX_BYTES -> 413 tanpa di-parse."""
+    monkeypatch.setattr(endpoints.Config, "BULK_REGISTRATION_MAX_BYTES", 1024)
+    monkeypatch.setattr(endpoints, "_bulk_entries", lambda body: pytest.fail("body besar tidak boleh di-parse"))
+    response = client.post("/api/iot/register-devices", json=[device(f"s{i}") for i in range(50)])
+    assert response.status_code == 413
+    assert client.redis.stream == []
+
+
+def test_redis_failure_returns_503_json(client, monkeypatch):
+    """Tes 5: Redis gagal -> 503 dengan body JSON standar; field wajib kosong -> 400."""
+    def fail(*args, **kwargs):
+        raise redis.ConnectionError("down")
+
+    monkeypatch.setattr(endpoints, "publish_command", fail)
+    requests = [
+        ("post", "/api/iot/register-device", device("a")),
+        ("post", "/api/iot/threshold", {"sensor_id": "a", "warning_level": 1, "danger_level": 2, "sensor_height": 3}),
+        ("patch", "/api/iot/a/change-status", {"cmd": "OTA_UPDATE"}),
+    ]
+    for method, url, body in requests:
+        response = getattr(client, method)(url, json=body)
+        assert response.status_code == 503
+        assert response.get_json()["status"] is False
+
+    assert client.post("/api/iot/register-device", json={"device_id": "a"}).status_code == 400
+
+
+def test_non_string_device_id_is_rejected_per_entry(client):
+    """Tes 6: device_id berupa list/dict ditolak sebagai entri tidak valid, bukan error 500."""
+    valid, errors = validate_entries([device(["a"]), device({"x": 1}), device(7), device("ok")],
+                                     ["device_id", "device_token"], "device_id")
+    assert valid == [{"device_id": "ok", "device_token": "t"}]
+    assert [(e["index"], e["device_id"], e["error"]) for e in errors] == [
+        (0, None, "device_id must be a string"), (1, None, "device_id must be a string"),
+        (2, None, "device_id must be a string")]
+
+    response = client.post("/api/iot/register-devices", json=[device(["a"]), device("ok")])
+    data = response.get_json()["data"]
+    assert response.status_code == 202
+    assert [a["device_id"] for a in data["accepted"]] == ["ok"]
+    assert data["rejected"][0]["index"] == 0
@@ -0,0 +1,172 @@
+# File: tests/test_command_bus.py
+
+import json
+import time
+from unittest.mock import MagicMock
+
+from helper.command_bus import (CLAIM_KEY_PREFIX, COMMAND_CHANNEL, COMMAND_STREAM, DEAD_LETTER_STREAM,
+                                CommandStreamConsumer, claim_command, publish_command)
+
+
+class FakeStreamRedis:
+    """Stream + consumer group di memori, cukup untuk perilaku XREADGROUP/XACK/XPENDING/XCLAIM."""
+
+    def __init__(self):
+        self.entries = []
+        self.pending = {}  # id -> {"consumer", "times_delivered"}
+        self.delivered = set()
+        self.dead = []
+        self.ack_calls = 0
+        self.states = {}
+        self._seq = 0
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True, id=None):
+        if stream == DEAD_LETTER_STREAM:
+            self.dead.append(fields)
+            return None
+        self._seq += 1
+        entry_id = id or f"{int(time.time() * 1000)}-{self._seq}"
+        self.entries.append((entry_id, fields))
+        return entry_id
+
+    def xgroup_create(self, stream, group, id="0", mkstream=False):
+        return True
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        batch = [e for e in self.entries if e[0] not in self.delivered][:count]
+        for entry_id, _ in batch:
+            self.delivered.add(entry_id)
+            self.pending[entry_id] = {"consumer": consumer, "times_delivered": 1}
+        return [[COMMAND_STREAM, batch]] if batch else []
+
+    def xack(self, stream, group, *ids):
+        self.ack_calls += 1
+        for entry_id in ids:
+            self.pending.pop(entry_id, None)
+        return len(ids)
+
+    def xpending_range(self, stream, group, min, max, count, idle=None):
+        return [{"message_id": entry_id, "consumer": p["consumer"], "time_since_delivered": idle,
+                 "times_delivered": p["times_delivered"]} for entry_id, p in list(self.pending.items())[:count]]
+
+    def xclaim(self, stream, group, consumer, min_idle_time, ids):
+        claimed = []
+        for entry_id, fields in self.entries:
+            if entry_id in ids and entry_id in self.pending:
+                self.pending[entry_id] = {"consumer": consumer,
+                                          "times_delivered": self.pending[entry_id]["times_delivered"] + 1}
+                claimed.append((entry_id, fields))
+        return claimed
+
+    def xinfo_consumers(self, stream, group):
+        return []
+
+    def hset(self, key, mapping=None):
+        self.states.setdefault(key, {}).update(mapping or {})
+
+    def expire(self, key, ttl):
+        return True
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+def test_publish_assigns_command_id():
+    """Tes 1: Setiap perintah mendapat command_id unik dan perintah ke perangkat masuk ke stream."""
+    redis_client = MagicMock()
+    first = publish_command(redis_client, {"type": "command", "device_id": "s1"})
+    second = publish_command(redis_client, {"type": "command", "device_id": "s1"})
+
+    assert first != second
+    stream, fields = redis_client.pipeline.return_value.xadd.call_args.args
+    assert stream == COMMAND_STREAM
+    assert json.loads(fields["data"])["command_id"] == second
+    redis_client.publish.assert_not_called()
+
+    publish_command(redis_client, {"type": "whitelist_invalidate"})
+    assert redis_client.publish.call_args.args[0] == COMMAND_CHANNEL
+
+
+def test_only_one_instance_claims_a_command():
+    """Tes 2: Perintah eksklusif hanya diklaim satu instance (SET NX pada command_id)."""
+    claimed = {}
+
+    def fake_set(key, value, nx, px):
+        if key in claimed:
+            return None
+        claimed[key] = value
+        return True
+
+    redis_client = MagicMock()
+    redis_client.set.side_effect = fake_set
+    message = {"type": "command", "command_id": "abc"}
+
+    assert claim_command(redis_client, message, "worker-1") is True
+    assert claim_command(redis_client, message, "worker-2") is False
+    assert claimed == {CLAIM_KEY_PREFIX + "abc": "worker-1"}
+
+
+def test_broadcast_and_legacy_messages_are_not_claimed():
+    """Tes 3: whitelist_invalidate dan pesan lama tanpa command_id diproses semua instance."""
+    redis_client = MagicMock()
+    assert claim_command(redis_client, {"type": "whitelist_invalidate", "command_id": "x"}, "w") is True
+    assert claim_command(redis_client, {"type": "command"}, "w") is True
+    redis_client.set.assert_not_called()
+
+
+def test_stream_commands_reach_exactly_one_consumer_in_batches():
+    """Tes 4: Dua worker berbagi consumer group; setiap perintah diproses sekali dan di-ack per batch."""
+    redis_client = FakeStreamRedis()
+    for i in range(250):
+        publish_command(redis_client, {"type": "command", "device_id": f"s{i}"})
+
+    handled = []
+    consumers = [CommandStreamConsumer(redis_client, name, lambda m, name=name: handled.append((name, m["device_id"])),
+                                       batch_size=100, reclaim_interval=3600) for name in ("w1", "w2")]
+    while sum(c.poll() for c in consumers):
+        pass
+
+    assert sorted(device_id for _, device_id in handled) == sorted(f"s{i}" for i in range(250))
+    assert {name for name, _ in handled} == {"w1", "w2"}
+    assert redis_client.ack_calls == 3
+    assert not redis_client.pending
+
+
+def test_failed_command_is_reclaimed_then_dead_lettered():
+    """Tes 5: Perintah yang gagal tetap pending, diambil alih worker lain, lalu ke dead letter setelah max_deliveries."""
+    redis_client = FakeStreamRedis()
+    publish_command(redis_client, {"type": "command", "device_id": "s1"})
+
+    crashing = CommandStreamConsumer(redis_client, "w1", lambda m: False, reclaim_interval=3600)
+    assert crashing.poll() == 0
+    assert len(redis_client.pending) == 1
+
+    handled = []
+    survivor = CommandStreamConsumer(redis_client, "w2", handled.append, reclaim_idle_ms=0, reclaim_interval=0)
+    assert survivor.poll() == 1
+    assert [m["device_id"] for m in handled] == ["s1"]
+    assert survivor.get_stats()["reclaimed"] == 1
+
+    publish_command(redis_client, {"type": "command", "device_id": "s2"})
+    failing = CommandStreamConsumer(redis_client, "w3", lambda m: False, reclaim_idle_ms=0,
+                                    reclaim_interval=0, max_deliveries=3)
+    for _ in range(4):
+        failing.poll()
+    assert len(redis_client.dead) == 1
+    assert not redis_client.pending
+
+
+def test_expired_commands_are_acked_without_execution():
+    """Tes 6: Perintah yang tertahan lebih lama dari max_age tidak dieksekusi."""
+    redis_client = FakeStreamRedis()
+    old_id = f"{int((time.time() - 600) * 1000)}-0"
+    redis_client.xadd(COMMAND_STREAM, {"data": json.dumps({"type": "command", "device_id": "s1"})}, id=old_id)
+
+    handler = MagicMock()
+    consumer = CommandStreamConsumer(redis_client, "w1", handler, max_age=300, reclaim_interval=3600)
+    assert consumer.poll() == 1
+    handler.assert_not_called()
+    assert consumer.get_stats()["expired"] == 1
@@ -0,0 +1,183 @@
+# File: tests/test_command_fanout.py
+
+import asyncio
+import time
+
+from helper.command_fanout import (FanoutDispatcher, FanoutJob, RateLimiter, expand_target, fanout_key,
+                                   get_fanout_status, run_fanout_async, selector_groups, validate_target)
+from helper.command_tracker import CommandTracker
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis_client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class AsyncFakePipeline(FakePipeline):
+    async def execute(self):
+        return super().execute()
+
+
+class FakeRedis:
+    def __init__(self, asynchronous=False):
+        self.hashes = {}
+        self.asynchronous = asynchronous
+
+    def pipeline(self, transaction=True):
+        return AsyncFakePipeline(self) if self.asynchronous else FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hincrby(self, key, field, amount):
+        values = self.hashes.setdefault(key, {})
+        values[field] = str(int(values.get(field, 0)) + amount)
+
+    def expire(self, key, ttl):
+        return True
+
+
+class FakeMessageInfo:
+    """Dikonfirmasi broker setelah `delay` kali dicek (meniru PUBACK yang datang belakangan)."""
+
+    def __init__(self, delay=3):
+        self.remaining = delay
+
+    def is_published(self):
+        self.remaining -= 1
+        return self.remaining <= 0
+
+
+def group_message(**extra):
+    return {"type": "group_command", "command_id": "f1", "target": {"regions": ["jatim"]},
+            "payload": {"warning_level": 10}, **extra}
+
+
+def test_target_selectors_are_expanded_against_whitelist():
+    """Tes 1: device_ids + grup/tag/region digabung; perangkat di luar whitelist dilewati; all = whitelist."""
+    whitelist = {"a", "b", "c", "d"}
+    target = {"device_ids": ["a", "x"], "tags": ["hujan"], "regions": ["jatim"]}
+    assert selector_groups(target) == ["tag:hujan", "region:jatim"]
+    assert expand_target(target, whitelist, [{"b"}, {"c", "y"}]) == (["a", "b", "c"], ["x", "y"])
+    assert expand_target({"all": True}, whitelist, []) == (["a", "b", "c", "d"], [])
+    assert validate_target({}) is not None
+    assert validate_target({"device_ids": "a"}) is not None
+    assert validate_target({"all": True}) is None
+
+
+def test_rate_limiter_spaces_publishes():
+    """Tes 2: Setelah burst habis, setiap publish menunggu 1/rate detik."""
+    now = [0.0]
+    limiter = RateLimiter(100, burst=2, clock=lambda: now[0])
+    assert [limiter.delay() for _ in range(2)] == [0.0, 0.0]
+    assert round(limiter.delay(), 3) == 0.01
+    assert round(limiter.delay(), 3) == 0.02
+    now[0] = 1.0
+    assert limiter.delay() == 0.0
+    assert RateLimiter(0).delay() == 0.0
+
+
+def test_dispatcher_limits_inflight_and_reports_progress():
+    """Tes 3: Publish per perangkat dibatasi max_inflight; progres dan hasil akhir ditulis ke Redis."""
+    redis_client = FakeRedis()
+    published = []
+    done = []
+
+    def publish(topic, payload):
+        published.append((topic, payload))
+        return None if payload["sensor_id"] == "s3" else FakeMessageInfo()
+
+    dispatcher = FanoutDispatcher(redis_client, publish, rate=0, max_inflight=4, on_done=done.append)
+    job = FanoutJob(group_message(device_field="sensor_id"), [f"s{i}" for i in range(20)], ["asing"],
+                    "iot/command")
+    dispatcher.run_job(job)
+
+    assert len(published) == 20
+    assert published[0] == ("iot/command/s0", {"warning_level": 10, "fanout_id": "f1", "sensor_id": "s0"})
+    assert dispatcher.get_stats()["max_inflight_seen"] == 4
+    assert done == [job]
+    status = get_fanout_status(redis_client, "f1")
+    assert (status["state"], status["total"], status["published"], status["failed"], status["skipped"]) == \
+        ("partial", 20, 19, 1, 1)
+    assert status["failed_devices"] == ["s3"]
+
+
+def test_async_fanout_bounds_concurrency():
+    """Tes 4: Engine asyncio: paling banyak max_inflight publish menunggu PUBACK bersamaan."""
+    redis_client = FakeRedis(asynchronous=True)
+    active = {"now": 0, "max": 0}
+
+    async def publish(topic, payload):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.001)
+        active["now"] -= 1
+        return True
+
+    job = FanoutJob(group_message(), [f"s{i}" for i in range(50)], [], "iot/command")
+    asyncio.run(run_fanout_async(job, redis_client, publish, rate=0, max_inflight=5))
+
+    assert active["max"] == 5
+    assert get_fanout_status(redis_client, "f1")["published"] == 50
+    assert job.state == "completed"
+
+
+def test_device_acks_are_counted_on_fanout():
+    """Tes 5: Ack perangkat yang membawa fanout_id dihitung di progres fan-out."""
+    redis_client = FakeRedis()
+    tracker = CommandTracker(redis_client)
+    tracker.acked(None, "s1", "ok", fanout_id="f1")
+    tracker.acked(None, "s2", "error", "sensor rusak", fanout_id="f1")
+    tracker.flush()
+
+    assert redis_client.hashes[fanout_key("f1")] == {"acked": "1", "ack_failed": "1"}
+    assert tracker.get_stats()["unmatched_acks"] == 0
+
+
+def test_async_fanout_survives_publish_errors():
+    """Tes 6: Exception dari publish dihitung gagal per perangkat; job tetap selesai dan progres final tertulis."""
+    redis_client = FakeRedis(asynchronous=True)
+
+    async def publish(topic, payload):
+        if topic.endswith("s2"):
+            raise RuntimeError("koneksi putus")
+        return True
+
+    job = FanoutJob(group_message(), [f"s{i}" for i in range(5)], [], "iot/command")
+    asyncio.run(run_fanout_async(job, redis_client, publish, rate=0, max_inflight=2))
+
+    status = get_fanout_status(redis_client, "f1")
+    assert (status["state"], status["published"], status["failed_devices"]) == ("partial", 4, ["s2"])
+
+
+def test_dispatcher_reports_failed_and_dropped_jobs():
+    """Tes 7: Job yang error ditandai failed, job yang masih antre saat stop() ditandai interrupted; keduanya ke on_done."""
+    redis_client = FakeRedis()
+    done = []
+
+    def publish(topic, payload):
+        raise RuntimeError("client MQTT rusak")
+
+    dispatcher = FanoutDispatcher(redis_client, publish, rate=0, on_done=done.append)
+    dispatcher.start()
+    dispatcher.submit(FanoutJob(group_message(), ["s1"], [], "iot/command"))
+    deadline = time.monotonic() + 5
+    while not done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert get_fanout_status(redis_client, "f1")["state"] == "failed"
+
+    dispatcher.submit(FanoutJob(group_message(command_id="f2"), ["s1"], [], "iot/command"))
+    dispatcher.stop()
+    assert [(job.fanout_id, job.state) for job in done] == [("f1", "failed"), ("f2", "interrupted")]
+    assert get_fanout_status(redis_client, "f2")["state"] == "interrupted"
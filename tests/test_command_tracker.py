@@ -0,0 +1,159 @@
+# File: tests/test_command_tracker.py
+
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from helper.device_gate import DeviceGate
+from helper.command_tracker import (CommandTracker, LATENCY_KEY, get_command_status, get_latency_histograms,
+                                    track_queued)
+from mqtt.message_handler import MessageHandler
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    def execute(self):
+        return [getattr(self.redis_client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hmget(self, key, *fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def hincrby(self, key, field, amount):
+        values = self.hashes.setdefault(key, {})
+        values[field] = str(int(values.get(field, 0)) + amount)
+
+    def hincrbyfloat(self, key, field, amount):
+        values = self.hashes.setdefault(key, {})
+        values[field] = str(float(values.get(field, 0)) + amount)
+
+    def expire(self, key, ttl):
+        return True
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def get(self, key):
+        return self.strings.get(key)
+
+
+def queue(redis_client, message):
+    pipe = redis_client.pipeline()
+    track_queued(pipe, message)
+    pipe.execute()
+
+
+def test_command_lifecycle_is_recorded():
+    """Tes 1: Perintah melewati queued -> dispatched -> published -> acked dengan latensi per tahap."""
+    redis_client = FakeRedis()
+    tracker = CommandTracker(redis_client)
+    message = {"type": "command", "command_id": "c1", "device_id": "s1", "created_at": 1000.0}
+    queue(redis_client, message)
+
+    dispatched_at = tracker.dispatched(message)
+    tracker.published(message, dispatched_at)
+    tracker.acked("c1", "s1", "ok")
+    assert tracker.flush() == 3
+
+    status = get_command_status(redis_client, "c1")
+    assert status["state"] == "acked"
+    assert list(status["timestamps"]) == ["queued", "dispatched", "published", "acked"]
+    assert set(status["latency_ms"]) == {"dispatch", "publish", "ack", "total"}
+
+    histograms = get_latency_histograms(redis_client)
+    for name in ("dispatch", "publish", "ack", "total"):
+        assert histograms[name]["count"] == 1
+
+
+def test_registration_ack_without_command_id_matches_device():
+    """Tes 2: Ack registrasi dari firmware lama (tanpa command_id) dicocokkan lewat device_id."""
+    redis_client = FakeRedis()
+    tracker = CommandTracker(redis_client)
+    message = {"type": "register_device", "command_id": "r1", "device_id": "baru", "created_at": 1000.0}
+    queue(redis_client, message)
+    tracker.published(message, tracker.dispatched(message))
+    tracker.flush()
+
+    tracker.acked(None, "baru", "registered")
+    tracker.flush()
+
+    assert get_command_status(redis_client, "r1")["state"] == "acked"
+    assert json.loads(redis_client.strings["command:device:baru"])["command_id"] == "r1"
+    assert tracker.get_stats()["unmatched_acks"] == 0
+
+
+def test_failed_and_unknown_outcomes():
+    """Tes 3: Ack gagal menyimpan error, ack tanpa pasangan dihitung, perintah tak dikenal -> None."""
+    redis_client = FakeRedis()
+    tracker = CommandTracker(redis_client)
+    queue(redis_client, {"type": "command", "command_id": "c2", "device_id": "s1", "created_at": 1000.0})
+
+    tracker.acked("c2", "s1", "error", "sensor rusak")
+    tracker.acked(None, "tanpa-perintah", "registered")
+    tracker.flush()
+
+    status = get_command_status(redis_client, "c2")
+    assert status["state"] == "failed"
+    assert status["error"] == "sensor rusak"
+    assert tracker.get_stats()["unmatched_acks"] == 1
+    assert get_command_status(redis_client, "tidak-ada") is None
+
+
+def test_histogram_percentiles():
+    """Tes 4: Persentil diperkirakan dari batas atas bucket."""
+    redis_client = FakeRedis()
+    redis_client.hashes[LATENCY_KEY] = {"ack:10": "90", "ack:250": "9", "ack:inf": "1", "ack:sum_ms": "5000"}
+
+    ack = get_latency_histograms(redis_client)["ack"]
+    assert ack["count"] == 100
+    assert ack["avg_ms"] == 50.0
+    assert (ack["p50_ms"], ack["p95_ms"], ack["p99_ms"]) == (10, 250, 250)
+    assert get_latency_histograms(redis_client)["total"]["count"] == 0
+
+
+def test_registration_response_seen_by_every_worker_is_acked_once():
+    """Tes 5: Respons registrasi (topik tidak di-share) yang diterima dua worker hanya dicatat sekali."""
+    redis_client = FakeRedis()
+    config = SimpleNamespace(MQTT_TOPIC_WATERLEVEL="iot/waterlevel", REGISTRATION_RESPONSE_TOPIC="iot/register/response")
+    message = {"type": "register_device", "command_id": "r1", "device_id": "baru", "created_at": 1000.0}
+    queue(redis_client, message)
+    publisher = CommandTracker(redis_client)
+    publisher.published(message, publisher.dispatched(message))
+    publisher.flush()
+
+    trackers = [CommandTracker(redis_client), CommandTracker(redis_client)]
+    response = json.dumps({"status": "success", "device_id": "baru", "command_id": "r1"}).encode()
+    for tracker in trackers:
+        whitelist = set()
+        handler = MessageHandler(config, whitelist, DeviceGate(whitelist), MagicMock(), MagicMock(), MagicMock(),
+                                 tracker=tracker)
+        handler.handle("iot/register/response", response)
+        tracker.flush()
+
+    assert get_latency_histograms(redis_client)["ack"]["count"] == 1
+    assert [tracker.get_stats()["duplicate_acks"] for tracker in trackers] == [0, 1]
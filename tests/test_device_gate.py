@@ -0,0 +1,75 @@
+# File: tests/test_device_gate.py
+
+import logging
+from unittest.mock import MagicMock
+
+from helper.device_gate import DeviceGate
+from helper.payload_codec import split_device_topic
+
+
+def test_whitelisted_device_is_admitted_without_lookup():
+    """Tes 1: Perangkat di whitelist lolos tanpa lookup remote dan tanpa dicatat."""
+    lookup = MagicMock()
+    gate = DeviceGate({"sensor-01"}, lookup=lookup)
+
+    assert gate.admit("sensor-01") is True
+    lookup.assert_not_called()
+    assert gate.get_stats()["rejected"] == 0
+
+
+def test_negative_cache_limits_remote_lookups():
+    """Tes 2: ID yang ditolak hanya di-lookup sekali selama TTL negative cache."""
+    lookup = MagicMock(return_value=False)
+    gate = DeviceGate(set(), lookup=lookup, negative_ttl=60)
+
+    for _ in range(100):
+        assert gate.admit("intruder", before_decode=True) is False
+
+    lookup.assert_called_once_with("intruder")
+    stats = gate.get_stats()
+    assert stats["rejected"] == 100
+    assert stats["rejected_before_decode"] == 100
+    assert stats["negative_hits"] == 99
+    assert stats["top_rejected"] == [{"device_id": "intruder", "count": 100}]
+
+
+def test_remote_lookup_admits_newly_registered_device():
+    """Tes 3: Lookup remote yang berhasil meloloskan perangkat yang belum ada di cache lokal."""
+    gate = DeviceGate(set(), lookup=lambda device_id: device_id == "baru")
+    assert gate.admit("baru") is True
+    assert gate.get_stats()["remote_admits"] == 1
+
+
+def test_rejection_logging_is_sampled(caplog):
+    """Tes 4: Banjir pesan dari satu ID hanya menghasilkan log pertama dan setiap N penolakan."""
+    gate = DeviceGate(set(), log_every=50, log_interval=3600)
+    with caplog.at_level(logging.WARNING, logger="DeviceGate"):
+        for _ in range(120):
+            gate.admit("intruder")
+
+    lines = [r.getMessage() for r in caplog.records]
+    assert len(lines) == 3  # penolakan ke-1, ke-51, ke-101
+    assert "49 penolakan serupa" in lines[1]
+
+
+def test_split_device_topic():
+    """Tes 5: ID perangkat diambil dari topik per perangkat saja."""
+    assert split_device_topic("iot/waterlevel/SIM-01", "iot/waterlevel") == ("iot/waterlevel", "SIM-01")
+    assert split_device_topic("iot/waterlevel", "iot/waterlevel") == ("iot/waterlevel", None)
+    assert split_device_topic("iot/waterlevel/a/b", "iot/waterlevel") == ("iot/waterlevel/a/b", None)
+
+
+def test_local_only_never_calls_lookup():
+    """Tes 6: Thread jaringan (local_only) tidak memanggil lookup; ID baru diputuskan worker lalu di-negative-cache."""
+    lookup = MagicMock(return_value=False)
+    gate = DeviceGate(set(), lookup=lookup)
+
+    assert gate.admit("intruder", before_decode=True, local_only=True) is True
+    lookup.assert_not_called()
+    assert gate.admit("intruder") is False
+    lookup.assert_called_once_with("intruder")
+
+    assert gate.admit("intruder", before_decode=True, local_only=True) is False
+    assert lookup.call_count == 1
+    stats = gate.get_stats()
+    assert (stats["deferred"], stats["rejected_before_decode"]) == (1, 1)
@@ -0,0 +1,88 @@
+# File: tests/test_heartbeat_aggregator.py
+
+import pytest
+import requests
+from unittest.mock import MagicMock
+
+from helper.heartbeat_aggregator import HeartbeatAggregator
+
+
+@pytest.fixture
+def session():
+    session = MagicMock()
+    session.post.return_value = MagicMock(status_code=200)
+    return session
+
+
+def test_update_coalesces_per_device(session):
+    """Tes 1: Heartbeat beruntun dari perangkat yang sama hanya dikirim sekali (versi terbaru)."""
+    aggregator = HeartbeatAggregator("http://laravel/api/iot", session=session)
+
+    aggregator.update("device-01", "1.0", -70)
+    aggregator.update("device-01", "1.1", -65)
+    aggregator.update("device-02", "1.0", -80)
+
+    assert aggregator.flush() == 2
+    session.post.assert_any_call(
+        "http://laravel/api/iot/device-01/heartbeat", json={"fw_version": "1.1", "rssi": -65}, timeout=5)
+
+    stats = aggregator.get_stats()
+    assert stats["coalesced"] == 1
+    assert stats["sent"] == 2
+    assert stats["pending"] == 0
+
+
+def test_batch_mode_sends_single_request(session):
+    """Tes 2: Mode batch mengirim semua heartbeat dalam satu request."""
+    aggregator = HeartbeatAggregator("http://laravel/api/iot", batch_url="http://laravel/api/iot/heartbeats",
+                                     session=session)
+    aggregator.update("device-01", "1.0", -70)
+    aggregator.update("device-02", "1.0", -80)
+
+    aggregator.flush()
+
+    session.post.assert_called_once()
+    body = session.post.call_args.kwargs["json"]
+    assert {hb["device_id"] for hb in body["heartbeats"]} == {"device-01", "device-02"}
+
+
+def test_failed_heartbeat_is_retried_unless_newer_exists(session):
+    """Tes 3: Heartbeat yang gagal dikembalikan ke antrian, tanpa menimpa data yang lebih baru."""
+    session.post.side_effect = requests.ConnectionError("down")
+    aggregator = HeartbeatAggregator("http://laravel/api/iot", batch_url="http://laravel/batch", session=session)
+    aggregator.update("device-01", "1.0", -70)
+
+    assert aggregator.flush() == 0
+    assert aggregator.get_stats()["failed"] == 1
+    assert aggregator.get_stats()["pending"] == 1
+
+    session.post.side_effect = None
+    aggregator.update("device-01", "2.0", -60)
+    aggregator.flush()
+    body = session.post.call_args.kwargs["json"]
+    assert body["heartbeats"] == [{"device_id": "device-01", "fw_version": "2.0", "rssi": -60}]
+
+
+def _http_error(status_code):
+    response = MagicMock(status_code=status_code)
+    response.raise_for_status.side_effect = requests.HTTPError(f"{status_code}", response=response)
+    return response
+
+
+def test_rejected_batch_falls_back_to_individual_and_drops_invalid(session):
+    """Tes 4: Batch yang ditolak (4xx) dikirim per perangkat; heartbeat yang ditolak dibuang, bukan diulang."""
+    responses = {
+        "http://laravel/batch": _http_error(422),
+        "http://laravel/api/iot/device-01/heartbeat": MagicMock(status_code=200),
+        "http://laravel/api/iot/device-02/heartbeat": _http_error(404),
+        "http://laravel/api/iot/device-03/heartbeat": _http_error(503),
+    }
+    session.post.side_effect = lambda url, **kwargs: responses[url]
+    aggregator = HeartbeatAggregator("http://laravel/api/iot", batch_url="http://laravel/batch", session=session)
+    for device_id in ("device-01", "device-02", "device-03"):
+        aggregator.update(device_id, "1.0", -70)
+
+    assert aggregator.flush() == 1
+    stats = aggregator.get_stats()
+    assert (stats["sent"], stats["rejected"], stats["failed"], stats["pending"]) == (1, 1, 1, 1)
+    aggregator.stop()
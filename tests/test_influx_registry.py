@@ -0,0 +1,68 @@
+# File: tests/test_influx_registry.py
+
+import pytest
+from unittest.mock import MagicMock
+
+from influxdb.registry import InfluxDBRegistry, _on_write_error
+from influxdb.spool import DiskSpool
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr("influxdb.registry.get_default_spool", lambda: None)
+    registry = InfluxDBRegistry("http://localhost:8086", "token", "org", "bucket", pool_maxsize=7)
+    yield registry
+    registry.close()
+
+
+def test_nothing_created_on_init(registry):
+    """Tes 1: Registry tidak membuat client apa pun sebelum dipakai."""
+    assert registry._client is None
+    assert registry.get_pool_stats() == {"initialized": False, "pools": []}
+
+
+def test_apis_share_one_client(registry):
+    """Tes 2: Write API, query API, dan batch writer memakai client dan pool yang sama."""
+    query_api = registry.query_api()
+    assert registry.query_api() is query_api
+
+    client = registry.client()
+    writer = registry.batch_writer()
+    adapter = writer.session.get_adapter("http://localhost:8086")
+    assert adapter.poolmanager is client.api_client.rest_client.pool_manager
+
+
+def test_pool_stats(registry):
+    """Tes 3: Statistik pool melaporkan ukuran maksimum dan koneksi yang sedang dipakai."""
+    registry.client().api_client.rest_client.pool_manager.connection_from_url("http://localhost:8086")
+
+    stats = registry.get_pool_stats()
+    assert stats["initialized"] is True
+    assert stats["pools"][0]["maxsize"] == 7
+    assert stats["pools"][0]["in_use"] == 0
+
+
+def test_close_resets_registry(registry):
+    """Tes 4: close() menutup client sehingga pemakaian berikutnya membuat client baru."""
+    first = registry.client()
+    registry.close()
+
+    assert registry._client is None
+    assert registry.client() is not first
+
+
+def test_write_api_starts_spool_replay(registry, tmp_path, monkeypatch):
+    """Tes 5: Data yang di-spool dari jalur write API ikut di-replay oleh batch writer registry."""
+    spool = DiskSpool(str(tmp_path))
+    monkeypatch.setattr("influxdb.registry.get_default_spool", lambda: spool)
+    monkeypatch.setattr("influxdb.spool.get_default_spool", lambda: spool)
+    writer_cls = MagicMock()
+    monkeypatch.setattr("influxdb.registry.BatchWriter", writer_cls)
+
+    registry.write_api()
+    writer_cls.assert_called_once()
+    assert writer_cls.call_args.kwargs["spool"] is spool
+    writer_cls.return_value.start.assert_called_once()
+
+    _on_write_error(None, b"m value=1", Exception("down"))
+    assert spool.read_chunk(10)[1] == [b"m value=1"]
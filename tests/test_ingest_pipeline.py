@@ -0,0 +1,95 @@
+# File: tests/test_ingest_pipeline.py
+
+import threading
+import pytest
+
+from helper.ingest_pipeline import IngestPipeline
+
+
+def test_workers_process_all_items():
+    """Tes 1: Semua item yang di-submit diproses oleh worker pool."""
+    seen = []
+    lock = threading.Lock()
+
+    def handler(item):
+        with lock:
+            seen.append(item)
+
+    pipeline = IngestPipeline(handler, num_workers=3, max_size=100)
+    pipeline.start()
+    for i in range(50):
+        assert pipeline.submit(i)
+    pipeline.stop()
+
+    assert sorted(seen) == list(range(50))
+    assert pipeline.get_stats()["processed"] == 50
+
+
+def test_drop_newest_rejects_when_full():
+    """Tes 2: Policy drop_newest membuang item baru saat antrian penuh."""
+    pipeline = IngestPipeline(lambda item: None, max_size=2, policy="drop_newest")
+
+    assert pipeline.submit("a")
+    assert pipeline.submit("b")
+    assert pipeline.submit("c") is False
+    assert pipeline.get_stats()["dropped_newest"] == 1
+
+
+def test_drop_oldest_keeps_latest_items():
+    """Tes 3: Policy drop_oldest membuang item tertua dan menyimpan yang terbaru."""
+    seen = []
+    pipeline = IngestPipeline(seen.append, num_workers=1, max_size=2, policy="drop_oldest")
+
+    for item in ["a", "b", "c"]:
+        assert pipeline.submit(item)
+    pipeline.start()
+    pipeline.stop()
+
+    assert seen == ["b", "c"]
+    assert pipeline.get_stats()["dropped_oldest"] == 1
+
+
+def test_block_policy_times_out():
+    """Tes 4: Policy block dengan timeout menghitung item sebagai terbuang."""
+    pipeline = IngestPipeline(lambda item: None, max_size=1, policy="block", block_timeout=0.01)
+
+    assert pipeline.submit("a")
+    assert pipeline.submit("b") is False
+
+
+def test_handler_error_does_not_kill_worker():
+    """Tes 5: Exception di handler dicatat dan worker tetap berjalan."""
+    seen = []
+
+    def handler(item):
+        if item == "bad":
+            raise RuntimeError("boom")
+        seen.append(item)
+
+    pipeline = IngestPipeline(handler, num_workers=1)
+    pipeline.start()
+    pipeline.submit("bad")
+    pipeline.submit("good")
+    pipeline.stop()
+
+    assert seen == ["good"]
+    assert pipeline.get_stats()["failed"] == 1
+
+
+def test_invalid_policy():
+    """Tes 6: Policy yang tidak dikenal ditolak."""
+    with pytest.raises(ValueError):
+        IngestPipeline(lambda item: None, policy="random")
+
+
+def test_submit_after_stop_is_dropped():
+    """Tes 7: Item setelah stop() ditolak dan dihitung, bukan menumpuk di antrian tanpa worker."""
+    seen = []
+    pipeline = IngestPipeline(seen.append, num_workers=1)
+    pipeline.start()
+    assert pipeline.submit("a")
+    pipeline.stop()
+
+    assert pipeline.submit("b") is False
+    stats = pipeline.get_stats()
+    assert (seen, stats["dropped_stopped"], stats["depth"]) == (["a"], 1, 0)
@@ -0,0 +1,65 @@
+# File: tests/test_json_codec.py
+
+import importlib
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from flask import Flask, jsonify
+
+from helper import json_codec
+from helper.json_formatter import FastJSONProvider, create_response
+
+SAMPLE = {
+    "device_id": "sensor-01",
+    "water_level": 42.5,
+    "time": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+    "threshold": Decimal("1.5"),
+    "tags": {"utara"},
+}
+
+
+def _load_stdlib_codec(monkeypatch):
+    # Memuat ulang codec seolah-olah orjson tidak terpasang
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    spec = importlib.util.find_spec("helper.json_codec")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_roundtrip_handles_extended_types():
+    """Tes 1: datetime, Decimal, dan set diserialisasi; dumps mengembalikan bytes."""
+    encoded = json_codec.dumps(SAMPLE)
+    assert isinstance(encoded, bytes)
+    decoded = json_codec.loads(encoded)
+    assert decoded["time"] == "2024-05-01T12:30:00+00:00"
+    assert decoded["threshold"] == "1.5"
+    assert decoded["tags"] == ["utara"]
+
+
+def test_stdlib_fallback_matches_fast_backend(monkeypatch):
+    """Tes 2: Fallback json standar menghasilkan data yang sama dengan backend aktif."""
+    fallback = _load_stdlib_codec(monkeypatch)
+    assert fallback.BACKEND == "json"
+    assert fallback.loads(fallback.dumps(SAMPLE)) == json_codec.loads(json_codec.dumps(SAMPLE))
+
+
+def test_flask_provider_serializes_datetime_natively():
+    """Tes 3: jsonify dan create_response menulis datetime sebagai ISO 8601."""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    @app.route("/latest")
+    def latest():
+        return create_response(data={"time": SAMPLE["time"], "height": 10.0})
+
+    @app.route("/raw")
+    def raw():
+        return jsonify(time=SAMPLE["time"])
+
+    client = app.test_client()
+    body = client.get("/latest").get_json()
+    assert body["data"]["time"] == "2024-05-01T12:30:00+00:00"
+    assert client.get("/raw").get_json() == {"time": "2024-05-01T12:30:00+00:00"}
+    assert client.get("/raw").mimetype == "application/json"
@@ -0,0 +1,136 @@
+# File: tests/test_latest_store.py
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+import redis
+from flask import Flask
+
+from api.waterlevel import endpoints
+from helper.json_formatter import FastJSONProvider
+from helper.latest_store import LATEST_KEY, LatestValueStore, get_latest
+
+
+class FakeRedis:
+    """Meniru SET_IF_NEWER_SCRIPT dan HMGET di atas dict."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.evals = 0
+        self.fail = False
+
+    def eval(self, script, numkeys, key, *args):
+        if self.fail:
+            raise redis.ConnectionError("down")
+        self.evals += 1
+        values = self.hashes.setdefault(key, {})
+        written = 0
+        for i in range(0, len(args), 3):
+            device_id, ts, value = args[i:i + 3]
+            current = values.get(device_id)
+            if current is None or json.loads(current)["ts"] <= float(ts):
+                values[device_id] = value
+                written += 1
+        return written
+
+    def hmget(self, key, fields):
+        if self.fail:
+            raise redis.ConnectionError("down")
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+
+def test_updates_are_coalesced_per_flush():
+    """Tes 1: Banyak pembacaan per perangkat di antara flush menjadi satu penulisan (nilai terakhir)."""
+    redis_client = FakeRedis()
+    store = LatestValueStore(redis_client)
+    for i in range(10):
+        store.update("s1", i, 1_700_000_000_000_000_000 + i)
+    store.update("s2", 5.5, 1_700_000_000_000_000_000)
+
+    assert store.flush() == 2
+    assert redis_client.evals == 1
+    assert get_latest(redis_client, ["s1", "s2", "s3"]) == {
+        "s1": {"water_level": 9.0, "ts": 1_700_000_000.000000009},
+        "s2": {"water_level": 5.5, "ts": 1_700_000_000.0},
+        "s3": None,
+    }
+    assert store.get_stats()["coalesced"] == 9
+    assert store.flush() == 0
+
+
+def test_older_reading_does_not_overwrite_and_failed_flush_is_retried():
+    """Tes 2: Pembacaan lebih lama dari worker lain tidak menimpa; flush yang gagal diulang tanpa kehilangan data."""
+    redis_client = FakeRedis()
+    newer, older = LatestValueStore(redis_client), LatestValueStore(redis_client)
+    newer.update("s1", 2, 2_000_000_000_000_000_000)
+    newer.flush()
+    older.update("s1", 1, 1_000_000_000_000_000_000)
+    older.flush()
+    assert get_latest(redis_client, ["s1"])["s1"]["water_level"] == 2.0
+
+    redis_client.fail = True
+    newer.update("s2", 3, 2_000_000_000_000_000_000)
+    assert newer.flush() == 0
+    redis_client.fail = False
+    assert newer.flush() == 1
+    assert newer.get_stats()["errors"] == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis_client = FakeRedis()
+    influx_queries = []
+
+    def query_influx(device_ids):
+        influx_queries.append(device_ids)
+        return {"lama": {"water_level": 7.0, "ts": 1_600_000_000.0}} if "lama" in device_ids else {}
+
+    monkeypatch.setattr(endpoints, "redis_client", redis_client)
+    monkeypatch.setattr(endpoints, "_query_latest_influx", query_influx)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(endpoints.waterlevel, url_prefix="/api/waterlevel")
+    test_client = app.test_client()
+    test_client.redis, test_client.influx_queries = redis_client, influx_queries
+    return test_client
+
+
+def test_latest_is_served_from_cache(client):
+    """Tes 3: /latest membaca HASH Redis tanpa query InfluxDB; format respons tetap memuat height."""
+    store = LatestValueStore(client.redis)
+    store.update("s1", 12.5, 1_700_000_000_000_000_000)
+    store.flush()
+
+    response = client.post("/api/waterlevel/latest", json={"sensor_id": "s1"})
+    data = response.get_json()["data"]
+    assert response.status_code == 200
+    assert (data["device_id"], data["water_level"], data["height"]) == ("s1", 12.5, 12.5)
+    assert data["time"] == datetime.fromtimestamp(1_700_000_000, tz=timezone.utc).isoformat()
+    assert client.influx_queries == []
+
+
+def test_latest_multi_device_falls_back_only_for_misses(client):
+    """Tes 4: Varian multi-device; hanya perangkat yang tidak ada di cache yang ditanyakan ke InfluxDB lalu di-cache."""
+    store = LatestValueStore(client.redis)
+    store.update("s1", 1, 1_700_000_000_000_000_000)
+    store.flush()
+
+    body = client.post("/api/waterlevel/latest", json={"sensor_ids": ["s1", "lama", "hilang"]}).get_json()["data"]
+    assert sorted(body["devices"]) == ["lama", "s1"]
+    assert body["missing"] == ["hilang"]
+    assert client.influx_queries == [["lama", "hilang"]]
+    assert "lama" in client.redis.hashes[LATEST_KEY]
+
+    assert client.post("/api/waterlevel/latest", json={"sensor_id": "hilang"}).status_code == 404
+    assert client.post("/api/waterlevel/latest", json={"sensor_ids": []}).status_code == 400
+
+
+def test_latest_rejects_non_string_sensor_ids(client):
+    """Tes 5: sensor_ids berisi list/dict (atau sensor_id bukan string) -> 400, bukan error 500."""
+    for body in ({"sensor_ids": [["s1"]]}, {"sensor_ids": ["s1", {"id": "s2"}]}, {"sensor_ids": ["s1", ""]},
+                 {"sensor_id": ["s1"]}, {"sensor_id": {"id": "s1"}}):
+        response = client.post("/api/waterlevel/latest", json=body)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+    assert client.influx_queries == []
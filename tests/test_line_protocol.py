@@ -0,0 +1,67 @@
+# File: tests/test_line_protocol.py
+
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from influxdb_client import Point, WritePrecision
+
+from influxdb.line_protocol import LineProtocolEncoder, datetime_to_ns
+
+
+def point_line(measurement, device_id, fields, ts=None):
+    point = Point(measurement).tag("device_id", device_id)
+    for key, value in fields.items():
+        point.field(key, value)
+    if ts is not None:
+        point.time(ts, WritePrecision.NS)
+    return point.to_line_protocol().encode("utf-8")
+
+
+@pytest.mark.parametrize("measurement, device_id, fields", [
+    ("TestingIoTFinal", "device-01", {"water_level": 45.3}),
+    ("TestingIoTFinal", "device-01", {"water_level": 45.0}),
+    ("Water Level,v2", "sensor 1,a=b", {"water_level": 1e-7, "rssi": -70, "ok": True}),
+    ("m", "trailing\\", {"fw_version": 'v"1\\2', "battery": Decimal("3.70")}),
+    ("m", "", {"water_level": 1.5}),
+    ("m", "dev", {"water_level": float("nan"), "height": None, "level": 2.25}),
+    ("m", "dev", {"b": 1, "a": 2, "z key=": False}),
+])
+def test_matches_point_output(measurement, device_id, fields):
+    """Tes 1: Output encoder identik byte-per-byte dengan Point.to_line_protocol()."""
+    encoder = LineProtocolEncoder(measurement)
+    ts = time.time_ns()
+
+    assert encoder.encode(device_id, fields, ts) == point_line(measurement, device_id, fields, ts)
+    assert encoder.encode(device_id, fields) == point_line(measurement, device_id, fields)
+
+
+def test_empty_fields_produce_empty_record():
+    """Tes 2: Record tanpa field valid menghasilkan bytes kosong, seperti Point."""
+    encoder = LineProtocolEncoder("m")
+    buf = bytearray(b"existing")
+
+    assert encoder.encode_into(buf, "dev", {"x": None}) == 0
+    assert buf == bytearray(b"existing")
+
+
+def test_prefix_cache_is_bounded():
+    """Tes 3: Cache prefix perangkat dibatasi oleh cache_size (LRU)."""
+    encoder = LineProtocolEncoder("m", cache_size=2)
+    for device_id in ["a", "b", "c", "a"]:
+        encoder.encode(device_id, {"v": 1.0})
+
+    info = encoder.cache_info()
+    assert info.currsize == 2
+    assert info.misses == 4
+
+
+def test_datetime_to_ns_matches_point():
+    """Tes 4: Konversi datetime sama dengan Point (naive dianggap UTC)."""
+    naive = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    aware = naive.replace(tzinfo=timezone.utc)
+    expected = point_line("m", "dev", {"v": 1.0}, naive).rsplit(b" ", 1)[1]
+
+    assert str(datetime_to_ns(naive)).encode() == expected
+    assert datetime_to_ns(aware) == datetime_to_ns(naive)
@@ -0,0 +1,58 @@
+# File: tests/test_message_handler.py
+
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from helper.device_gate import DeviceGate
+from mqtt.message_handler import MessageHandler
+
+CONFIG = SimpleNamespace(MQTT_TOPIC_WATERLEVEL="iot/waterlevel",
+                         REGISTRATION_RESPONSE_TOPIC="iot/register/response")
+
+
+def make_handler(whitelist):
+    whitelist = set(whitelist)
+    return MessageHandler(CONFIG, whitelist, DeviceGate(whitelist), MagicMock(), MagicMock(), MagicMock())
+
+
+def test_waterlevel_reading_is_written_published_and_heartbeated():
+    """Tes 1: Pembacaan dari perangkat terdaftar ditulis, diteruskan ke dashboard, dan dicatat heartbeat-nya."""
+    handler = make_handler({"s1"})
+    handler.handle("iot/waterlevel", json.dumps({"device_id": "s1", "water_level": 12.5, "rssi": -60}).encode())
+
+    handler.write.assert_called_once()
+    handler.dashboard.add.assert_called_once_with({"device_id": "s1", "water_level": 12.5, "rssi": -60})
+    handler.heartbeats.update.assert_called_once_with("s1", None, -60)
+
+
+def test_topic_device_id_is_authorized_before_decode():
+    """Tes 2: ID di topik per perangkat ditolak sebelum payload di-decode."""
+    handler = make_handler({"s1"})
+    assert handler.admit_topic("iot/waterlevel/s1/msgpack") is True
+    assert handler.admit_topic("iot/waterlevel/intruder") is False
+    assert handler.admit_topic("iot/waterlevel") is True
+
+
+def test_payload_cannot_claim_another_device():
+    """Tes 3: device_id payload yang berbeda dari ID topik ditolak."""
+    handler = make_handler({"s1", "s2"})
+    handler.handle("iot/waterlevel/s1", json.dumps({"device_id": "s2", "water_level": 1}).encode())
+    handler.write.assert_not_called()
+
+
+def test_registration_response_adds_device_to_whitelist():
+    """Tes 4: Respons registrasi sukses menambahkan perangkat ke whitelist."""
+    handler = make_handler(set())
+    handler.handle("iot/register/response", json.dumps({"status": "success", "device_id": "baru"}).encode())
+    assert "baru" in handler.whitelist
+
+
+def test_latest_value_uses_the_influx_timestamp():
+    """Tes 5: Nilai terakhir per perangkat dicatat dengan timestamp yang sama dengan data point InfluxDB."""
+    handler = make_handler({"s1"})
+    handler.latest = MagicMock()
+    handler.handle("iot/waterlevel", json.dumps({"device_id": "s1", "water_level": 12.5}).encode())
+
+    timestamp_ns = handler.write.call_args.args[1]
+    handler.latest.update.assert_called_once_with("s1", 12.5, timestamp_ns)
@@ -1,6 +1,10 @@
 # File: tests/test_mqtt_helper.py
 
+import json
+import threading
+
 import pytest
+import requests
 from unittest.mock import MagicMock, patch
 
 # Asumsikan class Anda ada di helper/mqtt_client.py
@@ -19,7 +23,7 @@ def test_initialization(mqtt_helper):
     assert mqtt_helper.client is None
     assert mqtt_helper.is_running is False
     assert len(mqtt_helper.whitelist_cache) == 0
-    assert mqtt_helper.response_queue.empty()
+    assert mqtt_helper.pending_registrations() == 0
 
 def test_load_whitelist_success(mqtt_helper, mocker):
     """Tes 2: Memastikan whitelist berhasil dimuat dari backend."""
@@ -79,7 +83,7 @@ def test_stop_method_disconnects(mqtt_helper):
     mqtt_helper.client.disconnect.assert_called_once()
     assert mqtt_helper.is_running is False
     
-@patch('helper.mqtt_client.write_data') # Mock fungsi write_data
+@patch('mqtt.mqtt_client.write_data') # Mock fungsi write_data
 def test_on_message_handles_waterlevel_data_for_whitelisted_device(mock_write_data, mqtt_helper):
     """Tes 6: Memastikan on_message memproses data waterlevel dari device yang diizinkan."""
     # Setup
@@ -87,7 +91,7 @@ def test_on_message_handles_waterlevel_data_for_whitelisted_device(mock_write_da
     
     mock_msg = MagicMock()
     mock_msg.topic = "iot/waterlevel" # Asumsi dari Config
-    mock_msg.payload.decode.return_value = '{"device_id": "device-01", "height": 55.5}'
+    mock_msg.payload = b'{"device_id": "device-01", "height": 55.5}'
     
     # Panggil on_message
     mqtt_helper.on_message(None, None, mock_msg)
@@ -95,14 +99,14 @@ def test_on_message_handles_waterlevel_data_for_whitelisted_device(mock_write_da
     # Assertasi
     mock_write_data.assert_called_once_with({"device_id": "device-01", "height": 55.5})
 
-@patch('helper.mqtt_client.write_data')
+@patch('mqtt.mqtt_client.write_data')
 def test_on_message_rejects_non_whitelisted_device(mock_write_data, mqtt_helper):
     """Tes 7: Memastikan on_message menolak data dari device yang tidak diizinkan."""
     # Setup (whitelist kosong)
     
     mock_msg = MagicMock()
     mock_msg.topic = "iot/waterlevel"
-    mock_msg.payload.decode.return_value = '{"device_id": "device-hacker", "height": 999}'
+    mock_msg.payload = b'{"device_id": "device-hacker", "height": 999}'
     
     # Panggil on_message
     mqtt_helper.on_message(None, None, mock_msg)
@@ -111,34 +115,66 @@ def test_on_message_rejects_non_whitelisted_device(mock_write_data, mqtt_helper)
     mock_write_data.assert_not_called()
 
 def test_on_message_handles_registration_response(mqtt_helper):
-    """Tes 8: Memastikan on_message menangani respons registrasi dengan benar."""
+    """Tes 8: Memastikan on_message menyelesaikan registrasi yang sedang menunggu respons."""
     # Setup
-    mock_msg = MagicMock()
-    mock_msg.topic = "iot/register/response" # Asumsi dari Config
+    mqtt_helper.is_running = True
+    mqtt_helper.client = MagicMock()
     response_payload = {"device_id": "device-new", "status": "success"}
-    mock_msg.payload.decode.return_value = json.dumps(response_payload)
-    
-    # Pastikan event belum di-set sebelumnya
-    assert not mqtt_helper.register_event.is_set()
-    
-    # Panggil on_message
-    mqtt_helper.on_message(None, None, mock_msg)
-    
+
+    def respond(topic, data):
+        mock_msg = MagicMock()
+        mock_msg.topic = "iot/register/response" # Asumsi dari Config
+        mock_msg.payload = json.dumps(response_payload).encode()
+        mqtt_helper.on_message(None, None, mock_msg)
+    mqtt_helper.client.publish.side_effect = respond
+
+    # Panggil publish_register_device; respons datang saat publish
+    response = mqtt_helper.publish_register_device("device-new", {"device_id": "device-new"}, timeout=1)
+
     # Assertasi
-    assert not mqtt_helper.response_queue.empty()
-    assert mqtt_helper.response_queue.get() == response_payload
-    assert mqtt_helper.register_event.is_set() # Pastikan event di-set
+    assert response == response_payload
+    assert "device-new" in mqtt_helper.whitelist_cache
+    assert mqtt_helper.pending_registrations() == 0
 
-def test_publish_register_device_timeout(mqtt_helper, mocker):
+def test_publish_register_device_timeout(mqtt_helper):
     """Tes 9: Memastikan fungsi registrasi mengembalikan None jika timeout."""
     # Mock client agar terlihat running
     mqtt_helper.is_running = True
     mqtt_helper.client = MagicMock()
     
-    # Mock register_event.wait() agar langsung mengembalikan False (timeout)
-    mocker.patch.object(mqtt_helper.register_event, 'wait', return_value=False)
-    
-    response = mqtt_helper.publish_register_device("device-timeout", {"payload": "data"})
+    response = mqtt_helper.publish_register_device("device-timeout", {"payload": "data"}, timeout=0.01)
     
     # Assertasi
-    assert response is None
\ No newline at end of file
+    assert response is None
+    assert mqtt_helper.pending_registrations() == 0
+
+def test_concurrent_registrations_are_correlated(mqtt_helper):
+    """Tes 10: Registrasi paralel; respons yang datang tidak berurutan membangunkan pemanggil yang tepat."""
+    mqtt_helper.is_running = True
+    mqtt_helper.client = MagicMock()
+    device_ids = [f"device-{i:03d}" for i in range(200)]
+    results = {}
+
+    def register(device_id):
+        results[device_id] = mqtt_helper.publish_register_device(device_id, {"device_id": device_id}, timeout=5)
+
+    threads = [threading.Thread(target=register, args=(device_id,)) for device_id in device_ids]
+    for thread in threads:
+        thread.start()
+    while mqtt_helper.pending_registrations() < len(device_ids):
+        threading.Event().wait(0.01)
+
+    # Jawab dalam urutan terbalik; separuh hanya lewat command_id (firmware baru), separuh lewat device_id
+    requests_sent = [json.loads(call.args[1]) for call in mqtt_helper.client.publish.call_args_list]
+    for i, request in enumerate(reversed(requests_sent)):
+        mock_msg = MagicMock()
+        mock_msg.topic = "iot/register/response"
+        response = {"command_id": request["command_id"]} if i % 2 else {"device_id": request["device_id"]}
+        mock_msg.payload = json.dumps({**response, "status": "registered", "echo": request["device_id"]}).encode()
+        mqtt_helper.on_message(None, None, mock_msg)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert all(results[device_id]["echo"] == device_id for device_id in device_ids)
+    assert len(mqtt_helper.whitelist_cache) == len(device_ids)
+    assert mqtt_helper.pending_registrations() == 0
@@ -0,0 +1,51 @@
+# File: tests/test_payload_codec.py
+
+import json
+from datetime import datetime, timezone
+
+import msgpack
+import pytest
+
+from helper.payload_codec import (
+    FORMAT_CBOR, FORMAT_JSON, FORMAT_MSGPACK, decode_payload, encode_payload, sniff_format, split_topic,
+)
+
+READING = {"device_id": "sensor-01", "water_level": 42.5, "rssi": -70}
+
+
+def test_sniffs_format_from_first_byte():
+    """Tes 1: JSON, MessagePack, dan CBOR dikenali dari byte pertama payload."""
+    assert sniff_format(json.dumps(READING).encode()) == FORMAT_JSON
+    assert sniff_format(b"  {}") == FORMAT_JSON
+    assert sniff_format(msgpack.packb(READING)) == FORMAT_MSGPACK
+    assert sniff_format(b"\xa3") == FORMAT_CBOR
+    assert sniff_format(b"\xd9\xd9\xf7\xa0") == FORMAT_CBOR
+
+
+def test_decodes_json_and_msgpack_to_same_dict():
+    """Tes 2: Payload JSON dan MessagePack menghasilkan dict yang sama."""
+    assert decode_payload(encode_payload(READING, FORMAT_JSON)) == READING
+    assert decode_payload(encode_payload(READING, FORMAT_MSGPACK)) == READING
+
+
+def test_topic_suffix_overrides_sniffing():
+    """Tes 3: Suffix format di topik dipakai dan dipisahkan dari topik dasar."""
+    assert split_topic("iot/waterlevel/msgpack") == ("iot/waterlevel", FORMAT_MSGPACK)
+    assert split_topic("iot/waterlevel") == ("iot/waterlevel", None)
+    with pytest.raises(ValueError):
+        decode_payload(json.dumps(READING).encode(), "iot/waterlevel/msgpack")
+
+
+def test_native_timestamp_is_normalized_to_iso_string():
+    """Tes 4: Timestamp ext MessagePack diubah menjadi string ISO seperti payload JSON lama."""
+    ts = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    payload = msgpack.packb({"device_id": "sensor-01", "timestamp": ts}, datetime=True)
+    assert decode_payload(payload)["timestamp"] == ts.isoformat()
+
+
+def test_invalid_payload_raises_value_error():
+    """Tes 5: Payload rusak selalu dilaporkan sebagai ValueError."""
+    with pytest.raises(ValueError):
+        decode_payload(b"\x85\x01")
+    with pytest.raises(ValueError):
+        decode_payload(b"{not json")
@@ -0,0 +1,38 @@
+# File: tests/test_readiness.py
+
+from helper.readiness import ReadinessProbe
+
+
+def test_not_ready_before_first_check():
+    """Tes 1: Dependensi dianggap belum siap sebelum diperiksa."""
+    probe = ReadinessProbe()
+    probe.register("redis", lambda: True)
+
+    assert probe.status()["ready"] is False
+
+
+def test_required_and_optional_checks():
+    """Tes 2: Hanya check required yang menentukan status ready."""
+    probe = ReadinessProbe()
+    probe.register("redis", lambda: True)
+    probe.register("influxdb", lambda: False, required=False)
+
+    status = probe.run_checks()
+
+    assert status["ready"] is True
+    assert status["checks"]["influxdb"]["ok"] is False
+    assert probe.is_ready("redis")
+
+
+def test_exception_marks_check_unhealthy():
+    """Tes 3: Exception di check dicatat sebagai error dan membuat proses belum siap."""
+    def failing():
+        raise ConnectionError("Connection refused")
+
+    probe = ReadinessProbe()
+    probe.register("redis", failing)
+
+    status = probe.run_checks()
+
+    assert status["ready"] is False
+    assert status["checks"]["redis"]["error"] == "Connection refused"
@@ -0,0 +1,85 @@
+# File: tests/test_redis_batcher.py
+
+import json
+import time
+import redis
+from unittest.mock import MagicMock
+
+from helper.redis_batcher import RedisPublishBatcher, pack_envelope, unpack_envelope
+
+
+def test_envelope_mode_publishes_one_message():
+    """Tes 1: Mode envelope mengirim banyak pembacaan dalam satu PUBLISH."""
+    client = MagicMock()
+    batcher = RedisPublishBatcher(client, "data_for_dashboard", max_items=10)
+    batcher.add({"device_id": "a", "water_level": 1})
+    batcher.add({"device_id": "b", "water_level": 2})
+
+    assert batcher.flush() == 2
+
+    client.publish.assert_called_once()
+    channel, message = client.publish.call_args.args
+    assert channel == "data_for_dashboard"
+    assert unpack_envelope(json.loads(message)) == [{"device_id": "a", "water_level": 1},
+                                                    {"device_id": "b", "water_level": 2}]
+
+
+def test_pipeline_mode_uses_single_round_trip():
+    """Tes 2: Mode pipeline mengirim PUBLISH per pembacaan dalam satu pipeline."""
+    client = MagicMock()
+    pipe = client.pipeline.return_value
+    batcher = RedisPublishBatcher(client, "data_for_dashboard", mode="pipeline")
+    batcher.add({"device_id": "a"})
+    batcher.add({"device_id": "b"})
+
+    batcher.flush()
+
+    assert pipe.publish.call_count == 2
+    pipe.execute.assert_called_once()
+    client.publish.assert_not_called()
+
+
+def test_background_flush_after_delay():
+    """Tes 3: Thread background mengirim batch setelah max_delay."""
+    client = MagicMock()
+    batcher = RedisPublishBatcher(client, "ch", max_delay=0.01)
+    batcher.start()
+    batcher.add({"device_id": "a"})
+    time.sleep(0.2)
+
+    assert client.publish.call_count == 1
+    batcher.stop()
+    assert batcher.get_stats()["items"] == 1
+
+
+def test_redis_error_is_counted():
+    """Tes 4: Error Redis tidak menghentikan batcher dan dihitung sebagai dropped."""
+    client = MagicMock()
+    client.publish.side_effect = redis.ConnectionError("down")
+    batcher = RedisPublishBatcher(client, "ch")
+    batcher.add({"device_id": "a"})
+
+    assert batcher.flush() == 0
+    assert batcher.get_stats()["dropped"] == 1
+
+
+def test_unpack_legacy_single_message():
+    """Tes 5: Pesan tunggal format lama tetap dikenali web server."""
+    assert unpack_envelope({"device_id": "a"}) == [{"device_id": "a"}]
+    assert unpack_envelope(pack_envelope([{"device_id": "a"}])) == [{"device_id": "a"}]
+
+
+def test_buffer_is_capped_while_publish_fails():
+    """Tes 6: Saat Redis mati, buffer tidak melebihi max_pending; item tertua dibuang dan dihitung."""
+    client = MagicMock()
+    client.publish.side_effect = redis.ConnectionError("down")
+    batcher = RedisPublishBatcher(client, "ch", max_items=2, max_pending=5)
+    for i in range(20):
+        batcher.add({"device_id": "a", "seq": i})
+
+    stats = batcher.get_stats()
+    assert (stats["pending"], stats["dropped_oldest"]) == (5, 15)
+    assert batcher.flush() == 0
+    sent = json.loads(client.publish.call_args_list[0].args[1])
+    assert [item["seq"] for item in sent["readings"]] == [15, 16]
+    assert batcher.get_stats()["dropped"] == 20
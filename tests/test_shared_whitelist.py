@@ -0,0 +1,91 @@
+# File: tests/test_shared_whitelist.py
+
+import json
+from unittest.mock import MagicMock
+
+import redis
+
+from helper.shared_whitelist import DEVICES_KEY, UPDATES_CHANNEL, SharedWhitelist
+from helper.whitelist_sync import WhitelistSync
+
+
+def _backend(body):
+    session = MagicMock()
+    response = session.get.return_value
+    response.status_code = 200
+    response.json.return_value = body
+    response.headers = {}
+    return session
+
+
+def _shared(redis_client, body=None, instance_id="worker-1"):
+    session = _backend(body or {"version": 1, "device_ids": ["a", "b"]})
+    sync = WhitelistSync("http://backend/whitelist", session=session)
+    return SharedWhitelist(redis_client, sync, instance_id=instance_id), session
+
+
+def test_leader_syncs_backend_and_replicates_to_redis():
+    """Tes 1: Leader sinkron ke Laravel lalu menulis delta ke set Redis dan menyiarkannya."""
+    redis_client = MagicMock()
+    redis_client.set.return_value = True
+    redis_client.smembers.return_value = set()
+    redis_client.hgetall.return_value = {}
+    whitelist, session = _shared(redis_client)
+
+    assert whitelist.sync() is True
+
+    assert whitelist.is_leader
+    session.get.assert_called_once()
+    pipe = redis_client.pipeline.return_value
+    assert set(pipe.sadd.call_args.args[1:]) == {"a", "b"}
+    channel, message = pipe.publish.call_args.args
+    assert channel == UPDATES_CHANNEL
+    assert json.loads(message)["origin"] == "worker-1"
+    redis_client.hset.assert_called_once()
+
+
+def test_follower_reads_redis_instead_of_backend():
+    """Tes 2: Follower tidak memanggil Laravel, cukup memuat set Redis."""
+    redis_client = MagicMock()
+    redis_client.set.return_value = None
+    redis_client.eval.return_value = 0
+    redis_client.smembers.return_value = {"x", "y"}
+    whitelist, session = _shared(redis_client)
+
+    whitelist.sync()
+
+    assert not whitelist.is_leader
+    session.get.assert_not_called()
+    assert "x" in whitelist and len(whitelist) == 2
+    redis_client.smembers.assert_called_once_with(DEVICES_KEY)
+
+
+def test_applies_updates_from_other_processes_only():
+    """Tes 3: Delta dari proses lain diterapkan tanpa ditulis ulang; pesan sendiri diabaikan."""
+    redis_client = MagicMock()
+    redis_client.smembers.return_value = {"a", "new"}
+    whitelist, _ = _shared(redis_client)
+
+    whitelist._handle_update(json.dumps({"origin": "worker-2", "added": ["c"], "removed": []}))
+    whitelist._handle_update(json.dumps({"origin": "worker-1", "added": ["ignored"], "removed": []}))
+    assert set(whitelist) == {"c"}
+    redis_client.pipeline.assert_not_called()
+
+    whitelist._handle_update(json.dumps({"origin": "worker-2", "full": True}))
+    assert set(whitelist) == {"a", "new"}
+
+
+def test_runs_standalone_without_redis():
+    """Tes 4: Tanpa Redis (atau saat Redis gagal) instance menjadi leader dan sinkron sendiri."""
+    whitelist, session = _shared(None)
+    assert whitelist.sync() is True
+    assert set(whitelist) == {"a", "b"}
+
+    redis_client = MagicMock()
+    redis_client.set.side_effect = redis.ConnectionError("down")
+    redis_client.smembers.side_effect = redis.ConnectionError("down")
+    redis_client.pipeline.side_effect = redis.ConnectionError("down")
+    whitelist, session = _shared(redis_client)
+    assert whitelist.sync() is True
+    assert whitelist.is_leader
+    assert whitelist.get_stats()["redis_errors"] > 0
@@ -0,0 +1,60 @@
+# File: tests/test_socketio_broadcaster.py
+
+import time
+from unittest.mock import MagicMock
+
+from config.settings import Config
+from helper.socketio_broadcaster import ConflatingBroadcaster
+
+
+def test_keeps_only_latest_per_device():
+    """Tes 1: Hanya pembacaan terbaru per perangkat yang di-emit dalam satu frame."""
+    emit = MagicMock()
+    broadcaster = ConflatingBroadcaster(emit, combined=True)
+    broadcaster.publish({"device_id": "a", "water_level": 1})
+    broadcaster.publish({"device_id": "a", "water_level": 2})
+    broadcaster.publish({"device_id": "b", "water_level": 5})
+
+    assert broadcaster.flush() == 2
+
+    event, data = emit.call_args.args
+    assert event == "water_level_batch"
+    assert data["readings"] == [{"device_id": "a", "water_level": 2}, {"device_id": "b", "water_level": 5}]
+    assert broadcaster.get_stats()["dropped_intermediate"] == 1
+
+
+def test_per_device_mode_uses_legacy_event():
+    """Tes 2: Default (dan SOCKETIO_COMBINED_EMIT default) tetap memakai event per perangkat water_level_update."""
+    assert Config.SOCKETIO_COMBINED_EMIT is False
+    emit = MagicMock()
+    broadcaster = ConflatingBroadcaster(emit)
+    broadcaster.publish({"device_id": "a", "water_level": 1})
+    broadcaster.publish({"device_id": "b", "water_level": 2})
+
+    broadcaster.flush()
+
+    assert [call.args[0] for call in emit.call_args_list] == ["water_level_update", "water_level_update"]
+
+
+def test_emits_at_configured_rate():
+    """Tes 3: Frame di-emit secara berkala sesuai rate_hz."""
+    emit = MagicMock()
+    broadcaster = ConflatingBroadcaster(emit, rate_hz=50)
+    broadcaster.start()
+    broadcaster.publish({"device_id": "a", "water_level": 1})
+    time.sleep(0.2)
+    broadcaster.stop()
+
+    assert emit.call_count == 1
+    stats = broadcaster.get_stats()
+    assert stats["frames"] == 1
+    assert stats["last_frame_latency_ms"] < 200
+
+
+def test_empty_flush_does_not_emit():
+    """Tes 4: Tidak ada emit jika tidak ada pembacaan baru."""
+    emit = MagicMock()
+    broadcaster = ConflatingBroadcaster(emit)
+
+    assert broadcaster.flush() == 0
+    emit.assert_not_called()
@@ -0,0 +1,105 @@
+# File: tests/test_socketio_subscriptions.py
+
+from unittest.mock import MagicMock
+
+from helper.socketio_broadcaster import ConflatingBroadcaster
+from helper.subscription_index import ALL_DEVICES_ROOM, DeviceSubscriptionIndex
+
+
+def test_routes_only_to_subscribed_rooms():
+    """Tes 1: Pembacaan hanya diarahkan ke room perangkat/grup yang punya subscriber."""
+    index = DeviceSubscriptionIndex()
+    index.set_group("utara", ["s1", "s2"])
+    index.subscribe("client-a", device_ids=["s1"])
+    index.subscribe("client-b", groups=["utara"])
+
+    routed = index.route([{"device_id": "s1"}, {"device_id": "s2"}, {"device_id": "s3"}])
+
+    assert routed == {
+        "device:s1": [{"device_id": "s1"}],
+        "group:utara": [{"device_id": "s1"}, {"device_id": "s2"}],
+    }
+
+
+def test_unsubscribe_and_disconnect_update_reverse_index():
+    """Tes 2: Unsubscribe, disconnect, dan perubahan grup langsung memengaruhi routing."""
+    index = DeviceSubscriptionIndex()
+    index.subscribe("client-a", device_ids=["s1"], all_devices=True)
+    assert set(index.rooms_for("s1")) == {"device:s1", ALL_DEVICES_ROOM}
+
+    assert index.unsubscribe("client-a", all_devices=True) == [ALL_DEVICES_ROOM]
+    assert index.rooms_for("s1") == ("device:s1",)
+    assert index.rooms_for("s9") == ()
+
+    index.subscribe("client-b", groups=["selatan"])
+    assert index.rooms_for("s9") == ()
+    index.set_group("selatan", ["s9"])
+    assert index.rooms_for("s9") == ("group:selatan",)
+
+    assert index.remove_client("client-a") == ["device:s1"]
+    assert index.rooms_for("s1") == ()
+    assert index.get_stats()["clients"] == 1
+
+
+def test_broadcaster_emits_per_room_with_router():
+    """Tes 3: Broadcaster dengan router meng-emit frame per room dan melewati perangkat tanpa subscriber."""
+    index = DeviceSubscriptionIndex()
+    index.subscribe("client-a", device_ids=["s1"])
+    emit = MagicMock()
+    broadcaster = ConflatingBroadcaster(emit, combined=True, router=index.route)
+
+    broadcaster.publish({"device_id": "s1", "water_level": 1})
+    broadcaster.publish({"device_id": "s2", "water_level": 2})
+    broadcaster.flush()
+
+    emit.assert_called_once_with(
+        "water_level_batch", {"readings": [{"device_id": "s1", "water_level": 1}], "count": 1}, to="device:s1"
+    )
+    stats = broadcaster.get_stats()
+    assert stats["emitted_readings"] == 1
+    assert stats["room_emits"] == 1
+
+
+def test_groups_are_loaded_from_redis_registry():
+    """Tes 4: Grup yang disimpan untuk perintah grup (device:group:*) juga dipakai untuk routing langganan."""
+    from helper.command_fanout import GROUP_UPDATES_CHANNEL, group_key, load_groups, save_group
+
+    sets, published = {}, []
+
+    class FakePipeline:
+        def __init__(self):
+            self.results = []
+
+        def delete(self, key):
+            sets.pop(key, None)
+
+        def sadd(self, key, *members):
+            sets.setdefault(key, set()).update(members)
+
+        def smembers(self, key):
+            self.results.append(set(sets.get(key, ())))
+
+        def publish(self, channel, message):
+            published.append((channel, message))
+
+        def execute(self):
+            return self.results
+
+    redis_client = MagicMock()
+    redis_client.pipeline.side_effect = lambda transaction=True: FakePipeline()
+    redis_client.scan_iter.side_effect = lambda match, count: [key for key in sets if key.startswith(match[:-1])]
+
+    save_group(redis_client, "utara", ["s1", "s2"])
+    save_group(redis_client, "selatan", ["s9"])
+    assert published == [(GROUP_UPDATES_CHANNEL, "utara"), (GROUP_UPDATES_CHANNEL, "selatan")]
+
+    index = DeviceSubscriptionIndex()
+    index.set_group("lama", ["s5"])
+    index.subscribe("client-a", groups=["utara"])
+    index.load_groups(load_groups(redis_client))
+    assert index.groups() == {"utara": ["s1", "s2"], "selatan": ["s9"]}
+    assert index.rooms_for("s2") == ("group:utara",)
+
+    save_group(redis_client, "utara", [])
+    index.set_group("utara", sets.get(group_key("utara"), ()))
+    assert index.rooms_for("s2") == ()
@@ -0,0 +1,143 @@
+# File: tests/test_spool.py
+
+import gzip
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+
+from influxdb.spool import DiskSpool
+from influxdb.batch_writer import BatchWriter
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return DiskSpool(str(tmp_path), segment_max_bytes=64, max_total_bytes=10_000)
+
+
+def drain(spool, max_records=100):
+    replayed = []
+    while True:
+        cursor, lines = spool.read_chunk(max_records)
+        if not lines:
+            return replayed
+        replayed.extend(lines)
+        spool.commit(cursor, len(lines))
+
+
+def test_append_and_replay_in_order(spool):
+    """Tes 1: Record di-replay sesuai urutan tulis, melintasi rotasi segmen."""
+    lines = [f"m,device_id=d{i} water_level={i}".encode() for i in range(10)]
+    for line in lines:
+        assert spool.append([line])
+
+    assert spool.get_stats()["segments"] > 1
+    assert drain(spool, max_records=3) == lines
+    assert spool.is_empty()
+
+
+def test_replay_offset_survives_restart(tmp_path):
+    """Tes 2: Posisi replay tersimpan di disk sehingga restart tidak mengirim ulang data."""
+    spool = DiskSpool(str(tmp_path))
+    spool.append([b"m value=1", b"m value=2", b"m value=3"])
+    cursor, lines = spool.read_chunk(2)
+    spool.commit(cursor, len(lines))
+    spool.close()
+
+    reopened = DiskSpool(str(tmp_path))
+    assert drain(reopened) == [b"m value=3"]
+
+
+def test_drop_oldest_eviction(tmp_path):
+    """Tes 3: Saat penuh, policy drop_oldest menghapus segmen tertua."""
+    spool = DiskSpool(str(tmp_path), segment_max_bytes=20, max_total_bytes=60)
+    for i in range(10):
+        assert spool.append([f"m value={i}".encode()])
+
+    replayed = drain(spool)
+    assert replayed[-1] == b"m value=9"
+    assert b"m value=0" not in replayed
+    assert spool.get_stats()["segments_evicted"] > 0
+
+
+def test_reject_eviction(tmp_path):
+    """Tes 4: Policy reject menolak data baru saat spool penuh."""
+    spool = DiskSpool(str(tmp_path), max_total_bytes=20, eviction="reject")
+    assert spool.append([b"m value=1"])
+    assert spool.append([b"m value=2222222222"]) is False
+
+
+def test_replay_probes_do_not_split_active_segment(tmp_path):
+    """Tes 5: Probe replay yang gagal (tanpa commit) tidak menutup segmen aktif, jadi tidak ada segmen kecil baru."""
+    spool = DiskSpool(str(tmp_path))
+    for i in range(50):
+        spool.append([f"m value={i}".encode()])
+        cursor, lines = spool.read_chunk(10)  # InfluxDB masih mati: tidak di-commit
+        assert lines[0] == b"m value=0"
+    assert spool.get_stats()["segments"] == 1
+
+    assert len(drain(spool)) == 50
+    spool.append([b"m value=50"])
+    assert drain(spool) == [b"m value=50"]
+    assert spool.get_stats()["segments"] == 1
+
+
+def test_size_is_tracked_without_scanning_directory(tmp_path):
+    """Tes 6: Ukuran spool dihitung inkremental; append tidak memindai direktori."""
+    spool = DiskSpool(str(tmp_path), segment_max_bytes=20, max_total_bytes=10_000)
+    with patch("influxdb.spool.os.listdir", side_effect=AssertionError("listdir saat append")):
+        for i in range(10):
+            spool.append([f"m value={i}".encode()])
+    assert spool.size_bytes() == sum(f.stat().st_size for f in tmp_path.glob("spool-*.lp"))
+
+    drain(spool)
+    assert spool.size_bytes() == sum(f.stat().st_size for f in tmp_path.glob("spool-*.lp"))
+    assert DiskSpool(str(tmp_path)).size_bytes() == spool.size_bytes()
+
+
+@patch("influxdb.batch_writer.time.sleep")
+def test_batch_writer_spools_and_replays(mock_sleep, spool):
+    """Tes 7: Batch yang gagal masuk spool, lalu di-replay setelah InfluxDB pulih."""
+    session = MagicMock()
+    session.post.side_effect = requests.ConnectionError("down")
+    writer = BatchWriter("http://influx:8086", "token", "org", "bucket", session=session,
+                         max_retries=1, spool=spool)
+
+    writer.write("m value=1")
+    writer.flush()
+    writer.write("m value=2")
+    writer.flush()
+
+    stats = writer.get_stats()
+    assert stats["healthy"] is False
+    assert stats["points_spooled"] == 2
+    assert stats["points_dropped"] == 0
+    # Batch kedua langsung ke spool tanpa mencoba HTTP
+    assert session.post.call_count == 2
+
+    session.post.side_effect = None
+    session.post.return_value = MagicMock(status_code=204)
+    assert writer.replay_once() == 2
+
+    body = gzip.decompress(session.post.call_args.kwargs["data"])
+    assert body == b"m value=1\nm value=2"
+    assert writer.get_stats()["healthy"] is True
+    assert writer.replay_once() == 0
+
+
+def test_empty_spool_needs_ping_before_healthy(tmp_path):
+    """Tes 8: Spool kosong tidak memulihkan status sehat tanpa ping InfluxDB yang berhasil."""
+    session = MagicMock()
+    writer = BatchWriter("http://influx:8086", "token", "org", "bucket", session=session,
+                         spool=DiskSpool(str(tmp_path)))
+    writer._healthy = False
+
+    session.get.side_effect = requests.ConnectionError("down")
+    assert writer.replay_once() is None
+    assert writer.get_stats()["healthy"] is False
+
+    session.get.side_effect = None
+    session.get.return_value = MagicMock(status_code=204)
+    assert writer.replay_once() == 0
+    assert session.get.call_args.args[0] == "http://influx:8086/ping"
+    assert writer.get_stats()["healthy"] is True
+    session.post.assert_not_called()
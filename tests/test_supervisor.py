@@ -0,0 +1,60 @@
+# File: tests/test_supervisor.py
+
+import os
+import time
+
+from mqtt.supervisor import WorkerSupervisor, aggregate_stats
+
+
+def _report_then_crash(index, report_queue):
+    report_queue.put((index, os.getpid(), {"ingest": {"processed": 5}}))
+    time.sleep(0.2)
+    os._exit(1)
+
+
+def _hang(index, report_queue):
+    time.sleep(30)
+
+
+def _run_checks(supervisor, seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        supervisor._drain_reports(0.05)
+        supervisor.check()
+
+
+def test_aggregate_stats_sums_and_takes_max():
+    """Tes 1: Statistik worker dijumlahkan; kunci berawalan 'max' diambil maksimumnya."""
+    totals = aggregate_stats([
+        {"ingest": {"processed": 10, "max_queue": 3}, "leader": True, "instance_id": "a"},
+        {"ingest": {"processed": 5, "max_queue": 7}, "leader": False, "instance_id": "b"},
+    ])
+    assert totals == {"ingest": {"processed": 15, "max_queue": 7}}
+
+
+def test_crashed_worker_is_restarted():
+    """Tes 2: Proses yang mati di-restart dan laporannya masuk ke statistik gabungan."""
+    supervisor = WorkerSupervisor(_report_then_crash, 2, min_restart_delay=0.05, max_restart_delay=0.1)
+    for slot in supervisor._slots:
+        supervisor._spawn(slot)
+    try:
+        _run_checks(supervisor, 1.5)
+        stats = supervisor.get_stats()
+        assert stats["restarts"] >= 2
+        assert stats["totals"]["ingest"]["processed"] == 10
+    finally:
+        supervisor.shutdown()
+
+
+def test_hung_worker_is_terminated():
+    """Tes 3: Proses yang tidak melapor melewati health_timeout dihentikan dan dijadwalkan restart."""
+    supervisor = WorkerSupervisor(_hang, 1, health_timeout=0.2, startup_grace=0, min_restart_delay=10)
+    slot = supervisor._slots[0]
+    supervisor._spawn(slot)
+    process = slot.process
+    try:
+        _run_checks(supervisor, 0.5)
+        assert not process.is_alive()
+        assert slot.restarts == 1 and slot.process is None
+    finally:
+        supervisor.shutdown()
@@ -0,0 +1,124 @@
+# File: tests/test_trend_cache.py
+
+import pytest
+from flask import Flask
+
+from api.waterlevel import endpoints
+from helper.json_formatter import FastJSONProvider
+from helper.trend_cache import TrendCache, align, parse_duration, parse_time
+
+HOUR = 3600
+NOW = 472_222 * HOUR + 1800  # 30 menit setelah awal sebuah jendela 1 jam
+
+
+class FakeInflux:
+    """Mean = jam ke-n; jam kelipatan 5 tidak punya data. Jendela pertama yang terpotong berkunci start (seperti Flux)."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, sensor_id, start, stop, window):
+        self.queries.append((start, stop))
+        return {max(w, start): float(w // window) for w in range(align(start, window), int(stop), window)
+                if (w // window) % 5}
+
+
+def make_cache(**kwargs):
+    clock = {"now": NOW}
+    fetch = FakeInflux()
+    cache = TrendCache(fetch, clock=lambda: clock["now"], **kwargs)
+    return cache, fetch, clock
+
+
+def test_time_parsing_and_alignment():
+    """Tes 1: Waktu relatif/RFC3339 dinormalisasi dan di-snap ke batas jendela."""
+    assert parse_time("now", NOW) == NOW
+    assert parse_time("-7d", NOW) == NOW - 7 * 86400
+    assert parse_time("2024-05-01T00:00:00Z", NOW) == 1714521600
+    assert align(NOW, HOUR) == NOW - 1800
+    assert align(7199, HOUR) == HOUR
+    assert parse_duration("15m") == 900
+    with pytest.raises(ValueError):
+        parse_time("kemarin", NOW)
+    with pytest.raises(ValueError):
+        parse_time("2024-05-01T00:00:00", NOW)
+
+
+def test_only_trailing_windows_are_recomputed():
+    """Tes 2: Request kedua hanya menghitung ulang jendela tepi & terbuka; start berbeda dalam satu jendela berbagi kunci."""
+    cache, fetch, clock = make_cache(settle=0)
+    first = cache.series("s1", NOW - 24 * HOUR, NOW)
+    assert fetch.queries == [(NOW - 24 * HOUR, NOW)]
+    assert cache.get_stats()["misses"] == 23  # jendela pertama terpotong start, tidak di-cache
+
+    clock["now"] += 60
+    second = cache.series("s1", NOW - 24 * HOUR + 60, NOW + 60)
+    assert second == first
+    assert fetch.queries[1:] == [(NOW - 24 * HOUR + 60, align(NOW, HOUR) - 23 * HOUR), (align(NOW, HOUR), NOW + 60)]
+    stats = cache.get_stats()
+    assert stats["hits"] == 23 and stats["misses"] == 23
+    assert all(value is not None for _, value in second)
+    assert len(second) < 25  # jendela tanpa data tidak dikembalikan, tapi tetap di-cache
+
+
+def test_settle_period_keeps_recent_windows_uncached():
+    """Tes 3: Jendela yang baru tertutup (< settle detik) belum di-cache karena data terlambat masih mungkin masuk."""
+    cache, fetch, _ = make_cache(settle=HOUR)
+    cache.series("s1", NOW - 3 * HOUR, NOW)
+    cache.series("s1", NOW - 3 * HOUR, NOW)
+    # Jendela tepi awal, lalu jendela terbuka + jendela sebelumnya (belum settle) diambil ulang
+    assert fetch.queries[-2:] == [(NOW - 3 * HOUR, align(NOW, HOUR) - 2 * HOUR), (align(NOW, HOUR) - HOUR, NOW)]
+
+
+def test_lru_bound_and_ttl():
+    """Tes 4: Jumlah entri dibatasi (LRU) dan entri kedaluwarsa diambil ulang."""
+    cache, fetch, clock = make_cache(settle=0, max_entries=10, ttl=HOUR)
+    cache.series("s1", NOW - 7 * HOUR, NOW)
+    cache.series("s2", NOW - 7 * HOUR, NOW)
+    stats = cache.get_stats()
+    assert stats["entries"] == 10
+    assert stats["evictions"] == 2
+
+    clock["now"] += 2 * HOUR
+    queries = len(fetch.queries)
+    cache.series("s2", NOW - 7 * HOUR, NOW)
+    assert len(fetch.queries) == queries + 1
+    assert cache.get_stats()["expired"] > 0
+
+
+def test_partial_edge_windows_use_exact_bounds():
+    """Tes 5: Start/stop di tengah jendela hanya merata-ratakan data di dalam [start, stop) dan tidak di-cache."""
+    cache, fetch, _ = make_cache(settle=0)
+    start, stop = align(NOW, HOUR) - 5 * HOUR + 1800, align(NOW, HOUR) - HOUR - 600
+    series = cache.series("s1", start, stop)
+
+    assert fetch.queries == [(start, stop)]
+    assert [w for w, _ in series] == [w for w in range(align(start, HOUR), stop, HOUR) if (w // HOUR) % 5]
+    assert cache.get_stats()["entries"] == 2  # hanya dua jendela penuh di tengah
+
+    cache.series("s1", start, stop)
+    assert fetch.queries[1:] == [(start, align(start, HOUR) + HOUR), (align(stop, HOUR), stop)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fetch = FakeInflux()
+    monkeypatch.setattr(endpoints, "trend_cache", TrendCache(fetch, settle=0))
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(endpoints.waterlevel, url_prefix="/api/waterlevel")
+    return app.test_client()
+
+
+def test_trend_endpoint_uses_cache(client):
+    """Tes 6: /trend menghasilkan analisis dari cache; input waktu tidak valid -> 400."""
+    response = client.post("/api/waterlevel/trend", json={"sensor_id": "s1", "start": "-12h", "stop": "now"})
+    data = response.get_json()["data"]
+    assert response.status_code == 200
+    assert data["analysis"]["sensor_id"] == "s1"
+    assert len(data["records"]) >= 9
+    assert endpoints.trend_cache.get_stats()["queries"] == 1
+
+    assert client.post("/api/waterlevel/trend", json={"sensor_id": "s1", "start": "now", "stop": "-1d"}).status_code == 400
+    assert client.post("/api/waterlevel/trend",
+                       json={"sensor_id": "s1", "start": "-1d", "stop": "now", "window": "1x"}).status_code == 400
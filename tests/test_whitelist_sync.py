@@ -0,0 +1,80 @@
+# File: tests/test_whitelist_sync.py
+
+from unittest.mock import MagicMock
+
+import requests
+
+from helper.whitelist_sync import WhitelistSync
+
+
+def _response(status_code, body=None, etag=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = body or {}
+    response.headers = {"ETag": etag} if etag else {}
+    return response
+
+
+def _sync(*responses):
+    session = MagicMock()
+    session.get.side_effect = list(responses)
+    return WhitelistSync("http://backend/whitelist", min_interval=10, max_interval=80, session=session), session
+
+
+def test_full_load_then_delta_with_conditional_headers():
+    """Tes 1: Load pertama memakai daftar lengkap, berikutnya delta dengan If-None-Match dan since."""
+    whitelist, session = _sync(
+        _response(200, {"version": 5, "device_ids": ["a", "b"]}, etag='"v5"'),
+        _response(200, {"version": 6, "added": ["c"], "removed": ["a"]}, etag='"v6"'),
+    )
+
+    assert whitelist.sync() is True
+    assert whitelist.sync() is True
+
+    assert set(whitelist) == {"b", "c"}
+    _, kwargs = session.get.call_args
+    assert kwargs["headers"] == {"If-None-Match": '"v5"'}
+    assert kwargs["params"] == {"since": 5}
+    assert whitelist.version == 6
+
+
+def test_not_modified_backs_off_and_change_resets_interval():
+    """Tes 2: 304 menggandakan interval sampai batas, perubahan mengembalikannya ke minimum."""
+    whitelist, _ = _sync(
+        _response(304), _response(304), _response(304), _response(304),
+        _response(200, {"version": 2, "added": ["x"]}),
+    )
+    for _ in range(4):
+        assert whitelist.sync() is False
+    assert whitelist.interval == 80
+
+    assert whitelist.sync() is True
+    assert whitelist.interval == 10
+    assert whitelist.get_stats()["not_modified"] == 4
+
+
+def test_expired_cursor_falls_back_to_full_reload():
+    """Tes 3: 410 untuk cursor lama diulang sebagai full reload tanpa header kondisional."""
+    whitelist, session = _sync(_response(410), _response(200, {"version": 9, "device_ids": ["z"]}))
+    whitelist.version = 1
+
+    whitelist.sync()
+
+    assert set(whitelist) == {"z"}
+    assert session.get.call_args.kwargs["params"] == {}
+
+
+def test_errors_keep_current_set_and_push_applies_immediately():
+    """Tes 4: Kegagalan backend tidak mengosongkan whitelist; invalidate() langsung berlaku."""
+    whitelist, _ = _sync(requests.ConnectionError("down"))
+    whitelist.replace(["a"])
+    snapshot = whitelist.devices
+
+    assert whitelist.sync() is False
+    assert "a" in whitelist
+
+    whitelist.invalidate(added=["b"], removed=["a"])
+    assert set(whitelist) == {"b"}
+    # Set lama tidak diubah di tempat (pertukaran referensi atomik)
+    assert snapshot == frozenset({"a"})
+    assert whitelist.wait() is True